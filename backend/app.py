@@ -1,90 +1,233 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+import asyncio
+import functools
+import hmac
+import json
+import threading
 import uuid
 import os
-import re
-import nltk
-from nltk.corpus import stopwords
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from rapidfuzz import fuzz
-from utils.db_manager import DatabaseManager
-from utils.sms_sender import SMSSender
-from train import FaceTrainer
-from detect import FaceDetector
+import time
+from utils.db_manager import DatabaseManager, sanitize_filename
+from utils.listing import LISTING_MAX_CONCURRENT, ndjson_lines, parse_listing_args
+from utils.sms_outbox import get_outbox
+from utils.query_cache import get_query_cache
+from utils import components
+from utils import metrics
+from utils.profiler import SlowRequestProfiler
 from dotenv import load_dotenv
 
-# Download NLTK stopwords
-try:
-    nltk.download('stopwords', quiet=True)
-except:
-    print("Warning: Could not download NLTK stopwords. Text matching may be less accurate.")
-
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-def preprocess_text(text):
-    """Preprocess text for mole matching"""
-    if not text:
-        return ""
-    text = text.lower()  # Convert to lowercase
-    text = re.sub(r'[^a-z0-9\s]', '', text)  # Remove special characters
+# Heavy modules (TensorFlow, dlib, scikit-learn, rapidfuzz) are imported on first use
+def _load_landmark_models():
+    from detect import load_landmark_models
+    return load_landmark_models()
+
+def _load_gallery():
+    from utils.gallery import load_gallery
+    return load_gallery()
+
+def _load_face_detector():
+    from detect import FaceDetector
+    return FaceDetector(landmark_models=components.get('landmark_models'))
+
+def _load_face_trainer():
+    from train import FaceTrainer
+    return FaceTrainer()
+
+def _load_candidate_scorer():
+    from utils.match_engine import CandidateScorer
+    return CandidateScorer()
+
+components.register('landmark_models', _load_landmark_models)
+components.register('gallery', _load_gallery)
+components.register('face_detector', _load_face_detector)
+components.register('face_trainer', _load_face_trainer)
+components.register('candidate_scorer', _load_candidate_scorer)
+components.register('sms_outbox', get_outbox)
+
+# Components that must be warm before /api/ready reports ready
+READY_COMPONENTS = ('face_detector', 'candidate_scorer')
+# Built by each gunicorn worker before it accepts requests (see post_worker_init). The outbox
+# starts its dispatcher thread, so messages queued before a restart are delivered straight away.
+WORKER_COMPONENTS = READY_COMPONENTS + ('sms_outbox',)
+
+if os.getenv('WARM_ON_STARTUP', 'false').lower() in ('1', 'true', 'yes'):
+    components.warm_up_in_background()
+
+# Score cases last seen near the sighting first, overridable per request with the nearbyFirst field
+NEARBY_FIRST = os.getenv('NEARBY_FIRST', 'false').lower() in ('1', 'true', 'yes')
+
+# Add a Server-Timing header with the per-stage breakdown of every response
+TIMING_HEADER = os.getenv('METRICS_TIMING_HEADER', 'false').lower() in ('1', 'true', 'yes')
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    metrics.start_request()
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.registry.observe('http_request_duration_seconds', elapsed,
+                             {'route': route, 'method': request.method, 'status': response.status_code},
+                             help_text='Request latency by route')
+    if TIMING_HEADER or request.headers.get('X-Timing-Breakdown'):
+        timings = dict(metrics.request_timings(), total=elapsed * 1000)
+        response.headers['Server-Timing'] = metrics.server_timing_header(timings)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+# Opt-in cProfile capture of requests slower than PROFILE_THRESHOLD_MS, sampling one in PROFILE_SAMPLE_EVERY
+profiler = None
+if os.getenv('PROFILE_SLOW_REQUESTS', 'false').lower() in ('1', 'true', 'yes'):
+    profiler = SlowRequestProfiler(
+        threshold_ms=float(os.getenv('PROFILE_THRESHOLD_MS', '2000')),
+        directory=os.getenv('PROFILE_DIR', 'profiles'),
+        keep=int(os.getenv('PROFILE_KEEP', '50')),
+        sample_every=int(os.getenv('PROFILE_SAMPLE_EVERY', '10'))
+    )
+    profiler.init_app(app)
+
+def require_admin(view):
+    """Only allow requests carrying the ADMIN_TOKEN in the X-Admin-Token header"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        admin_token = os.getenv('ADMIN_TOKEN')
+        if not admin_token:
+            return jsonify({'error': 'Admin endpoints are disabled'}), 403
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/api/admin/slow-requests', methods=['GET'])
+@require_admin
+def slow_requests():
+    if profiler is None:
+        return jsonify({'error': 'Slow request profiling is disabled'}), 404
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({
+        'threshold_ms': profiler.threshold_ms,
+        'sample_every': profiler.sample_every,
+        'requests': profiler.worst(limit, route=request.args.get('route'))
+    }), 200
+
+@app.route('/api/admin/model-migration', methods=['GET'])
+@require_admin
+def model_migration_status():
+    from utils.model_versions import migration_progress
+    return jsonify(migration_progress()), 200
+
+@app.route('/api/admin/model-migration', methods=['POST'])
+@require_admin
+def start_model_migration():
+    """Re-embed the gallery with another model in the background, optionally switching when done"""
+    from utils.model_versions import MIGRATION_BATCH_CASES, MIGRATION_PAUSE_SECONDS, migration_progress, \
+        start_migration
+    data = request.get_json(silent=True) or {}
+    if not data.get('target'):
+        return jsonify({'error': 'target model version is required'}), 400
+    try:
+        job = start_migration(
+            data['target'],
+            batch_cases=int(data.get('batchCases', MIGRATION_BATCH_CASES)),
+            pause_seconds=float(data.get('pauseSeconds', MIGRATION_PAUSE_SECONDS)),
+            switch_when_done=bool(data.get('switch', False)),
+            force=bool(data.get('force', False))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(migration_progress(job.state or {'status': 'starting', 'target': job.target})), 202
+
+@app.route('/api/admin/model-migration', methods=['DELETE'])
+@require_admin
+def stop_model_migration():
+    from utils.model_versions import stop_migration
+    if not stop_migration():
+        return jsonify({'error': 'No model migration is running in this process'}), 404
+    return jsonify({'message': 'Stopping after the current batch'}), 202
+
+# Listings stream for as long as the client reads, so only a few may hold request threads at once
+_listing_slots = threading.BoundedSemaphore(LISTING_MAX_CONCURRENT)
+
+def _listing_response(stream, filter_names):
+    """Stream DatabaseManager.<stream> rows as NDJSON from query parameters, see utils/listing.py"""
     try:
-        words = text.split()  # Tokenization
-        stop_words = set(stopwords.words('english'))
-        words = [word for word in words if word not in stop_words]  # Remove stopwords
-        return ' '.join(words)
-    except:
-        # Fallback if NLTK is not available
-        return text
-
-def fuzzy_match_score(user_input, stored_texts):
-    """Compute fuzzy matching score"""
-    if not stored_texts:
-        return -1, 0
-    scores = [fuzz.token_set_ratio(user_input, text) for text in stored_texts]
-    best_match_idx = scores.index(max(scores))  # Get index of highest score
-    return best_match_idx, scores[best_match_idx]
-
-def tfidf_cosine_similarity(user_input, stored_texts):
-    """Compute TF-IDF + Cosine Similarity"""
-    if not stored_texts:
-        return -1, 0
-    vectorizer = TfidfVectorizer()
-    all_texts = [user_input] + stored_texts
+        options = parse_listing_args(request.args, filter_names)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not _listing_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many listings running, try again later'}), 429
+
+    limit = options.pop('limit', None)
+    def generate():
+        db = None
+        try:
+            db = DatabaseManager(pooled=False)
+            # One row past the page tells whether there is a next one
+            yield from ndjson_lines(getattr(db, stream)(limit=limit + 1 if limit else None, **options), limit)
+        except Exception as e:
+            # The status line is already sent, so the error ends the stream instead
+            print(f"Error in {stream} listing: {e}")
+            yield json.dumps({'error': str(e)}) + '\n'
+        finally:
+            if db is not None:
+                db.close()
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.call_on_close(_listing_slots.release)
+    return response
+
+@app.route('/api/admin/cases', methods=['GET'])
+@require_admin
+def list_cases():
+    """Missing children as NDJSON, filtered by name (prefix), case_id, since and until"""
+    return _listing_response('stream_cases', ('name', 'case_id'))
+
+@app.route('/api/admin/sightings', methods=['GET'])
+@require_admin
+def list_sightings():
+    """Sightings as NDJSON, filtered by child_name, geohash (prefix), since and until"""
+    return _listing_response('stream_sightings', ('child_name', 'geohash'))
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    status = components.status()
+    is_ready = all(status[name]['warm'] for name in READY_COMPONENTS)
+    return jsonify({'ready': is_ready, 'components': status}), 200 if is_ready else 503
+
+@app.route('/api/scan-video', methods=['POST'])
+@require_admin
+def scan_video():
+    """Match the faces tracked through an uploaded CCTV clip"""
+    if 'video' not in request.files or request.files['video'].filename == '':
+        return jsonify({'error': 'No video uploaded'}), 400
+
+    file = request.files['video']
+    extension = os.path.splitext(file.filename)[1].lower() or '.mp4'
+    temp_path = f"temp_{uuid.uuid4()}{extension}"
+    file.save(temp_path)
     try:
-        tfidf_matrix = vectorizer.fit_transform(all_texts)
-        cosine_sim = cosine_similarity(tfidf_matrix[0], tfidf_matrix[1:])  # Compare user input to stored texts
-        best_match_idx = cosine_sim.argmax()  # Get index of highest similarity
-        return best_match_idx, cosine_sim[0][best_match_idx] * 100  # Convert to percentage
-    except:
-        # Fallback if vectorizer fails
-        return -1, 0
-
-def find_best_mole_match(user_input, mole_data):
-    """Find best match for mole description"""
-    if not user_input or not mole_data:
-        return None, 0
-    
-    stored_texts = [item['description'] for item in mole_data]
-    user_input_clean = preprocess_text(user_input)
-    stored_texts_clean = [preprocess_text(text) for text in stored_texts]
-    
-    # Step 1: Fuzzy Matching
-    best_fuzzy_idx, fuzzy_score = fuzzy_match_score(user_input_clean, stored_texts_clean)
-    
-    if fuzzy_score >= 90:
-        return mole_data[best_fuzzy_idx], fuzzy_score
-    
-    # Step 2: TF-IDF + Cosine Similarity (if fuzzy match is inconclusive)
-    best_tfidf_idx, tfidf_score = tfidf_cosine_similarity(user_input_clean, stored_texts_clean)
-    
-    if best_tfidf_idx >= 0 and tfidf_score >= 80:
-        return mole_data[best_tfidf_idx], tfidf_score
-    
-    return None, 0
+        return jsonify(components.get('face_detector').scan_video(temp_path)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in scan_video: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
 @app.route('/api/report-missing', methods=['POST'])
 def report_missing():
@@ -95,6 +238,11 @@ def report_missing():
         if not files:
             return jsonify({'error': 'No files uploaded'}), 400
 
+        # Bursts of near-identical photos are stored and encoded once
+        from utils.photo_dedup import dedupe_uploads
+        photos_received = len(files)
+        files = dedupe_uploads(files)
+
         db = DatabaseManager()
         case_id = str(uuid.uuid4())
         
@@ -108,20 +256,40 @@ def report_missing():
             case_id, 
             files,
             parent_phone,
-            distinguishing_features
+            distinguishing_features,
+            data.get('location')
         )
         
         # Retrieve photos for training
         training_dir = db.retrieve_child_photos()
         
         # Train model with updated dataset
+        quality = {}
         if training_dir:
-            trainer = FaceTrainer()
-            trainer.train_from_directory(training_dir)
+            trainer = components.get('face_trainer')
+            quality = trainer.train_from_directory(training_dir)
         
         db.close()
 
-        return jsonify({'message': 'Report submitted successfully', 'case_id': case_id}), 200
+        response = {
+            'message': 'Report submitted successfully',
+            'case_id': case_id,
+            'photos_kept': len(files),
+            'photos_suppressed': photos_received - len(files)
+        }
+        # Tell the reporter when the photos will not match well, while they can still send better ones
+        face_quality = quality.get(sanitize_filename(data['childName']))
+        if not face_quality or not face_quality['kept']:
+            response['warning'] = 'no_face'
+            response['warning_detail'] = ("No face was found in any photo, so this case cannot be matched "
+                                          "by face; please add a clear, front-facing photo")
+        elif face_quality['below_gate']:
+            response['warning'] = 'low_face_quality'
+            response['warning_detail'] = ("All photos are below the face quality bar; the best one was used, "
+                                          "but face matching will be less reliable until a clearer photo is added")
+        if face_quality:
+            response['face_quality'] = round(face_quality['score'], 3)
+        return jsonify(response), 200
 
     except Exception as e:
         print(f"Error in report_missing: {str(e)}")
@@ -146,9 +314,17 @@ def report_found():
         temp_path = f"temp_{uuid.uuid4()}.jpg"
         file.save(temp_path)
 
-        # Initialize detector and process image
-        detector = FaceDetector()
-        results = detector.detect_face(temp_path)
+        # Match the image, or reuse the result for a photo already submitted
+        from utils.face_quality import FaceRejected
+        rejection = None
+        try:
+            results = _detect_face_cached(temp_path, _nearby_cell(data))
+        except FaceRejected as e:
+            results, rejection = None, e
+
+        # Clean up temporary file
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
         # Create a single database manager instance for all operations
         db = DatabaseManager()
@@ -160,23 +336,17 @@ def report_found():
         # Try to extract mole-related information from details
         if details and ('mole' in details.lower() or 'mark' in details.lower()):
             reported_mole_description = details
-        
-        # Perform mole matching if applicable
-        mole_match_found = False
-        matched_child_name = None
-        
-        if reported_mole_description:
-            all_mole_data = db.get_all_mole_data()
-            if all_mole_data:
-                best_match, match_score = find_best_mole_match(reported_mole_description, all_mole_data)
-                if best_match and match_score >= 80:  # Threshold for considering a match
-                    mole_match_found = True
-                    matched_child_name = best_match['child_name']
-                    print(f"Mole match found for child: {matched_child_name} with score: {match_score}")
 
-        # Clean up temporary file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        # Score face and mole candidates together in a single pass
+        scorer = components.get('candidate_scorer')
+        face_matches = (results or [])[:scorer.face_top_k]
+        face_cases = db.get_cases_for_names([name for name, _ in face_matches])
+        all_mole_data = db.get_all_mole_data() if reported_mole_description else []
+        scoring = scorer.score(face_matches, face_cases, reported_mole_description, all_mole_data)
+        print(f"Candidate scoring timings (ms): {scoring['timings']}")
+
+        best_match = scoring['ranking'][0] if scoring['ranking'] else None
+        matched_child_name = best_match['child_name'] if best_match else None
 
         # Get reporter details
         reporter_name = data.get('reporterName', 'Anonymous')
@@ -192,111 +362,241 @@ def report_found():
                 reporter_phone,
                 details
             )
+            _index_sighting(data.get('childName') or matched_child_name, location)
 
-        # If mole match was found but no face match was found
-        if mole_match_found and (not results or len(results) == 0):
-            # Get case details for the matched child
-            case_details = db.get_child_details(matched_child_name)
-            
-            # Get location information - make sure we fetch the most recent sighting
-            last_seen_location = None
-            locations = db.get_last_seen_locations(matched_child_name)
-            if locations and len(locations) > 0:
-                last_seen_location = locations[0]['location']
-            
-            # If still no location, use a default text
-            if not last_seen_location or last_seen_location.strip() == "":
-                last_seen_location = "Unknown location"
-            
-            # Get parent phone and send SMS notification if available
-            parent_phone = db.get_parent_phone(matched_child_name)
-            sms_sent = False
-            
-            if parent_phone:
-                # Send SMS notification
-                sms_sender = SMSSender()
-                sms_sent = sms_sender.send_child_found_notification(
-                    parent_phone,
-                    matched_child_name,
-                    location,
-                    reporter_name,
-                    reporter_phone
-                )
-                print(f"SMS notification sent: {sms_sent}")
-            
-            db.close()
-            
-            return jsonify({
-                'match_found': True,
-                'match_method': 'mole_description',
-                'child_name': matched_child_name,
-                'last_seen_location': last_seen_location,
-                'notification_sent': sms_sent
-            }), 200
-
-        # Process face detection results if available
-        if not results:
+        if not best_match:
             db.close()
             return jsonify({
                 'message': 'No match found',
-                'match_found': False
+                'match_found': False,
+                **(rejection.to_dict() if rejection else {})
             }), 200
 
-        # Get the best match from face detection
-        matched_name, confidence = results[0]
-        
-        # Get case details
-        case_details = db.get_child_details(matched_name)
-        
-        # Get location information
-        last_seen_location = None
-        locations = db.get_last_seen_locations(matched_name)
-        if locations and len(locations) > 0:
-            last_seen_location = locations[0]['location']  # Get the most recent location
+        # Get location information - make sure we fetch the most recent sighting
+        latest = db.get_latest_sighting(matched_child_name)
+        last_seen_location = latest['location'] if latest else None
         
         # If still no location, use a default text
         if not last_seen_location or last_seen_location.strip() == "":
             last_seen_location = "Unknown location"
             
-        # Get parent phone and send SMS notification if available
-        parent_phone = db.get_parent_phone(matched_name)
+        # Get parent phone and queue SMS notification if available
+        parent_phone = db.get_parent_phone(matched_child_name)
         sms_sent = False
 
         if parent_phone:
-            # Send SMS notification
-            sms_sender = SMSSender()
-            sms_sent = sms_sender.send_child_found_notification(
+            # Delivery happens on the outbox dispatcher thread, off the request path
+            sms_sent = components.get('sms_outbox').enqueue_child_found_notification(
+                best_match['case_id'],
                 parent_phone,
-                matched_name,
+                matched_child_name,
                 location,
                 reporter_name,
                 reporter_phone
             )
-            print(f"SMS notification sent: {sms_sent}")
-        
-        # Check if there's a mole match for the same child (double confirmation)
-        mole_description = db.get_mole_data_for_child(matched_name)
-        mole_match = False
-        if mole_description and reported_mole_description:
-            _, match_score = find_best_mole_match(reported_mole_description, [{'description': mole_description}])
-            mole_match = match_score >= 80
+            print(f"SMS notification queued: {sms_sent}")
         
         # Close database connection only after all operations are complete
         db.close()
 
+        return _match_response(best_match, last_seen_location, sms_sent)
+
+    except Exception as e:
+        print(f"Error in report_found: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+_spatial_index = None
+
+def _get_spatial_index():
+    global _spatial_index
+    if _spatial_index is None:
+        from utils.geo import SpatialIndex
+        def load_cells():
+            db = DatabaseManager()
+            try:
+                return [(sanitize_filename(name), cell) for name, cell in db.get_last_seen_cells()]
+            finally:
+                db.close()
+        _spatial_index = SpatialIndex(load_cells)
+    return _spatial_index
+
+def _nearby_cell(data):
+    """Geohash cell of the sighting when nearby-first matching applies to this request, else None"""
+    from utils.geo import geocode_location
+    requested = data.get('nearbyFirst')
+    if not (requested.lower() in ('1', 'true', 'yes') if requested else NEARBY_FIRST):
+        return None
+    place = geocode_location(data.get('location'))
+    return place[2] if place else None
+
+def _index_sighting(child_name, location):
+    """Make a sighting stored by this process count as its case's last-seen cell straight away"""
+    from utils.geo import geocode_location
+    place = geocode_location(location)
+    if child_name and place and _spatial_index is not None:
+        _spatial_index.add(sanitize_filename(child_name), place[2])
+
+def _detect_face_cached(image_path, nearby_cell=None):
+    """detect_face through the query cache, invalidated whenever the gallery is republished
+
+    With nearby_cell the cases last seen around that cell are scored first,
+    and results are cached separately since they may not cover the gallery.
+    """
+    from utils.gallery import gallery_version
+    from utils.gallery_shards import get_sharded_gallery, sharding_enabled
+    from utils.model_versions import staged_version
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    cache = get_query_cache()
+    version = get_sharded_gallery().version() if sharding_enabled() else gallery_version()
+    # Dual-read results also change as a model migration checkpoints, nearby-first ones as sightings come in
+    spatial_index = _get_spatial_index() if nearby_cell else None
+    version = (version, staged_version(), nearby_cell, spatial_index.version() if spatial_index else None)
+    hit, results, phash = cache.lookup(data, version)
+    if not hit:
+        nearby = spatial_index.nearby(nearby_cell) if spatial_index else None
+        results = components.get('face_detector').detect_face(image_path, nearby)
+        # None means matching failed (e.g. a shard was unreachable), so only real match lists are kept
+        if results is not None:
+            cache.store(data, version, results, phash)
+    return results
+
+def _match_response(best_match, last_seen_location, sms_sent):
+    matched_child_name = best_match['child_name']
+    if not best_match['face_match']:
+        print(f"Mole match found for child: {matched_child_name} with score: {best_match['mole_score']}")
         return jsonify({
             'match_found': True,
-            'match_method': 'facial_recognition',
-            'child_name': matched_name,
-            'confidence': float(confidence),
+            'match_method': 'mole_description',
+            'child_name': matched_child_name,
             'last_seen_location': last_seen_location,
             'notification_sent': sms_sent,
-            'mole_match_confirmation': mole_match
+            'fused_score': best_match['fused_score']
         }), 200
 
+    return jsonify({
+        'match_found': True,
+        'match_method': 'facial_recognition',
+        'child_name': matched_child_name,
+        'confidence': best_match['face_score'],
+        'last_seen_location': last_seen_location,
+        'notification_sent': sms_sent,
+        'mole_match_confirmation': best_match['mole_match'],
+        'fused_score': best_match['fused_score']
+    }), 200
+
+async def _in_db(method, *args):
+    """Run one DatabaseManager call in a worker thread on its own connection"""
+    def call():
+        db = DatabaseManager()
+        try:
+            return getattr(db, method)(*args)
+        finally:
+            db.close()
+    return await asyncio.to_thread(call)
+
+@app.route('/api/v2/report-found', methods=['POST'])
+async def report_found_concurrent():
+    """report_found with the independent stages run concurrently
+
+    Inference overlaps the mole candidate fetch, and the sighting insert,
+    last-seen lookup and notification overlap each other, so latency is the
+    slowest stage of each phase rather than the sum of all of them.
+    """
+    try:
+        data = request.form
+
+        if 'foundPhoto' not in request.files:
+            return jsonify({'error': 'No file part'}), 400
+
+        file = request.files['foundPhoto']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+
+        temp_path = f"temp_{uuid.uuid4()}.jpg"
+        file.save(temp_path)
+
+        details = data.get('details', '')
+        reported_mole_description = None
+        if details and ('mole' in details.lower() or 'mark' in details.lower()):
+            reported_mole_description = details
+
+        reporter_name = data.get('reporterName', 'Anonymous')
+        reporter_phone = data.get('reporterPhone', 'Unknown')
+        location = data.get('location', 'Unknown location')
+        store_sighting = bool(data.get('location') and data.get('reporterName') and data.get('reporterPhone'))
+        scorer = components.get('candidate_scorer')
+
+        from utils.face_quality import FaceRejected
+        rejections = []
+
+        async def match_faces():
+            try:
+                results = await asyncio.to_thread(_detect_face_cached, temp_path, _nearby_cell(data))
+            except FaceRejected as e:
+                results = None
+                rejections.append(e)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            face_matches = (results or [])[:scorer.face_top_k]
+            face_cases = await _in_db('get_cases_for_names', [name for name, _ in face_matches])
+            return face_matches, face_cases
+
+        async def fetch_mole_data():
+            return await _in_db('get_all_mole_data') if reported_mole_description else []
+
+        (face_matches, face_cases), all_mole_data = await asyncio.gather(match_faces(), fetch_mole_data())
+        scoring = scorer.score(face_matches, face_cases, reported_mole_description, all_mole_data)
+        print(f"Candidate scoring timings (ms): {scoring['timings']}")
+
+        best_match = scoring['ranking'][0] if scoring['ranking'] else None
+        matched_child_name = best_match['child_name'] if best_match else None
+        sighting_name = data.get('childName') or matched_child_name
+
+        async def store():
+            if store_sighting:
+                await _in_db('store_reported_child', sighting_name, location, reporter_name, reporter_phone, details)
+                _index_sighting(sighting_name, location)
+
+        if not best_match:
+            await store()
+            return jsonify({
+                'message': 'No match found',
+                'match_found': False,
+                **(rejections[0].to_dict() if rejections else {})
+            }), 200
+
+        async def notify():
+            parent_phone = await _in_db('get_parent_phone', matched_child_name)
+            if not parent_phone:
+                return False
+            # Delivery happens on the outbox dispatcher thread, off the request path
+            return await asyncio.to_thread(
+                components.get('sms_outbox').enqueue_child_found_notification,
+                best_match['case_id'], parent_phone, matched_child_name, location, reporter_name, reporter_phone
+            )
+
+        _, latest, sms_sent = await asyncio.gather(
+            store(), _in_db('get_latest_sighting', matched_child_name), notify()
+        )
+        print(f"SMS notification queued: {sms_sent}")
+
+        if store_sighting and sighting_name == matched_child_name:
+            # The sequential endpoint reads locations after its insert, so the latest sighting is this one
+            last_seen_location = location
+        else:
+            last_seen_location = latest['location'] if latest else None
+        if not last_seen_location or last_seen_location.strip() == "":
+            last_seen_location = "Unknown location"
+
+        return _match_response(best_match, last_seen_location, sms_sent)
+
     except Exception as e:
-        print(f"Error in report_found: {str(e)}")
+        print(f"Error in report_found_concurrent: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    # Start the SMS dispatcher so messages queued before a restart are delivered
+    components.get('sms_outbox')
     app.run(debug=True)
@@ -0,0 +1,21 @@
+import argparse
+from utils.db_manager import DatabaseManager, SIGHTING_RETENTION_DAYS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old sightings to reported_children_archive")
+    parser.add_argument('--older-than-days', type=int, default=SIGHTING_RETENTION_DAYS,
+                        help="Archive sightings reported more than this many days ago")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Sightings moved per transaction")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    try:
+        archived = db.archive_sightings(older_than_days=args.older_than_days, batch_size=args.batch_size)
+        print(f"Archived {archived} sightings older than {args.older_than_days} days")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
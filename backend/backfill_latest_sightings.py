@@ -0,0 +1,19 @@
+import argparse
+from utils.db_manager import DatabaseManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill latest_sighting from existing reported_children rows")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Sighting ids scanned per transaction")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    try:
+        backfilled = db.backfill_latest_sightings(batch_size=args.batch_size)
+        print(f"Recorded the latest sighting of {backfilled} children")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
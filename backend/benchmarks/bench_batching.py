@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_pipeline import StageTimer
+from utils.batcher import MicroBatcher
+
+
+class SimulatedEncoder:
+    """Stand-in for the FaceNet forward pass: fixed per-call overhead plus per-image cost
+
+    Calls are serialised, as concurrent predict calls on one model compete for
+    the same cores. Pass --real to use FaceDetector.get_encodes instead.
+    """
+
+    def __init__(self, overhead_ms, per_item_ms):
+        self.overhead = overhead_ms / 1000
+        self.per_item = per_item_ms / 1000
+        self.lock = threading.Lock()
+
+    def get_encodes(self, faces):
+        with self.lock:
+            time.sleep(self.overhead + self.per_item * len(faces))
+        return [np.zeros(128, dtype=np.float32) for _ in faces]
+
+
+def run(encode_one, clients, requests_per_client, timer, stage):
+    def client():
+        face = np.zeros((160, 160, 3), dtype=np.uint8)
+        for _ in range(requests_per_client):
+            with timer.time(stage):
+                encode_one(face)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        for future in [pool.submit(client) for _ in range(clients)]:
+            future.result()
+    return clients * requests_per_client / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request and micro-batched encoder calls")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent requests")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--overhead-ms", type=float, default=20, help="Simulated per-call cost")
+    parser.add_argument("--per-item-ms", type=float, default=4, help="Simulated per-image cost")
+    parser.add_argument("--real", action="store_true", help="Use the real FaceNet encoder")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.real:
+        from detect import FaceDetector
+        encoder = FaceDetector()
+    else:
+        encoder = SimulatedEncoder(args.overhead_ms, args.per_item_ms)
+
+    timer = StageTimer()
+    throughput = {"unbatched": run(lambda face: encoder.get_encodes([face])[0],
+                                   args.clients, args.requests, timer, "unbatched")}
+    batcher = MicroBatcher(encoder.get_encodes, args.max_batch, args.max_wait_ms, name="bench")
+    try:
+        throughput["batched"] = run(batcher, args.clients, args.requests, timer, "batched")
+    finally:
+        batcher.stop()
+
+    report = {"config": vars(args), "stages": timer.summary()}
+    for mode, stats in report["stages"].items():
+        stats["throughput_per_s"] = throughput[mode]
+        print(f"{mode:<10} {throughput[mode]:8.1f} req/s  p50 {stats['p50_ms']:7.1f} ms  "
+              f"p99 {stats['p99_ms']:7.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.standins import FakeConnection
+from utils.db_manager import DatabaseManager
+
+IMAGE_DIRS = ["training_data", "assets/dataset"]
+
+
+class Upload:
+    """Minimal stand-in for werkzeug's FileStorage, spooled to disk above 500 KB"""
+
+    def __init__(self, data, filename):
+        self.filename = filename
+        self.stream = tempfile.SpooledTemporaryFile(max_size=500 * 1024)
+        self.stream.write(data)
+        self.stream.seek(0)
+
+    def read(self, *args):
+        return self.stream.read(*args)
+
+    def close(self):
+        self.stream.close()
+
+
+def legacy_insert_missing_child(db, child_name, case_id, files, parent_phone=None, distinguishing_features=None):
+    """The original one-INSERT-per-photo path, kept as the benchmark baseline"""
+    sql = "INSERT INTO missing_children (child_name, case_id, parent_phone) VALUES (%s, %s, %s)"
+    db.cursor.execute(sql, (child_name, case_id, parent_phone))
+    for photo in files:
+        photo_data = photo.read()
+        sql = "INSERT INTO missing_child_photos (case_id, photo) VALUES (%s, %s)"
+        db.cursor.execute(sql, (case_id, photo_data))
+    if distinguishing_features and len(distinguishing_features.strip()) > 0:
+        sql = "INSERT INTO mole_data (case_id, description) VALUES (%s, %s)"
+        db.cursor.execute(sql, (case_id, distinguishing_features))
+    db.db.commit()
+    return True
+
+
+def load_photos(photos_per_case, large_photos, large_photo_mb):
+    paths = sorted(p for d in IMAGE_DIRS for p in glob.glob(os.path.join(d, "*", "*.jpg")))
+    payloads = []
+    for path in paths[:photos_per_case]:
+        with open(path, "rb") as f:
+            payloads.append((os.path.basename(path), f.read()))
+    for i in range(large_photos):
+        payloads.append((f"large-{i}.jpg", os.urandom(int(large_photo_mb * 1024 * 1024))))
+    return payloads
+
+
+def run(insert, payloads, requests, round_trip_ms, use_pure=False):
+    latencies, peaks, round_trips = [], [], []
+    for _ in range(requests):
+        uploads = [Upload(data, name) for name, data in payloads]
+        connection = FakeConnection(round_trip_ms, use_pure=use_pure)
+        db = DatabaseManager(connection=connection)
+        connection.round_trips = 0
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        insert(db, "Benchmark Child", str(uuid.uuid4()), uploads, "9876543210", "mole on left cheek")
+        latencies.append((time.perf_counter() - start) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        round_trips.append(connection.round_trips)
+        for upload in uploads:
+            upload.close()
+
+    latencies.sort()
+    return {
+        "latency_ms_p50": latencies[len(latencies) // 2],
+        "latency_ms_max": latencies[-1],
+        "peak_memory_mb": max(peaks) / 1e6,
+        "round_trips": max(round_trips),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark insert_missing_child before and after batching")
+    parser.add_argument("--photos-per-case", type=int, default=20, help="Real photos per enrolment request")
+    parser.add_argument("--large-photos", type=int, default=2, help="Extra synthetic camera-sized uploads")
+    parser.add_argument("--large-photo-mb", type=float, default=6.0)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--round-trip-ms", type=float, default=0.5, help="Simulated MySQL network round trip")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    payloads = load_photos(args.photos_per_case, args.large_photos, args.large_photo_mb)
+    results = {
+        "photos": len(payloads),
+        "payload_mb": sum(len(data) for _, data in payloads) / 1e6,
+        "before": run(legacy_insert_missing_child, payloads, args.requests, args.round_trip_ms),
+        "after": run(DatabaseManager.insert_missing_child, payloads, args.requests, args.round_trip_ms),
+        # Large uploads are only streamed on a pure-Python connection (DB_USE_PURE=true)
+        "after_use_pure": run(DatabaseManager.insert_missing_child, payloads, args.requests, args.round_trip_ms,
+                              use_pure=True),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
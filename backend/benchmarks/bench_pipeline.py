@@ -0,0 +1,261 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.standins import FakeConnection
+from utils.db_manager import DatabaseManager
+from utils.gallery import GALLERY_QUANTIZATION, GalleryMatrix, load_gallery
+from utils.match_engine import CandidateScorer
+from utils.sms_outbox import FakeSMSProvider, SMSOutbox
+
+IMAGE_DIRS = ["training_data", "assets/dataset"]
+EMBEDDING_DIM = 128
+
+MOLE_SIZES = ["small", "large", "faint", "dark", "raised", "oval", "round"]
+MOLE_COLOURS = ["brown", "black", "reddish", "light brown", "pink"]
+MOLE_KINDS = ["mole", "birth mark", "scar", "freckle cluster", "mark"]
+MOLE_SIDES = ["left", "right", "upper", "lower"]
+MOLE_PARTS = ["cheek", "forehead", "chin", "neck", "arm", "wrist", "shoulder", "ear", "eyebrow", "hand"]
+
+
+class StageTimer:
+    """Collect wall-clock samples per stage"""
+
+    def __init__(self):
+        self.samples = {}
+        self.skipped = {}
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        yield
+        self.samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+
+    def skip(self, stage, reason):
+        self.skipped[stage] = reason
+
+    def summary(self):
+        stages = {}
+        for stage, samples in self.samples.items():
+            samples = np.asarray(samples)
+            total_seconds = samples.sum() / 1000
+            stages[stage] = {
+                "count": int(samples.size),
+                "mean_ms": float(samples.mean()),
+                "p50_ms": float(np.percentile(samples, 50)),
+                "p95_ms": float(np.percentile(samples, 95)),
+                "p99_ms": float(np.percentile(samples, 99)),
+                "throughput_per_s": float(samples.size / total_seconds) if total_seconds else None,
+            }
+        return stages
+
+
+def image_paths(limit):
+    paths = sorted(p for d in IMAGE_DIRS for p in glob.glob(os.path.join(d, "*", "*.jpg")))
+    return paths[:limit] if limit else paths
+
+
+def synth_gallery(size, rng):
+    vectors = rng.standard_normal((size, EMBEDDING_DIM), dtype=np.float32)
+    return {f"case-{i:07d}": vectors[i] for i in range(size)}
+
+
+def synth_mole_corpus(size, rng):
+    pick = lambda options: options[rng.integers(len(options))]
+    return [
+        {
+            "id": i,
+            "case_id": f"case-{i:07d}",
+            "child_name": f"case-{i:07d}",
+            "description": f"{pick(MOLE_SIZES)} {pick(MOLE_COLOURS)} {pick(MOLE_KINDS)} "
+                           f"on {pick(MOLE_SIDES)} {pick(MOLE_PARTS)}",
+        }
+        for i in range(size)
+    ]
+
+
+def bench_face_pipeline(timer, paths):
+    """decode / detect / align / encode on the real images, as FaceDetector does"""
+    try:
+        import cv2
+    except ImportError as e:
+        for stage in ("decode", "detect", "align", "encode"):
+            timer.skip(stage, f"missing dependency: {e.name}")
+        return
+    try:
+        import dlib
+        from utils.face_chips import PREDICTOR_PATH
+    except ImportError as e:
+        dlib = None
+        for stage in ("detect", "align", "encode"):
+            timer.skip(stage, f"missing dependency: {e.name}")
+
+    detector = dlib.get_frontal_face_detector() if dlib else None
+    predictor = None
+    if dlib and os.path.exists(PREDICTOR_PATH):
+        predictor = dlib.shape_predictor(PREDICTOR_PATH)
+    elif dlib:
+        timer.skip("align", f"missing {PREDICTOR_PATH}")
+    encoder = None
+    if predictor is not None:
+        try:
+            from detect import FaceDetector
+            encoder = FaceDetector()
+        except Exception as e:
+            timer.skip("encode", f"face encoder unavailable: {e}")
+
+    for path in paths:
+        with timer.time("decode"):
+            with open(path, "rb") as f:
+                data = np.frombuffer(f.read(), dtype=np.uint8)
+            img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        if detector is None:
+            continue
+        with timer.time("detect"):
+            faces = detector(img_rgb)
+        if not faces or predictor is None:
+            continue
+        with timer.time("align"):
+            landmarks = predictor(img_rgb, faces[0])
+            chip = dlib.get_face_chip(img_rgb, landmarks, size=160)
+        if encoder is not None:
+            with timer.time("encode"):
+                encoder.get_encode(chip)
+
+
+def bench_gallery_match(timer, sizes, queries, rng):
+    """Match through load_gallery, as detect_face does, honouring GALLERY_QUANTIZATION"""
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            index_path = os.path.join(tmp, "gallery.json")
+            GalleryMatrix.from_dict(synth_gallery(size, rng)).save(index_path, quantization=GALLERY_QUANTIZATION)
+            gallery = load_gallery(os.path.join(tmp, "encodings.pkl"), index_path)
+            for _ in range(queries):
+                query = rng.standard_normal(EMBEDDING_DIM, dtype=np.float32)
+                with timer.time(f"gallery_match[n={size}]"):
+                    gallery.match(query, 0.4)
+            del gallery
+
+
+def bench_text_match(timer, sizes, queries, rng):
+    scorer = CandidateScorer()
+    for size in sizes:
+        corpus = synth_mole_corpus(size, rng)
+        for _ in range(queries):
+            query = synth_mole_corpus(1, rng)[0]["description"]
+            with timer.time(f"text_match[n={size}]"):
+                scorer.score([], [], query, corpus)
+        del corpus
+
+
+def bench_db(timer, requests, round_trip_ms):
+    """The DatabaseManager calls report_found makes, against the local MySQL stand-in"""
+    db = DatabaseManager(connection=FakeConnection(round_trip_ms))
+    for _ in range(requests):
+        with timer.time("db.store_reported_child"):
+            db.store_reported_child("case-0000001", "MG Road, Bengaluru", "Reporter", "9876543210", "mole on cheek")
+        with timer.time("db.get_cases_for_names"):
+            db.get_cases_for_names(["case-0000001", "case-0000002"])
+        with timer.time("db.get_all_mole_data"):
+            db.get_all_mole_data()
+        with timer.time("db.get_latest_sighting"):
+            db.get_latest_sighting("case-0000001")
+        with timer.time("db.get_parent_phone"):
+            db.get_parent_phone("case-0000001")
+
+
+def bench_sms_enqueue(timer, requests):
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = SMSOutbox(provider=FakeSMSProvider(), path=os.path.join(tmp, "outbox.db"))
+        for _ in range(requests):
+            with timer.time("sms.enqueue"):
+                outbox.enqueue_child_found_notification(
+                    str(uuid.uuid4()), "+919876543210", "Child", "MG Road", "Reporter", "9876543210"
+                )
+        outbox.db.close()
+
+
+def find_regressions(stages, baseline, tolerance):
+    regressions = []
+    for stage, stats in stages.items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous and stats["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{stage}: p95 {previous['p95_ms']:.2f} ms -> {stats['p95_ms']:.2f} ms")
+    return regressions
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(",") if size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the enrolment and matching paths")
+    parser.add_argument("--gallery-sizes", type=parse_sizes, default=parse_sizes("100,1000,10000,100000,1000000"))
+    parser.add_argument("--mole-sizes", type=parse_sizes, default=None,
+                        help="Mole corpus sizes (defaults to the gallery sizes)")
+    parser.add_argument("--queries", type=int, default=5, help="Queries per gallery / corpus size")
+    parser.add_argument("--images", type=int, default=0, help="Limit the number of real images (0 = all)")
+    parser.add_argument("--requests", type=int, default=200, help="Iterations for DB and SMS stages")
+    parser.add_argument("--round-trip-ms", type=float, default=0.5, help="Simulated MySQL network round trip")
+    parser.add_argument("--skip-face", action="store_true", help="Skip decode/detect/align/encode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare p95 against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 slowdown before failing")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    timer = StageTimer()
+
+    if not args.skip_face:
+        bench_face_pipeline(timer, image_paths(args.images))
+    bench_gallery_match(timer, args.gallery_sizes, args.queries, rng)
+    bench_text_match(timer, args.mole_sizes or args.gallery_sizes, args.queries, rng)
+    bench_db(timer, args.requests, args.round_trip_ms)
+    bench_sms_enqueue(timer, args.requests)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "stages": timer.summary(),
+        "skipped": timer.skipped,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for stage, stats in results["stages"].items():
+        print(f"{stage:32s} p50 {stats['p50_ms']:10.3f} ms  p95 {stats['p95_ms']:10.3f} ms  "
+              f"p99 {stats['p99_ms']:10.3f} ms  {stats['throughput_per_s'] or 0:10.1f}/s")
+    for stage, reason in timer.skipped.items():
+        print(f"{stage:32s} skipped: {reason}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results["stages"], json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
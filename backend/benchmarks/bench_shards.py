@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_pipeline import StageTimer
+from shard_server import ThreadingXMLRPCServer
+from utils.gallery import GalleryMatrix
+from utils.gallery_shards import LocalShard, RemoteShard, ShardedGallery, publish_shards, shard_index_path
+
+EMBEDDING_DIM = 128
+RECOGNITION_T = 0.4
+
+
+def synth_encodings(size, rng, prefix="case"):
+    vectors = rng.standard_normal((size, EMBEDDING_DIM), dtype=np.float32)
+    return {f"{prefix}-{i:07d}": vectors[i] for i in range(size)}
+
+
+def start_shard_servers(directory, num_shards):
+    """One XML-RPC shard server per shard on localhost, returns their URLs"""
+    urls = []
+    for shard in range(num_shards):
+        local = LocalShard(shard_index_path(directory, shard))
+        server = ThreadingXMLRPCServer(("127.0.0.1", 0), allow_none=True, logRequests=False)
+        server.register_function(
+            lambda encode, t, local=local: [[n, c] for n, c in local.match(np.asarray(encode, np.float32), t)],
+            "match")
+        server.register_function(lambda local=local: repr(local.version()), "version")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        urls.append(f"http://127.0.0.1:{server.server_address[1]}")
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single gallery vs sharded scatter-gather matching")
+    parser.add_argument("--size", type=int, default=500000, help="Synthetic gallery size")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--enrol", type=int, default=20, help="Cases added in the incremental rebuild")
+    parser.add_argument("--remote", action="store_true", help="Also query shards over local XML-RPC servers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    encodings = synth_encodings(args.size, rng)
+    names = list(encodings)
+    queries = [encodings[names[i]] + rng.standard_normal(EMBEDDING_DIM).astype(np.float32) * 0.05
+               for i in rng.integers(len(names), size=args.queries)]
+    timer = StageTimer()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with timer.time("rebuild_single"):
+            single = GalleryMatrix.from_dict(encodings)
+            single.save(os.path.join(workdir, "gallery.json"), quantization="")
+        shard_dir = os.path.join(workdir, "shards")
+        with timer.time("rebuild_sharded"):
+            publish_shards(encodings, shard_dir, args.shards)
+
+        new_cases = synth_encodings(args.enrol, rng, prefix="new")
+        with timer.time("enrol_single"):
+            GalleryMatrix.from_dict({**encodings, **new_cases}).save(os.path.join(workdir, "gallery.json"),
+                                                                    quantization="")
+        with timer.time("enrol_sharded"):
+            touched = publish_shards(new_cases, shard_dir, args.shards, replace=False)
+
+        sharded = ShardedGallery.local(shard_dir, args.shards)
+        sharded.match(queries[0], RECOGNITION_T)  # map the shards before timing
+        galleries = {"match_single": single, "match_sharded": sharded}
+        if args.remote:
+            galleries["match_remote"] = ShardedGallery([RemoteShard(url) for url in
+                                                        start_shard_servers(shard_dir, args.shards)])
+
+        for query in queries:
+            expected = [name for name, _ in single.match(query, RECOGNITION_T)][:5]
+            for stage, gallery in galleries.items():
+                with timer.time(stage):
+                    found = gallery.match(query, RECOGNITION_T)
+                if [name for name, _ in found][:5] != expected:
+                    print(f"Warning: {stage} disagrees with the single gallery")
+
+    report = {"gallery_size": args.size, "shards": args.shards, "enrolled": args.enrol,
+              "shards_rewritten_on_enrol": len(touched), "stages": timer.summary()}
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<16} p50 {stats['p50_ms']:9.2f} ms  p99 {stats['p99_ms']:9.2f} ms")
+    print(f"Enrolling {args.enrol} cases rewrote {len(touched)} of {args.shards} shards")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.gallery import GALLERY_INDEX_PATH, GalleryMatrix, QuantizedGallery
+
+EMBEDDING_DIM = 128
+RECOGNITION_T = 0.4  # FaceDetector.recognition_t
+
+
+def synth_gallery(size, rng):
+    vectors = rng.standard_normal((size, EMBEDDING_DIM), dtype=np.float32)
+    return GalleryMatrix.from_dict({f"case-{i:07d}": vectors[i] for i in range(size)})
+
+
+def synth_queries(gallery, count, noise, rng):
+    """Noisy copies of random gallery rows, tuned so most land inside the threshold"""
+    rows = rng.integers(len(gallery), size=count)
+    queries = np.asarray(gallery.matrix[rows]) + rng.standard_normal((count, EMBEDDING_DIM)).astype(np.float32) * noise
+    return rows, queries
+
+
+def evaluate(gallery, baseline, queries, k, rerank_k):
+    """Compare one gallery's matches with the float32 baseline"""
+    top1 = recall = hits = hits_found = 0
+    latencies = []
+    for query, expected in zip(queries, baseline):
+        start = time.perf_counter()
+        found = gallery.match(query, RECOGNITION_T, rerank_k) if rerank_k else gallery.match(query, RECOGNITION_T)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        found_names = [name for name, _ in found]
+        expected_names = [name for name, _ in expected]
+        if found_names[:1] == expected_names[:1]:
+            top1 += 1
+        if expected_names:
+            recall += len(set(found_names[:k]) & set(expected_names[:k])) / len(expected_names[:k])
+        hits += len(expected_names)
+        hits_found += len(set(found_names) & set(expected_names))
+
+    with_hits = sum(1 for expected in baseline if expected)
+    latencies = np.asarray(latencies)
+    return {
+        "top1_agreement": top1 / len(queries),
+        f"recall_at_{k}": recall / with_hits if with_hits else None,
+        "threshold_hit_recall": hits_found / hits if hits else None,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and speed of quantized galleries against float32")
+    parser.add_argument("--size", type=int, default=200000, help="Synthetic gallery size")
+    parser.add_argument("--gallery", action="store_true", help=f"Use the published gallery at {GALLERY_INDEX_PATH}")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.06, help="Query noise per dimension")
+    parser.add_argument("--k", type=int, default=5, help="Recall@k, the scorer keeps FACE_TOP_K=5")
+    parser.add_argument("--rerank-k", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    gallery = GalleryMatrix.load(GALLERY_INDEX_PATH, mmap=False) if args.gallery else synth_gallery(args.size, rng)
+    _, queries = synth_queries(gallery, args.queries, args.noise, rng)
+    print(f"Gallery: {len(gallery)} entries, {args.queries} queries")
+
+    baseline = [gallery.match(query, RECOGNITION_T) for query in queries]
+    report = {"gallery_size": len(gallery), "queries": args.queries, "noise": args.noise,
+              "rerank_k": args.rerank_k, "modes": {}}
+    report["modes"]["float32"] = dict(evaluate(gallery, baseline, queries, args.k, None),
+                                      bytes=int(gallery.matrix.nbytes))
+    for dtype in ("float16", "int8"):
+        quantized = QuantizedGallery.from_matrix(gallery, dtype)
+        report["modes"][dtype] = dict(evaluate(quantized, baseline, queries, args.k, args.rerank_k),
+                                      bytes=int(quantized.nbytes))
+
+    float32_bytes = report["modes"]["float32"]["bytes"]
+    for mode, stats in report["modes"].items():
+        stats["memory_ratio"] = float32_bytes / stats["bytes"] if stats["bytes"] else None
+        recall = stats[f"recall_at_{args.k}"]
+        print(f"{mode:<8} {stats['bytes'] / 2**20:8.1f} MiB  top-1 {stats['top1_agreement']:.3f}  "
+              f"recall@{args.k} {recall if recall is None else round(recall, 3)}  "
+              f"p50 {stats['p50_ms']:6.2f} ms  p99 {stats['p99_ms']:6.2f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
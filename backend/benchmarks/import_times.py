@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import budget per module in ms; importing the app must stay cheap now that
+# the face pipeline and text matching are loaded on first use
+BUDGETS_MS = {
+    'flask': 300,
+    'numpy': 300,
+    'pandas': 1000,
+    'cv2': 500,
+    'dlib': 500,
+    'tensorflow': 8000,
+    'sklearn': 1500,
+    'rapidfuzz': 200,
+    'nltk': 2500,
+    'twilio': 800,
+    'mysql.connector': 500,
+    'app': 500,
+}
+
+TIMER = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [m for m in ('tensorflow', 'dlib', 'sklearn', 'nltk', 'pandas') if m in sys.modules]
+print('%.1f %s' % (elapsed, ','.join(heavy)))
+"""
+
+
+def time_import(module, repeat):
+    """Best of `repeat` cold imports, each in a fresh interpreter"""
+    samples, heavy = [], []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-c', TIMER.format(module=module)],
+            cwd=BACKEND_DIR, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            error = (proc.stderr.strip().splitlines() or ['import failed'])[-1]
+            return {'module': module, 'skipped': error}
+        elapsed, _, loaded = proc.stdout.strip().splitlines()[-1].partition(' ')
+        samples.append(float(elapsed))
+        heavy = [m for m in loaded.split(',') if m]
+    return {'module': module, 'ms': min(samples), 'heavy_modules_loaded': heavy}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold import time of heavy dependencies and the app')
+    parser.add_argument('modules', nargs='*', default=list(BUDGETS_MS), help='Modules to time')
+    parser.add_argument('--repeat', type=int, default=3, help='Cold imports per module')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    results, over_budget = [], []
+    for module in args.modules:
+        result = time_import(module, args.repeat)
+        budget = BUDGETS_MS.get(module)
+        if 'ms' in result:
+            result['budget_ms'] = budget
+            result['over_budget'] = budget is not None and result['ms'] > budget
+            if result['over_budget']:
+                over_budget.append(module)
+            print(f"{module:<16} {result['ms']:8.1f} ms  (budget {budget} ms)"
+                  f"{'  OVER BUDGET' if result['over_budget'] else ''}")
+        else:
+            print(f"{module:<16}  skipped: {result['skipped']}")
+        results.append(result)
+
+    report = {'python': sys.version.split()[0], 'results': results, 'over_budget': over_budget}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import time
+from io import IOBase
+
+# Size of the packets the MySQL connector uses when streaming long data
+LONG_DATA_CHUNK = 131072
+
+
+class FakeCursor:
+    """Cursor stand-in that accepts any statement and charges one round trip per call
+
+    Like the connector, only prepared cursors of a pure-Python connection
+    accept file-like parameters.
+    """
+
+    def __init__(self, connection, prepared=False):
+        self.connection = connection
+        self.prepared = prepared
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        if any(isinstance(value, IOBase) for value in params or ()) and \
+                not (self.prepared and self.connection.use_pure):
+            raise NotImplementedError("File-like parameters need a prepared cursor on a use_pure connection")
+        self.connection.round_trip(sql, [params or ()])
+        self.rows = []
+
+    def executemany(self, sql, seq_params):
+        seq_params = list(seq_params)
+        if any(isinstance(value, IOBase) for params in seq_params for value in params):
+            raise NotImplementedError("executemany does not stream file-like parameters")
+        # mysql-connector rewrites INSERT ... VALUES into a single multi-row statement
+        self.connection.round_trip(sql, seq_params)
+        self.rows = []
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Local stand-in for a MySQL connection with a fixed network round-trip time
+
+    Parameters are consumed the way the real connector would: bytes are
+    copied into the packet, file-like objects are read in 128 KB pieces.
+    Those are only accepted with use_pure, as mysql-connector's C extension
+    (the default wherever it is installed) rejects them.
+    """
+
+    def __init__(self, round_trip_ms=0.5, use_pure=False):
+        self.round_trip_ms = round_trip_ms
+        self.use_pure = use_pure
+        self.round_trips = 0
+        self.statements = 0
+        self.bytes_sent = 0
+
+    def round_trip(self, sql, rows):
+        self.round_trips += 1
+        self.statements += 1
+        for params in rows:
+            for value in params:
+                if isinstance(value, IOBase):
+                    chunk = value.read(LONG_DATA_CHUNK)
+                    while chunk:
+                        self.bytes_sent += len(chunk)
+                        chunk = value.read(LONG_DATA_CHUNK)
+                elif isinstance(value, (bytes, bytearray)):
+                    # The packet holds its own copy of the payload
+                    packet = bytes(value)
+                    self.bytes_sent += len(packet)
+                elif value is not None:
+                    self.bytes_sent += len(str(value))
+        if self.round_trip_ms:
+            time.sleep(self.round_trip_ms / 1000)
+
+    def cursor(self, dictionary=False, prepared=False, buffered=None):
+        return FakeCursor(self, prepared=prepared)
+
+    def commit(self):
+        self.round_trip('COMMIT', [])
+
+    def rollback(self):
+        self.round_trip('ROLLBACK', [])
+
+    def close(self):
+        pass
@@ -2,18 +2,62 @@
 import cv2
 import numpy as np
 import dlib
-from architecture import InceptionResNetV2
-from scipy.spatial.distance import cosine
-import pickle
+import os
+import time
+from utils.batcher import MicroBatcher
+from utils.face_quality import FACE_QUALITY_MIN_QUERY, FaceRejected, assess_face
+from utils.gallery import RECOGNITION_THRESHOLD, load_gallery
+from utils.gallery_shards import get_sharded_gallery, sharding_enabled
+from utils.model_versions import FaceEncoders, merge_matches, model_threshold, rescale_matches, staged_gallery
+from utils.metrics import registry, span
+from utils.video import VIDEO_DETECT_WIDTH, AdaptiveSampler, FaceTracker, iter_frames
+
+PREDICTOR_PATH = "assets/model/shape_predictor_68_face_landmarks.dat"
+
+# Batch encoder calls from concurrent requests into one forward pass
+ENCODER_BATCHING = os.getenv('ENCODER_BATCHING', 'false').lower() in ('1', 'true', 'yes')
+ENCODER_MAX_BATCH = int(os.getenv('ENCODER_MAX_BATCH', '16'))
+ENCODER_MAX_WAIT_MS = float(os.getenv('ENCODER_MAX_WAIT_MS', '5'))
+# Nearby-first matching stops without scanning the whole gallery once a nearby case is this confident
+NEARBY_STOP_CONFIDENCE = float(os.getenv('NEARBY_STOP_CONFIDENCE', '0.8'))
+
+
+def configure_tensorflow_threads():
+    """Apply TF_INTRA_OP_THREADS / TF_INTER_OP_THREADS, must run before the first TF op
+
+    With several workers per machine each one should use a slice of the
+    cores rather than all of them.
+    """
+    import tensorflow as tf
+    intra = int(os.getenv('TF_INTRA_OP_THREADS', '0'))
+    inter = int(os.getenv('TF_INTER_OP_THREADS', '0'))
+    try:
+        if intra:
+            tf.config.threading.set_intra_op_parallelism_threads(intra)
+        if inter:
+            tf.config.threading.set_inter_op_parallelism_threads(inter)
+    except RuntimeError as e:
+        # TensorFlow was already initialised in this process
+        print(f"Could not set TensorFlow thread counts: {e}")
+
+
+def load_landmark_models():
+    """dlib HOG detector and 68-point predictor, safe to build before forking workers"""
+    return dlib.get_frontal_face_detector(), dlib.shape_predictor(PREDICTOR_PATH)
+
 
 class FaceDetector:
-    def __init__(self):
-        self.recognition_t = 0.4
+    def __init__(self, landmark_models=None):
+        self.recognition_t = RECOGNITION_THRESHOLD
         self.required_size = (160, 160)
-        self.detector = dlib.get_frontal_face_detector()
-        self.predictor = dlib.shape_predictor("assets/model/shape_predictor_68_face_landmarks.dat")
-        self.face_encoder = InceptionResNetV2()
-        self.face_encoder.load_weights("assets/model/facenet_keras_weights.h5")
+        self.detector, self.predictor = landmark_models or load_landmark_models()
+        configure_tensorflow_threads()
+        # Encoder of the published gallery's model, plus the new one while a migration dual-reads
+        self.encoders = FaceEncoders()
+        self.encoders.get()
+        self.batcher = None
+        if ENCODER_BATCHING:
+            self.batcher = MicroBatcher(self.get_encodes, ENCODER_MAX_BATCH, ENCODER_MAX_WAIT_MS, name='encoder')
 
     def get_aligned_face(self, img, rect):
         """Get aligned face using dlib's face chip"""
@@ -21,61 +65,179 @@ class FaceDetector:
         aligned_face = dlib.get_face_chip(img, landmarks, size=160)
         return aligned_face
 
+    def get_aligned_face_with_quality(self, img, rect):
+        """Aligned face plus its quality assessment, from the same landmarks"""
+        landmarks = self.predictor(img, rect)
+        aligned_face = dlib.get_face_chip(img, landmarks, size=160)
+        return aligned_face, assess_face(rect, landmarks, aligned_face)
+
+    @property
+    def face_encoder(self):
+        return self.encoders.get()
+
     def get_encode(self, face):
         """Get face encoding using the InceptionResNetV2 model"""
+        if self.batcher:
+            return self.batcher(face)
         face = cv2.resize(face, self.required_size)
         face = face.astype('float32') / 255.0
         encode = self.face_encoder.predict(np.expand_dims(face, axis=0))[0]
         return encode
 
-    def load_encodings(self):
-        """Load saved face encodings from pickle file"""
-        try:
-            with open("assets/encodings/encodings.pkl", "rb") as f:
-                return pickle.load(f)
-        except FileNotFoundError:
-            print("No encodings file found")
-            return None
-        except Exception as e:
-            print(f"Error loading encodings: {e}")
-            return None
+    def get_encodes(self, faces, model=None):
+        """Encode a list of aligned faces in one forward pass, with the gallery's model by default"""
+        batch = np.stack([cv2.resize(face, self.required_size) for face in faces])
+        batch = batch.astype('float32') / 255.0
+        return self.encoders.get(model).predict_on_batch(batch)
 
-    def detect_face(self, image_path):
-        """Detect and recognize faces in the image"""
+    def detect_face(self, image_path, nearby=None):
+        """Detect and recognize faces in the image
+
+        If nearby names are given they are scored first, and the rest of the
+        gallery is only scanned when none of them reaches NEARBY_STOP_CONFIDENCE.
+        Raises FaceRejected when the photo cannot be matched by face at all.
+        """
         try:
-            img = cv2.imread(image_path)
-            if img is None:
-                print("Error loading image")
-                return None
+            with span('face.decode'):
+                img = cv2.imread(image_path)
+                if img is None:
+                    raise FaceRejected('unreadable_image', "The photo could not be read as an image")
 
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            faces = self.detector(img_rgb)
+                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+            with span('face.detect'):
+                faces = self.detector(img_rgb)
             
             if not faces:
-                print("No faces detected in the image")
-                return None
+                raise FaceRejected('no_face', "No face was found in the photo")
 
             # Get encodings for the uploaded image
-            aligned_face = self.get_aligned_face(img_rgb, faces[0])
-            encode = self.get_encode(aligned_face)
+            with span('face.align'):
+                aligned_face, quality = self.get_aligned_face_with_quality(img_rgb, faces[0])
+            # Skip the encoder for faces too blurred, small, dark or turned to match reliably
+            if quality['score'] < FACE_QUALITY_MIN_QUERY:
+                print(f"Face quality too low to match: {quality['score']:.2f} {quality['scores']}")
+                raise FaceRejected('low_face_quality', "The face is too small, blurred, dark or turned away "
+                                   "to match; a clearer, front-facing photo is needed", quality)
+            with span('face.encode'):
+                encode = self.get_encode(aligned_face)
             
-            # Load existing encodings
-            encoding_dict = self.load_encodings()
-            if not encoding_dict:
+            # Load existing encodings, memory-mapped and only re-read when retrained
+            with span('face.load_encodings'):
+                gallery = get_sharded_gallery() if sharding_enabled() else load_gallery()
+            if not gallery:
                 return None
 
             # Find matches
-            matches = []
-            for db_name, db_encode in encoding_dict.items():
-                dist = cosine(db_encode, encode)
-                if dist < self.recognition_t:
-                    confidence = 1 - dist  # Convert distance to confidence score
-                    matches.append((db_name, confidence))
-
-            # Sort by confidence
-            matches.sort(key=lambda x: x[1], reverse=True)
+            matches = None
+            if nearby and hasattr(gallery, 'match_subset'):
+                with span('face.match_nearby'):
+                    matches = gallery.match_subset(encode, self.recognition_t, nearby)
+                early_stop = bool(matches) and matches[0][1] >= NEARBY_STOP_CONFIDENCE
+                registry.inc('nearby_first_total', labels={'outcome': 'early_stop' if early_stop else 'full_scan'},
+                             help_text='Nearby-first matches by whether the full gallery scan was skipped')
+                if not early_stop:
+                    matches = None
+            if matches is None:
+                with span('face.match'):
+                    matches = gallery.match(encode, self.recognition_t)
+
+            # During a model migration also score against the cases already re-embedded
+            staged = staged_gallery()
+            if staged:
+                with span('face.match_staged'):
+                    model, staged_shard = staged
+                    staged_encode = self.get_encodes([aligned_face], model)[0]
+                    staged_t = model_threshold(model)
+                    staged_matches = staged_shard.match(staged_encode, staged_t)
+                    matches = merge_matches(matches, rescale_matches(staged_matches, staged_t, self.recognition_t))
             return matches
 
+        except FaceRejected:
+            raise
         except Exception as e:
             print(f"Error in detect_face: {e}")
             return None
+
+    def _video_chip(self, img_rgb, rect):
+        """Aligned chip for a track, None if it fails the quality gate"""
+        aligned_face, quality = self.get_aligned_face_with_quality(img_rgb, rect)
+        return aligned_face if quality['score'] >= FACE_QUALITY_MIN_QUERY else None
+
+    def scan_video(self, video_path, sampler=None, tracker=None, batch_size=32):
+        """Track faces through a video clip and match each track against the gallery
+
+        Returns a dict with one entry per face track (best matches and when it
+        was on screen), best match first, and throughput statistics.
+        """
+        sampler = sampler or AdaptiveSampler()
+        tracker = tracker or FaceTracker()
+        stats = {}
+        frames_sampled = 0
+        start, cpu_start = time.perf_counter(), time.process_time()
+
+        for frame_index, timestamp, frame in iter_frames(video_path, sampler, stats):
+            frames_sampled += 1
+            with span('video.detect'):
+                img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                scale = min(1.0, VIDEO_DETECT_WIDTH / img_rgb.shape[1])
+                small = cv2.resize(img_rgb, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else img_rgb
+                faces = self.detector(small)
+
+            detections = []
+            for face in faces:
+                rect = dlib.rectangle(int(face.left() / scale), int(face.top() / scale),
+                                      int(face.right() / scale), int(face.bottom() / scale))
+                box = (rect.left(), rect.top(), rect.right(), rect.bottom())
+                detections.append((box, lambda rect=rect, img_rgb=img_rgb: self._video_chip(img_rgb, rect)))
+            tracker.update(frame_index, timestamp, detections)
+            sampler.update(frame_index, bool(detections))
+
+        # Encode the kept chips of every track in batches, then average per track
+        tracks = [track for track in tracker.close() if track.chips]
+        chips = [chip for track in tracks for _, chip in track.chips]
+        with span('video.encode'):
+            encodes = [self.get_encodes(chips[i:i + batch_size]) for i in range(0, len(chips), batch_size)]
+        encodes = np.concatenate(encodes) if encodes else np.empty((0, 128), dtype=np.float32)
+
+        track_encodes, offset = [], 0
+        for track in tracks:
+            track_encodes.append(encodes[offset:offset + len(track.chips)].mean(axis=0))
+            offset += len(track.chips)
+
+        gallery = get_sharded_gallery() if sharding_enabled() else load_gallery()
+        with span('video.match'):
+            track_matches = gallery.match_many(track_encodes, self.recognition_t) if gallery else [[] for _ in tracks]
+
+        results = []
+        for track, matches in zip(tracks, track_matches):
+            results.append({
+                'track_id': track.track_id,
+                'first_seen': round(track.first_seen, 2),
+                'last_seen': round(track.last_seen, 2),
+                'first_frame': track.first_frame,
+                'last_frame': track.last_frame,
+                'chips_encoded': len(track.chips),
+                'best_match': matches[0][0] if matches else None,
+                'confidence': matches[0][1] if matches else None,
+                'matches': matches[:5],
+            })
+        results.sort(key=lambda r: r['confidence'] or 0, reverse=True)
+
+        elapsed = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+        frames_read = stats.get('frames_read', 0)
+        return {
+            'tracks': results,
+            'stats': {
+                'video_fps': stats.get('fps'),
+                'frames_read': frames_read,
+                'frames_sampled': frames_sampled,
+                'tracks': len(tracks),
+                'chips_encoded': len(chips),
+                'seconds': elapsed,
+                'frames_per_second': frames_read / elapsed if elapsed else None,
+                # CPU seconds across all threads, so this is throughput per busy core
+                'frames_per_cpu_second': frames_read / cpu_seconds if cpu_seconds else None,
+            },
+        }
@@ -0,0 +1,155 @@
+import argparse
+import csv
+import json
+import os
+import time
+import numpy as np
+from utils.evaluation import evaluate_embeddings, evaluate_mole_scores
+from utils.gallery import RECOGNITION_THRESHOLD
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def walk_labelled(root_dir):
+    """[(image path, label)] for every <root>/<label>/<image>"""
+    images = []
+    for label in sorted(os.listdir(root_dir)):
+        label_dir = os.path.join(root_dir, label)
+        if os.path.isdir(label_dir):
+            images.extend((os.path.join(label_dir, name), label) for name in sorted(os.listdir(label_dir))
+                          if name.lower().endswith(IMAGE_EXTENSIONS))
+    return images
+
+
+def embed_images(images, workers=None, batch_size=64):
+    """Detect, align and encode every image once through the batched enrolment pipeline
+
+    No quality gate is applied, so the metrics cover everything a face was
+    found in. The chip store is left alone: evaluation photos are not cases,
+    and --embeddings already caches the result. Returns (embeddings, labels)
+    for the images with a face.
+    """
+    from train import FaceTrainer
+    from utils.face_chips import ChipExtractor
+
+    trainer = FaceTrainer()
+    with ChipExtractor(workers, store=None, min_quality=0) as extractor:
+        extracted = extractor.extract([path for path, _ in images])
+    found = [(chip, label) for (chip, _), (_, label) in zip(extracted, images) if chip is not None]
+    print(f"Faces found in {len(found)} of {len(images)} images")
+    embeddings = trainer.get_encodes([chip for chip, _ in found], batch_size)
+    return embeddings, [label for _, label in found]
+
+
+def load_or_embed(root_dir, cache_path, workers):
+    if cache_path and os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        print(f"Loaded {len(cached['embeddings'])} embeddings from {cache_path}")
+        return cached['embeddings'], cached['labels'].tolist()
+    embeddings, labels = embed_images(walk_labelled(root_dir), workers)
+    if cache_path:
+        np.savez(cache_path, embeddings=embeddings, labels=np.asarray(labels))
+    return embeddings, labels
+
+
+def write_curves(curve, output_dir):
+    """ROC and DET points as CSV, and as plots when matplotlib is installed"""
+    keep = np.r_[0, np.flatnonzero(np.diff(curve['far']) + np.abs(np.diff(curve['tar'])) > 0) + 1]
+    with open(os.path.join(output_dir, 'roc.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['threshold', 'far', 'tar', 'frr'])
+        for i in keep:
+            writer.writerow([f"{curve['threshold'][i]:.4f}", curve['far'][i], curve['tar'][i], curve['frr'][i]])
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from scipy.stats import norm
+    except ImportError:
+        print("matplotlib is not installed, curves written as roc.csv only")
+        return
+
+    far, tar, frr = curve['far'][keep], curve['tar'][keep], curve['frr'][keep]
+    fig, (roc, det) = plt.subplots(1, 2, figsize=(11, 5))
+    roc.semilogx(np.maximum(far, 1e-7), tar)
+    roc.set(xlabel='False accept rate', ylabel='True accept rate', title='ROC')
+    roc.grid(True, which='both', alpha=0.3)
+    clipped = lambda rate: norm.ppf(np.clip(rate, 1e-6, 1 - 1e-6))
+    det.plot(clipped(far), clipped(frr))
+    ticks = [0.001, 0.01, 0.05, 0.2, 0.5]
+    det.set_xticks(clipped(np.array(ticks)), [str(t) for t in ticks])
+    det.set_yticks(clipped(np.array(ticks)), [str(t) for t in ticks])
+    det.set(xlabel='False accept rate', ylabel='False reject rate', title='DET')
+    det.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(os.path.join(output_dir, 'roc_det.png'), dpi=120)
+
+
+def evaluate_moles(pairs_path):
+    """Mole thresholds from a CSV of labelled pairs: description, stored_description, same (0/1)"""
+    from utils.match_engine import CandidateScorer
+    with open(pairs_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    by_query = {}
+    for row in rows:
+        by_query.setdefault(row['description'], []).append(row)
+    scorer = CandidateScorer()
+    fuzzy, tfidf, same = [], [], []
+    for description, group in by_query.items():
+        group_fuzzy, group_tfidf = scorer.text_scores(description, [row['stored_description'] for row in group])
+        fuzzy.extend(group_fuzzy)
+        tfidf.extend(group_tfidf)
+        same.extend(row['same'].strip() in ('1', 'true', 'yes') for row in group)
+    results = evaluate_mole_scores(fuzzy, tfidf, same)
+    current = next((r for r in results if r['fuzzy_accept'] == scorer.fuzzy_accept
+                    and r['tfidf_accept'] == scorer.tfidf_accept), None)
+    # Ties go to the stricter thresholds
+    best = max(results, key=lambda r: (r['f1'], r['precision'], r['tfidf_accept'], r['fuzzy_accept']))
+    return {'pairs': len(rows), 'current': current, 'recommended': best}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate face match thresholds on a labelled <root>/<person>/ tree")
+    parser.add_argument('root_dir', nargs='?', default='assets/dataset')
+    parser.add_argument('--output-dir', default='evaluation', help="Report, ROC/DET points and plots")
+    parser.add_argument('--embeddings', help="Cache of embeddings (.npz), reused on later runs")
+    parser.add_argument('--target-far', type=float, default=1e-3, help="False accept rate to recommend a threshold for")
+    parser.add_argument('--workers', type=int, default=None, help="Face detection processes (default: all cores)")
+    parser.add_argument('--mole-pairs', help="CSV of labelled mole description pairs to calibrate the mole thresholds")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+    embeddings, labels = load_or_embed(args.root_dir, args.embeddings, args.workers)
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report, curve = evaluate_embeddings(embeddings, labels, RECOGNITION_THRESHOLD, args.target_far)
+    report['embed_seconds'] = round(embed_seconds, 2)
+    report['evaluate_seconds'] = round(time.perf_counter() - start, 2)
+    if args.mole_pairs:
+        report['mole'] = evaluate_moles(args.mole_pairs)
+    write_curves(curve, args.output_dir)
+    with open(os.path.join(args.output_dir, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{report['images']} images of {report['people']} people: {report['genuine_pairs']} genuine and "
+          f"{report['impostor_pairs']} impostor pairs in {report['evaluate_seconds']}s")
+    for point in report['tar_at_far']:
+        print(f"  TAR {point['tar']:.4f} @ FAR {point['far_target']:g} (threshold {point['threshold']})")
+    eer = report['equal_error_rate']
+    print(f"  EER {eer['eer']:.4f} at threshold {eer['threshold']}")
+    current, recommended = report['current'], report['recommended']
+    print(f"Current RECOGNITION_THRESHOLD={current['threshold']}: TAR {current['tar']:.4f}, FAR {current['far']:.5f}, "
+          f"rank-1 {current['identification']['rank1_rate']:.4f}")
+    print(f"Recommended RECOGNITION_THRESHOLD={recommended['threshold']} for FAR <= {args.target_far:g}: "
+          f"TAR {recommended['tar']:.4f}, rank-1 {recommended['identification']['rank1_rate']:.4f}")
+    if 'mole' in report:
+        best = report['mole']['recommended']
+        print(f"Recommended FUZZY_ACCEPT_SCORE={best['fuzzy_accept']} TFIDF_ACCEPT_SCORE={best['tfidf_accept']}: "
+              f"precision {best['precision']:.3f}, recall {best['recall']:.3f}")
+    print(f"Report written to {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import csv
+import pickle
+from utils.case_dedup import DEDUP_REPORT_MIN, find_duplicate_cases
+from utils.gallery import ENCODINGS_PATH, GALLERY_INDEX_PATH, GalleryMatrix
+
+
+def load_matrix():
+    """Names and memory-mapped matrix of the published gallery"""
+    try:
+        return GalleryMatrix.load(GALLERY_INDEX_PATH)
+    except FileNotFoundError:
+        with open(ENCODINGS_PATH, 'rb') as f:
+            return GalleryMatrix.from_dict(pickle.load(f))
+
+
+def attach_case_ids(candidates, batch_size=1000):
+    """Add the case ids behind each name, a name can belong to several cases"""
+    from utils.db_manager import DatabaseManager
+    names = sorted({c['name_a'] for c in candidates} | {c['name_b'] for c in candidates})
+    case_ids = {}
+    db = DatabaseManager()
+    try:
+        for start in range(0, len(names), batch_size):
+            for row in db.get_cases_for_names(names[start:start + batch_size]):
+                case_ids.setdefault(row['child_name'], []).append(row['case_id'])
+    finally:
+        db.close()
+    for candidate in candidates:
+        candidate['case_ids_a'] = ' '.join(case_ids.get(candidate['name_a'], []))
+        candidate['case_ids_b'] = ' '.join(case_ids.get(candidate['name_b'], []))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find cases that are likely the same child reported twice")
+    parser.add_argument('--output', default='duplicate_cases.csv', help="Merge-candidate report (CSV)")
+    parser.add_argument('--min-score', type=float, default=DEDUP_REPORT_MIN,
+                        help="Combined face and name score worth reporting")
+    parser.add_argument('--with-case-ids', action='store_true', help="Look up the case ids of each pair")
+    args = parser.parse_args()
+
+    gallery = load_matrix()
+    print(f"Comparing {len(gallery)} cases")
+    last_reported = [0]
+
+    def progress(done, total):
+        percent = 100 * done // total
+        if percent >= last_reported[0] + 5:
+            last_reported[0] = percent
+            print(f"  face similarity: {percent}% of tiles")
+
+    candidates, timings = find_duplicate_cases(gallery.names, gallery.matrix, report_min=args.min_score,
+                                               progress=progress)
+    if args.with_case_ids and candidates:
+        attach_case_ids(candidates)
+
+    fields = ['score', 'face_similarity', 'name_score', 'name_a', 'name_b', 'found_by']
+    if args.with_case_ids:
+        fields += ['case_ids_a', 'case_ids_b']
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(candidates)
+    print(f"{len(candidates)} merge candidates written to {args.output} "
+          f"(face {timings['face_seconds']:.1f}s, names {timings['name_seconds']:.1f}s, "
+          f"scoring {timings['score_seconds']:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
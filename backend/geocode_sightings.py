@@ -0,0 +1,24 @@
+import argparse
+from utils.db_manager import DatabaseManager
+from utils.geo import GAZETTEER_PATH, get_gazetteer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geocode stored sighting locations against the local gazetteer")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Sightings geocoded per transaction")
+    args = parser.parse_args()
+
+    if get_gazetteer() is None:
+        print(f"Add a gazetteer CSV at {GAZETTEER_PATH} first")
+        return
+
+    db = DatabaseManager()
+    try:
+        geocoded = db.geocode_sightings(batch_size=args.batch_size)
+        print(f"Geocoded {geocoded} sightings")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import multiprocessing
+import os
+
+# Preforking production server, see wsgi.py for what is loaded before fork
+bind = os.getenv('BIND', '0.0.0.0:5000')
+preload_app = True
+
+cores = multiprocessing.cpu_count()
+intra_op_threads = int(os.getenv('TF_INTRA_OP_THREADS', '0'))
+workers = int(os.getenv('WEB_CONCURRENCY', '0')) or max(1, cores // (intra_op_threads or 2))
+
+# Split the cores between workers unless the inference threads are set explicitly
+if not intra_op_threads:
+    os.environ['TF_INTRA_OP_THREADS'] = str(max(1, cores // workers))
+os.environ.setdefault('TF_INTER_OP_THREADS', '1')
+
+# A few request threads per worker so I/O-bound requests do not queue behind inference
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    """Build the encoder and scorer and start the SMS dispatcher in each worker before it accepts requests"""
+    from app import WORKER_COMPONENTS
+    from utils import components
+    components.warm_up(WORKER_COMPONENTS)
@@ -0,0 +1,197 @@
+import argparse
+import os
+import pickle
+import time
+import uuid
+from train import FaceTrainer, ENCODINGS_PATH
+from utils.db_manager import DatabaseManager, sanitize_filename
+from utils.chip_store import get_chip_store
+from utils.face_chips import ChipExtractor
+from utils.photo_dedup import PHOTO_DEDUP, dedupe_paths, find_duplicates
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+# Stable namespace so re-running an import maps each folder to the same case id
+IMPORT_NAMESPACE = uuid.UUID('6f1c2a52-8d0e-4c51-9a57-3f0b2f7d6a10')
+# How often the gallery is published while encoding, so an interrupted run keeps the cases encoded so far
+IMPORT_CHECKPOINT_SECONDS = float(os.getenv('IMPORT_CHECKPOINT_SECONDS', '300'))
+
+
+def walk_dataset(root_dir):
+    """Yield (child_name, [image paths]) for every <root>/<name>/ folder"""
+    for child_name in sorted(os.listdir(root_dir)):
+        child_dir = os.path.join(root_dir, child_name)
+        if not os.path.isdir(child_dir):
+            continue
+        img_paths = [
+            os.path.join(child_dir, img_name)
+            for img_name in sorted(os.listdir(child_dir))
+            if img_name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+        if img_paths:
+            yield child_name, img_paths
+
+
+def batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def batched_by_images(people, max_images):
+    """Group (name, [image paths]) pairs so each group holds about max_images images"""
+    batch, count = [], 0
+    for name, img_paths in people:
+        if batch and count + len(img_paths) > max_images:
+            yield batch
+            batch, count = [], 0
+        batch.append((name, img_paths))
+        count += len(img_paths)
+    if batch:
+        yield batch
+
+
+def _record_dedup(report, child_name, kept, suppressed):
+    report['photos_suppressed'] += suppressed
+    if suppressed:
+        report['photo_dedup'][child_name] = {'kept': kept, 'suppressed': suppressed}
+
+
+def case_id_for(source, child_name):
+    return str(uuid.uuid5(IMPORT_NAMESPACE, f"{source}/{child_name}"))
+
+
+def import_cases(root_dir, source, db_batch_size=100, encode_batch_size=64, workers=None, reencode=False,
+                 checkpoint_seconds=IMPORT_CHECKPOINT_SECONDS):
+    """Enrol every folder under root_dir and publish the gallery
+
+    The gallery is published every checkpoint_seconds while encoding and
+    once at the end. Cases already in the published gallery are not encoded
+    again (unless reencode), so an interrupted run resumes from its last
+    checkpoint just as phase 1 resumes from the cases already inserted.
+    """
+    report = {'cases_found': 0, 'cases_inserted': 0, 'cases_skipped': 0, 'photos_inserted': 0,
+              'bytes_inserted': 0, 'photos_suppressed': 0, 'people_encoded': 0, 'images_encoded': 0,
+              'photo_dedup': {}}
+    people = list(walk_dataset(root_dir))
+    report['cases_found'] = len(people)
+
+    # Phase 1: cases and photos, one transaction per batch. Cases already in the
+    # database (from an interrupted earlier run) are skipped, which makes it resumable.
+    start = time.perf_counter()
+    kept_paths = {}
+    db = DatabaseManager()
+    try:
+        for batch in batched(people, db_batch_size):
+            case_ids = [case_id_for(source, child_name) for child_name, _ in batch]
+            existing = db.get_existing_case_ids(case_ids)
+            cases = []
+            for (child_name, img_paths), case_id in zip(batch, case_ids):
+                if case_id in existing:
+                    report['cases_skipped'] += 1
+                    continue
+                photos = []
+                for img_path in img_paths:
+                    with open(img_path, 'rb') as f:
+                        photos.append(f.read())
+                # Near-duplicate shots are neither stored nor encoded
+                kept = find_duplicates(photos) if PHOTO_DEDUP else list(range(len(photos)))
+                kept_paths[child_name] = [img_paths[i] for i in kept]
+                _record_dedup(report, child_name, len(kept), len(photos) - len(kept))
+                cases.append({'child_name': child_name, 'case_id': case_id, 'photos': [photos[i] for i in kept]})
+            if cases:
+                db.insert_missing_children_bulk(cases)
+                report['cases_inserted'] += len(cases)
+                report['photos_inserted'] += sum(len(case['photos']) for case in cases)
+                report['bytes_inserted'] += sum(len(photo) for case in cases for photo in case['photos'])
+            print(f"Inserted {report['cases_inserted']} / skipped {report['cases_skipped']} "
+                  f"of {len(people)} cases")
+    finally:
+        db.close()
+    report['db_seconds'] = time.perf_counter() - start
+
+    # Phase 2: encode everyone not yet in the gallery through the parallel pipeline
+    start = time.perf_counter()
+    encoding_dict = {}
+    if os.path.exists(ENCODINGS_PATH):
+        with open(ENCODINGS_PATH, 'rb') as f:
+            encoding_dict = pickle.load(f)
+
+    pending = [(sanitize_filename(child_name), child_name, img_paths) for child_name, img_paths in people]
+    if not reencode:
+        pending = [(key, child_name, img_paths) for key, child_name, img_paths in pending if key not in encoding_dict]
+    # Cases inserted by an earlier run were not deduplicated in phase 1
+    pending = [(key, kept_paths[child_name] if child_name in kept_paths else dedupe_paths(img_paths))
+               for key, child_name, img_paths in pending]
+
+    trainer = FaceTrainer()
+    quality = {}
+    checkpoint_time = 0.0
+    last_checkpoint = time.perf_counter()
+    with ChipExtractor(workers, store=get_chip_store()) as extractor:
+        # Bound memory by holding only a few encoder batches worth of chips at a time
+        for batch in batched_by_images(pending, encode_batch_size * 4):
+            encoded = trainer.encode_people(dict(batch), extractor, encode_batch_size, quality=quality)
+            encoding_dict.update(encoded)
+            report['people_encoded'] += len(encoded)
+            report['images_encoded'] += sum(len(img_paths) for _, img_paths in batch)
+            print(f"Encoded {report['people_encoded']} of {len(pending)} pending cases")
+            if time.perf_counter() - last_checkpoint >= checkpoint_seconds:
+                checkpoint_start = time.perf_counter()
+                trainer.save_encodings(encoding_dict, quality=quality)
+                last_checkpoint = time.perf_counter()
+                checkpoint_time += last_checkpoint - checkpoint_start
+                print(f"Checkpoint: published {len(encoding_dict)} gallery entries")
+    report['encode_seconds'] = time.perf_counter() - start - checkpoint_time
+    report['faces_rejected'] = sum(entry['rejected'] for entry in quality.values())
+    report['faces_collapsed'] = sum(entry['collapsed'] for entry in quality.values())
+    report['cases_below_gate'] = sum(1 for entry in quality.values() if entry['below_gate'])
+
+    # Phase 3: publish the merged gallery in one atomic write
+    start = time.perf_counter()
+    trainer.save_encodings(encoding_dict, quality=quality)
+    report['publish_seconds'] = time.perf_counter() - start + checkpoint_time
+    report['gallery_size'] = len(encoding_dict)
+    return report
+
+
+def print_report(report):
+    db_seconds = report['db_seconds'] or 1e-9
+    encode_seconds = report['encode_seconds'] or 1e-9
+    print("Import summary")
+    print(f"  cases: {report['cases_found']} found, {report['cases_inserted']} inserted, "
+          f"{report['cases_skipped']} already imported")
+    print(f"  database: {report['photos_inserted']} photos, {report['bytes_inserted'] / 1e6:.1f} MB "
+          f"in {report['db_seconds']:.1f}s ({report['photos_inserted'] / db_seconds:.1f} photos/s, "
+          f"{report['bytes_inserted'] / 1e6 / db_seconds:.1f} MB/s)")
+    print(f"  encoding: {report['images_encoded']} images for {report['people_encoded']} cases "
+          f"in {report['encode_seconds']:.1f}s ({report['images_encoded'] / encode_seconds:.1f} images/s), "
+          f"{report['faces_rejected']} faces below the quality gate, "
+          f"{report['faces_collapsed']} near-identical faces counted once")
+    print(f"  duplicates: {report['photos_suppressed']} near-duplicate photos suppressed "
+          f"in {len(report['photo_dedup'])} cases")
+    for child_name, counts in sorted(report['photo_dedup'].items(), key=lambda item: -item[1]['suppressed'])[:10]:
+        print(f"    {child_name}: kept {counts['kept']}, suppressed {counts['suppressed']}")
+    print(f"  publish: {report['gallery_size']} gallery entries in {report['publish_seconds']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk enrol missing children from a <root>/<name>/*.jpg tree")
+    parser.add_argument('root_dir', help="Directory with one sub-folder of photos per child")
+    parser.add_argument('--source', default=None,
+                        help="Partner/source label used to derive stable case ids (defaults to the folder name)")
+    parser.add_argument('--db-batch-size', type=int, default=100, help="Cases per database transaction")
+    parser.add_argument('--encode-batch-size', type=int, default=64, help="Faces per encoder batch")
+    parser.add_argument('--workers', type=int, default=None, help="Face detection processes (default: all cores)")
+    parser.add_argument('--reencode', action='store_true', help="Re-encode cases already in the gallery")
+    parser.add_argument('--checkpoint-seconds', type=float, default=IMPORT_CHECKPOINT_SECONDS,
+                        help="Publish the gallery this often while encoding")
+    args = parser.parse_args()
+
+    source = args.source or os.path.basename(os.path.normpath(args.root_dir))
+    report = import_cases(args.root_dir, source, args.db_batch_size, args.encode_batch_size,
+                          args.workers, args.reencode, args.checkpoint_seconds)
+    print_report(report)
+
+
+if __name__ == '__main__':
+    main()
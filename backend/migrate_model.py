@@ -0,0 +1,34 @@
+import argparse
+import json
+from utils.model_versions import MIGRATION_BATCH_CASES, MIGRATION_PAUSE_SECONDS, ReEmbedJob, migration_progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed the gallery with another embedding model")
+    parser.add_argument('target', nargs='?', help="Model version from the model registry")
+    parser.add_argument('--batch-cases', type=int, default=MIGRATION_BATCH_CASES, help="Cases re-embedded per batch")
+    parser.add_argument('--pause', type=float, default=MIGRATION_PAUSE_SECONDS, help="Seconds to pause between batches")
+    parser.add_argument('--switch', action='store_true', help="Publish the new gallery when re-embedding finishes")
+    parser.add_argument('--force', action='store_true', help="Switch even if some cases have no stored face chips")
+    parser.add_argument('--status', action='store_true', help="Only print the progress of the current migration")
+    args = parser.parse_args()
+
+    if args.status or not args.target:
+        print(json.dumps(migration_progress(), indent=2))
+        return
+
+    job = ReEmbedJob(args.target, batch_cases=args.batch_cases, pause_seconds=args.pause,
+                     switch_when_done=args.switch, force=args.force)
+    job.start()
+    try:
+        while job.thread.is_alive():
+            job.thread.join(1)
+    except KeyboardInterrupt:
+        print("Stopping after the current batch")
+        job.stop()
+        job.thread.join()
+    print(json.dumps(migration_progress(job.state), indent=2))
+
+
+if __name__ == '__main__':
+    main()
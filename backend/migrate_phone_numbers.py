@@ -0,0 +1,21 @@
+import argparse
+from utils.db_manager import DatabaseManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store E.164 parent and reporter phone numbers")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Rows normalized per transaction")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    try:
+        migrated = db.migrate_parent_phones(batch_size=args.batch_size)
+        print(f"Normalized {migrated} parent phone numbers")
+        migrated = db.migrate_reporter_phones(batch_size=args.batch_size)
+        print(f"Normalized {migrated} reporter phone numbers")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
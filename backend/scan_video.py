@@ -0,0 +1,41 @@
+import argparse
+import json
+from detect import FaceDetector
+from utils.video import VIDEO_MAX_STRIDE, VIDEO_MIN_STRIDE, AdaptiveSampler, FaceTracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan CCTV clips for faces in the gallery")
+    parser.add_argument('videos', nargs='+', help="Video files to scan")
+    parser.add_argument('--min-stride', type=int, default=VIDEO_MIN_STRIDE, help="Frames between samples with faces in view")
+    parser.add_argument('--max-stride', type=int, default=VIDEO_MAX_STRIDE, help="Frames between samples without faces")
+    parser.add_argument('--chips-per-track', type=int, default=3, help="Views encoded per face track")
+    parser.add_argument('--output', help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    detector = FaceDetector()
+    report = {}
+    for video_path in args.videos:
+        result = detector.scan_video(
+            video_path,
+            sampler=AdaptiveSampler(args.min_stride, args.max_stride),
+            tracker=FaceTracker(chips_per_track=args.chips_per_track)
+        )
+        report[video_path] = result
+        stats = result['stats']
+        print(f"{video_path}: {stats['frames_read']} frames, {stats['frames_sampled']} sampled, "
+              f"{stats['tracks']} tracks, {stats['frames_per_second']:.1f} fps, "
+              f"{stats['frames_per_cpu_second']:.1f} frames per CPU second")
+        for track in result['tracks']:
+            if track['best_match']:
+                print(f"  track {track['track_id']} {track['first_seen']}s-{track['last_seen']}s: "
+                      f"{track['best_match']} ({track['confidence']:.2f})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import pickle
+import time
+from socketserver import ThreadingMixIn
+from xmlrpc.server import SimpleXMLRPCServer
+import numpy as np
+from utils.gallery import ENCODINGS_PATH
+from utils.gallery_shards import GALLERY_SHARD_DIR, LocalShard, publish_shards, shard_index_path
+
+
+class ThreadingXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+def serve(index_path, host, port):
+    """Serve one gallery shard over XML-RPC, a stand-in for a shard on another node"""
+    shard = LocalShard(index_path)
+
+    def match(encode, recognition_t):
+        return [[name, confidence] for name, confidence in
+                shard.match(np.asarray(encode, dtype=np.float32), recognition_t)]
+
+    def match_subset(encode, recognition_t, names):
+        return [[name, confidence] for name, confidence in
+                shard.match_subset(np.asarray(encode, dtype=np.float32), recognition_t, names)]
+
+    def version():
+        # Inode and mtime overflow XML-RPC integers, callers only compare it for equality
+        return repr(shard.version())
+
+    server = ThreadingXMLRPCServer((host, port), allow_none=True, logRequests=False)
+    server.register_function(match, 'match')
+    server.register_function(match_subset, 'match_subset')
+    server.register_function(version, 'version')
+    print(f"Serving {index_path} on http://{host}:{port}")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and serve sharded face galleries")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help="Split encodings.pkl into shards")
+    build.add_argument('--shards', type=int, required=True, help="Number of shards")
+    build.add_argument('--dir', default=GALLERY_SHARD_DIR, help="Directory holding the shards")
+    build.add_argument('--encodings', default=ENCODINGS_PATH, help="Pickled gallery to split")
+
+    serve_parser = subparsers.add_parser('serve', help="Serve one shard over XML-RPC")
+    serve_parser.add_argument('--shard', type=int, required=True, help="Shard id to serve")
+    serve_parser.add_argument('--dir', default=GALLERY_SHARD_DIR, help="Directory holding the shards")
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=8001)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        with open(args.encodings, 'rb') as f:
+            encoding_dict = pickle.load(f)
+        start = time.perf_counter()
+        changed = publish_shards(encoding_dict, args.dir, args.shards)
+        print(f"Published {len(encoding_dict)} encodings into {args.shards} shards "
+              f"({len(changed)} rewritten) in {time.perf_counter() - start:.2f}s")
+    else:
+        serve(shard_index_path(args.dir, args.shard), args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from rapidfuzz import fuzz
+from utils.case_dedup import _NeighbourBuffer, face_candidates, find_duplicate_cases, name_blocks, \
+    name_candidates, normalize_name
+
+THRESHOLD = 0.7
+
+
+def clustered_matrix(n=300, clusters=40, noise=0.6, seed=0):
+    """L2-normalised rows in tight clusters, so plenty of pairs pass the threshold"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, 32)).astype(np.float32)
+    matrix = centres[rng.integers(clusters, size=n)] + rng.standard_normal((n, 32)).astype(np.float32) * noise
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def brute_force_pairs(matrix, threshold, k):
+    """Each row's k most similar rows at or above threshold, as undirected pairs"""
+    sims = matrix @ matrix.T
+    np.fill_diagonal(sims, -1.0)
+    pairs = set()
+    for i, row in enumerate(sims):
+        neighbours = np.flatnonzero(row >= threshold)
+        for j in neighbours[np.argsort(-row[neighbours])][:k]:
+            pairs.add((min(i, int(j)), max(i, int(j))))
+    return pairs
+
+
+def borderline(matrix, pairs, threshold):
+    """Pairs within float rounding of the threshold, which tiling may place either side of it"""
+    return {(i, j) for i, j in pairs if abs(float(matrix[i] @ matrix[j]) - threshold) < 1e-5}
+
+
+@pytest.mark.parametrize('tile_rows', [7, 64, 1000])
+def test_face_candidates_match_brute_force(tile_rows):
+    matrix = clustered_matrix()
+    expected = brute_force_pairs(matrix, THRESHOLD, k=len(matrix))
+    assert len(expected) > 500
+    found = set(zip(*(side.tolist() for side in face_candidates(matrix, THRESHOLD, tile_rows, k=len(matrix)))))
+    assert found ^ expected <= borderline(matrix, found | expected, THRESHOLD)
+
+
+def test_face_candidates_keep_the_best_k_neighbours_of_each_case():
+    matrix = clustered_matrix()
+    expected = brute_force_pairs(matrix, THRESHOLD, k=2)
+    found = set(zip(*(side.tolist() for side in face_candidates(matrix, THRESHOLD, tile_rows=16, k=2))))
+    assert found == expected
+
+
+def test_neighbour_buffer_compaction_keeps_the_same_pairs():
+    rng = np.random.default_rng(1)
+    edges = [(rng.integers(200, size=500), rng.integers(200, size=500), rng.random(500).astype(np.float32))
+             for _ in range(20)]
+    results = []
+    for max_edges in (50, 10 ** 9):
+        buffer = _NeighbourBuffer(k=3, max_edges=max_edges)
+        for sources, targets, sims in edges:
+            keep = sources != targets
+            buffer.add(sources[keep], targets[keep], sims[keep])
+        results.append(set(zip(*(side.tolist() for side in buffer.pairs()))))
+    assert results[0] == results[1]
+
+
+NAMES = ['Asha Kumari', 'Aasha Kumari', 'Asha Kumar', 'Ravi Shankar', 'Ravi Sankar', 'Meena Iyer',
+         'Meenaa Iyer', 'Rahul Verma', 'Rahul Varma', 'Priya Nair', 'Priyanka Nair', 'Anil Kapoor']
+
+
+def test_name_candidates_match_brute_force_within_blocks():
+    matrix = np.repeat(clustered_matrix(n=1, clusters=1), len(NAMES), axis=0)
+    matrix[-1] = -matrix[-1]  # Anil's face is nothing like anyone's
+    block_of = {i: key for key, members in name_blocks(NAMES).items() for i in members}
+    expected = set()
+    for i in range(len(NAMES)):
+        for j in range(i + 1, len(NAMES)):
+            (fi, li, bi), (fj, lj, bj) = block_of[i], block_of[j]
+            same_block = fi == fj and li == lj and abs(bi - bj) <= 1
+            similar = fuzz.ratio(normalize_name(NAMES[i]), normalize_name(NAMES[j])) >= 85
+            if same_block and similar and float(matrix[i] @ matrix[j]) >= 0.5:
+                expected.add((i, j))
+    found = set(zip(*(side.tolist() for side in name_candidates(NAMES, matrix, tile_rows=2, workers=1))))
+    assert found == expected
+    assert (NAMES.index('Ravi Shankar'), NAMES.index('Ravi Sankar')) in found
+
+
+def test_find_duplicate_cases_reports_pairs_found_by_face_and_name():
+    matrix = clustered_matrix(n=len(NAMES), clusters=len(NAMES), noise=0.0, seed=3)
+    matrix[NAMES.index('Aasha Kumari')] = matrix[NAMES.index('Asha Kumari')]
+    candidates, timings = find_duplicate_cases(NAMES, matrix)
+    best = candidates[0]
+    assert {best['name_a'], best['name_b']} == {'Asha Kumari', 'Aasha Kumari'}
+    assert best['found_by'] == 'face+name'
+    assert [c['score'] for c in candidates] == sorted((c['score'] for c in candidates), reverse=True)
+    assert set(timings) == {'face_seconds', 'name_seconds', 'score_seconds'}
@@ -0,0 +1,37 @@
+import io
+import os
+from benchmarks.standins import LONG_DATA_CHUNK, FakeConnection
+from utils.db_manager import PHOTO_STREAM_THRESHOLD_BYTES, DatabaseManager
+
+
+class Upload(io.BytesIO):
+    """Upload stream recording the size of every read"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+def insert_photos(use_pure):
+    connection = FakeConnection(round_trip_ms=0, use_pure=use_pure)
+    db = DatabaseManager(connection=connection)
+    small, large = Upload(b'small photo'), Upload(os.urandom(PHOTO_STREAM_THRESHOLD_BYTES + 1))
+    sent = connection.bytes_sent
+    db._insert_photos('case-1', [small, large])
+    return connection.bytes_sent - sent, large
+
+
+def test_large_upload_is_sent_as_bytes_without_pure_python_protocol():
+    sent, large = insert_photos(use_pure=False)
+    assert sent >= PHOTO_STREAM_THRESHOLD_BYTES + 1
+    assert large.reads == [-1]
+
+
+def test_large_upload_is_streamed_with_pure_python_protocol():
+    sent, large = insert_photos(use_pure=True)
+    assert sent >= PHOTO_STREAM_THRESHOLD_BYTES + 1
+    assert set(large.reads) == {LONG_DATA_CHUNK}
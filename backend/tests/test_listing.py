@@ -0,0 +1,64 @@
+import json
+from datetime import datetime
+import pytest
+from utils.listing import LISTING_MAX_LIMIT, decode_cursor, encode_cursor, ndjson_lines, parse_listing_args
+
+
+def rows(start, count):
+    return [{'id': i, 'created_at': datetime(2024, 1, 1, 12, 0, i % 60), 'name': f"case {i}"}
+            for i in range(start, start + count)]
+
+
+def test_cursor_round_trips():
+    row = rows(7, 1)[0]
+    assert decode_cursor(encode_cursor(row)) == (row['created_at'], 7)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not a cursor', encode_cursor(rows(1, 1)[0])[:-3]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_parse_listing_args():
+    after = encode_cursor(rows(3, 1)[0])
+    options = parse_listing_args({'after': after, 'limit': '50', 'order': 'DESC', 'since': '2024-01-01',
+                                  'geohash': 'tdr1', 'child_name': ''}, ('child_name', 'geohash'))
+    assert options == {'geohash': 'tdr1', 'since': datetime(2024, 1, 1), 'after': decode_cursor(after),
+                       'descending': True, 'limit': 50}
+    assert parse_listing_args({}, ('name',)) == {'descending': False}
+
+
+@pytest.mark.parametrize('args', [{'order': 'sideways'}, {'limit': 'ten'}, {'limit': '0'},
+                                  {'limit': str(LISTING_MAX_LIMIT + 1)}, {'until': 'yesterday'}])
+def test_parse_listing_args_rejects(args):
+    with pytest.raises(ValueError):
+        parse_listing_args(args, ())
+
+
+def lines(batches, limit=None):
+    return [json.loads(line) for chunk in ndjson_lines(batches, limit) for line in chunk.splitlines()]
+
+
+def test_ndjson_without_limit_streams_everything():
+    written = lines([rows(0, 3), [], rows(3, 2)])
+    assert [row['id'] for row in written] == [0, 1, 2, 3, 4]
+    assert written[0]['created_at'] == '2024-01-01T12:00:00'
+
+
+def test_ndjson_page_ends_with_the_cursor_of_its_last_row():
+    # The stream holds one row more than the limit, as stream_cases asks for
+    written = lines([rows(0, 3), rows(3, 3)], limit=4)
+    assert [row['id'] for row in written[:-1]] == [0, 1, 2, 3]
+    assert decode_cursor(written[-1]['next_cursor']) == (rows(3, 1)[0]['created_at'], 3)
+
+
+def test_ndjson_page_cut_at_a_batch_boundary():
+    written = lines([rows(0, 2), rows(2, 1)], limit=2)
+    assert [row.get('id') for row in written[:-1]] == [0, 1]
+    assert decode_cursor(written[-1]['next_cursor'])[1] == 1
+
+
+def test_ndjson_last_page_has_no_cursor():
+    written = lines([rows(0, 2)], limit=2)
+    assert [row['id'] for row in written] == [0, 1]
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from utils.gallery import GalleryMatrix, QuantizedGallery
+
+RECOGNITION_T = 0.4
+
+
+@pytest.fixture(scope='module')
+def gallery():
+    rng = np.random.default_rng(0)
+    # Not a multiple of the scan block, so the last block is a partial one
+    vectors = rng.standard_normal((20_000 + 123, 128), dtype=np.float32)
+    return GalleryMatrix.from_dict({f"case-{i:07d}": vector for i, vector in enumerate(vectors)})
+
+
+@pytest.fixture(scope='module')
+def queries(gallery):
+    """Noisy copies of gallery rows, most of them within the recognition threshold"""
+    rng = np.random.default_rng(1)
+    rows = rng.integers(len(gallery), size=100)
+    return np.asarray(gallery.matrix[rows]) + rng.standard_normal((len(rows), 128)).astype(np.float32) * 0.06
+
+
+@pytest.mark.parametrize('dtype', ['int8', 'float16'])
+def test_quantized_recall_against_float32(gallery, queries, dtype):
+    quantized = QuantizedGallery.from_matrix(gallery, dtype)
+    top1 = recall = 0
+    for query in queries:
+        expected = gallery.match(query, RECOGNITION_T)
+        found = quantized.match(query, RECOGNITION_T, rerank_k=100)
+        assert expected
+        top1 += found[:1] == expected[:1]
+        recall += len({name for name, _ in found[:5]} & {name for name, _ in expected[:5]}) / len(expected[:5])
+        # Candidates are re-ranked in float32, so their confidences are exact
+        exact = dict(expected)
+        assert all(confidence == pytest.approx(exact[name], abs=1e-6) for name, confidence in found)
+    assert top1 == len(queries)
+    assert recall / len(queries) >= 0.99
+
+
+def test_rerank_over_the_whole_gallery_is_exact(gallery, queries):
+    quantized = QuantizedGallery.from_matrix(gallery, 'int8')
+    for query in queries[:5]:
+        expected = gallery.match(query, 0.95)
+        found = quantized.match(query, 0.95, rerank_k=len(gallery))
+        assert [name for name, _ in found] == [name for name, _ in expected]
+
+
+def test_saved_quantized_gallery_loads_with_the_same_matches(gallery, queries, tmp_path):
+    index_path = str(tmp_path / 'gallery.json')
+    gallery.save(index_path, quantization='int8')
+    loaded = QuantizedGallery.load(index_path)
+    in_memory = QuantizedGallery.from_matrix(gallery, 'int8')
+    assert loaded.names == gallery.names
+    for query in queries[:10]:
+        assert loaded.match(query, RECOGNITION_T) == in_memory.match(query, RECOGNITION_T)
+
+
+def test_match_subset_is_scored_exactly(gallery, queries):
+    quantized = QuantizedGallery.from_matrix(gallery, 'int8')
+    names = gallery.names[:500] + ['not-in-gallery']
+    assert quantized.match_subset(queries[0], 0.95, names) == gallery.match_subset(queries[0], 0.95, names)
+
+
+def test_unknown_quantization_is_rejected(gallery):
+    with pytest.raises(ValueError):
+        QuantizedGallery.from_matrix(gallery, 'int4')
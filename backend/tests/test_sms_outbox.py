@@ -0,0 +1,87 @@
+import time
+import pytest
+from utils.sms_outbox import FakeSMSProvider, SMSOutbox
+
+
+@pytest.fixture
+def outbox_path(tmp_path):
+    return str(tmp_path / 'outbox.db')
+
+
+def make_outbox(path, provider=None, **options):
+    options.setdefault('backoff_seconds', 0)
+    return SMSOutbox(provider=provider or FakeSMSProvider(), path=path, **options)
+
+
+def test_dispatch_sends_queued_messages(outbox_path):
+    outbox = make_outbox(outbox_path)
+    assert outbox.enqueue('case-1', '+919876543210', 'found')
+    assert outbox.enqueue('case-2', '+919876543210', 'found too')
+    assert outbox.dispatch_pending() == 2
+    assert outbox.provider.sent == [('+919876543210', 'found'), ('+919876543210', 'found too')]
+    assert outbox.stats() == {'sent': 2}
+    assert outbox.dispatch_pending() == 0
+
+
+def test_duplicate_alert_within_window_is_dropped(outbox_path):
+    outbox = make_outbox(outbox_path)
+    assert outbox.enqueue('case-1', '+919876543210', 'found')
+    assert not outbox.enqueue('case-1', '+919876543210', 'found again')
+    assert outbox.enqueue('case-1', '+14155550100', 'found')
+    assert outbox.stats() == {'pending': 2}
+
+
+def test_duplicates_are_dropped_across_outboxes_sharing_a_file(outbox_path):
+    first, second = make_outbox(outbox_path), make_outbox(outbox_path)
+    assert first.enqueue('case-1', '+919876543210', 'found')
+    assert not second.enqueue('case-1', '+919876543210', 'found')
+    assert first.dispatch_pending() + second.dispatch_pending() == 1
+
+
+def test_failed_send_is_retried_then_given_up(outbox_path):
+    outbox = make_outbox(outbox_path, FakeSMSProvider(fail_times=1), max_attempts=2)
+    outbox.enqueue('case-1', '+919876543210', 'found')
+    assert outbox.dispatch_pending() == 0
+    assert outbox.stats() == {'pending': 1}
+    assert outbox.dispatch_pending() == 1
+
+    outbox = make_outbox(outbox_path, FakeSMSProvider(fail_times=5), max_attempts=2, dedup_window_seconds=0)
+    outbox.enqueue('case-2', '+919876543210', 'found')
+    outbox.dispatch_pending()
+    outbox.dispatch_pending()
+    assert outbox.stats() == {'sent': 1, 'failed': 1}
+    # A failed alert does not block the next one
+    outbox.dedup_window_seconds = 900
+    assert outbox.enqueue('case-2', '+919876543210', 'found')
+
+
+def test_message_claimed_by_a_dead_process_is_sent_after_its_lease(outbox_path):
+    crashed = make_outbox(outbox_path)
+    crashed.enqueue('case-1', '+919876543210', 'found')
+    crashed.db.execute("UPDATE sms_outbox SET status = 'sending', claimed_at = ?", (time.time(),))
+    crashed.db.commit()
+
+    survivor = make_outbox(outbox_path, lease_seconds=60)
+    # Still within the lease: the claiming process may yet send it
+    assert survivor.dispatch_pending() == 0
+    survivor.db.execute("UPDATE sms_outbox SET claimed_at = ?", (time.time() - 120,))
+    survivor.db.commit()
+    assert survivor.dispatch_pending() == 1
+    assert survivor.stats() == {'sent': 1}
+
+
+def test_rows_from_before_leases_are_recovered(outbox_path):
+    outbox = make_outbox(outbox_path)
+    outbox.enqueue('case-1', '+919876543210', 'found')
+    outbox.db.execute("UPDATE sms_outbox SET status = 'sending', claimed_at = NULL")
+    outbox.db.commit()
+    assert make_outbox(outbox_path).dispatch_pending() == 1
+
+
+def test_child_found_message_carries_the_e164_reporter_phone(outbox_path):
+    outbox = make_outbox(outbox_path)
+    assert outbox.enqueue_child_found_notification('case-1', '+919876543210', 'Asha', 'MG Road', 'Ravi',
+                                                   '098765 43210')
+    assert not outbox.enqueue_child_found_notification('case-2', None, 'Asha', 'MG Road', 'Ravi', 'Unknown')
+    outbox.dispatch_pending()
+    assert 'Contact finder at: +919876543210.' in outbox.provider.sent[0][1]
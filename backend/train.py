@@ -1,19 +1,31 @@
-
 import cv2
 import numpy as np
 import dlib
 import os
 import pickle
-from architecture import InceptionResNetV2
-from tensorflow.keras.models import load_model
+from utils.chip_store import get_chip_store
+from utils.face_chips import ChipExtractor
+from utils.face_quality import FACE_QUALITY_MIN
+from utils.gallery import ENCODINGS_PATH, GalleryMatrix, atomic_write, gallery_model, update_gallery_quality
+from utils.gallery_shards import GALLERY_SHARDS, publish_shards
+from utils.model_versions import FaceEncoders
+from utils.photo_dedup import collapse_encodings, dedupe_paths
+
+ENCODE_BATCH_SIZE = 64
 
 class FaceTrainer:
-    def __init__(self):
+    def __init__(self, model_version=None):
         self.required_size = (160, 160)
         self.detector = dlib.get_frontal_face_detector()
         self.predictor = dlib.shape_predictor("assets/model/shape_predictor_68_face_landmarks.dat")
-        self.face_encoder = InceptionResNetV2()
-        self.face_encoder.load_weights("assets/model/facenet_keras_weights.h5")
+        # None follows the model of the published gallery, a version pins one (re-embedding)
+        self.model_version = model_version
+        self.encoders = FaceEncoders()
+        self.encoders.get(model_version)
+
+    @property
+    def face_encoder(self):
+        return self.encoders.get(self.model_version)
 
     def get_aligned_face(self, img, rect):
         landmarks = self.predictor(img, rect)
@@ -26,32 +38,154 @@ class FaceTrainer:
         encode = self.face_encoder.predict(np.expand_dims(face, axis=0))[0]
         return encode
 
-    def train_from_directory(self, training_dir):
-        encoding_dict = {}
-        
+    def get_encodes(self, faces, batch_size=ENCODE_BATCH_SIZE):
+        """Encode many aligned faces, running the encoder one batch at a time"""
+        encodes = []
+        for start in range(0, len(faces), batch_size):
+            batch = np.stack([cv2.resize(face, self.required_size) for face in faces[start:start + batch_size]])
+            batch = batch.astype('float32') / 255.0
+            encodes.append(self.face_encoder.predict_on_batch(batch))
+        if not encodes:
+            return np.empty((0, 128), dtype='float32')
+        return np.concatenate(encodes)
+
+    def encode_people(self, people, extractor, batch_size=ENCODE_BATCH_SIZE, quality=None):
+        """Encode {person_name: [image paths]} into {person_name: mean encoding}
+
+        Faces are detected and aligned in parallel by the extractor, then
+        encoded in batches. Chips failing the extractor's quality gate are
+        not encoded, unless none of a person's chips pass it: then their best
+        chip is kept on its own (flagged below_gate) rather than leaving them
+        out of the gallery. Chips are weighted by their quality score in the
+        mean, with near-identical encodings counted once. People without any
+        face are left out. If a dict is passed as quality it is filled with
+        {person_name: {'score', 'kept', 'rejected', 'collapsed', 'below_gate'}}.
+        """
+        owners, paths = [], []
+        for person_name, img_paths in people.items():
+            owners.extend([person_name] * len(img_paths))
+            paths.extend(img_paths)
+
+        # The gate is applied per person below, so their best chip is there to fall back on
+        extracted = extractor.extract(paths, owners, min_quality=0)
+        candidates = {}
+        for owner, (chip, chip_quality) in zip(owners, extracted):
+            if chip is not None:
+                candidates.setdefault(owner, []).append((chip, chip_quality['score']))
+        found, rejected, below_gate = [], {}, set()
+        for owner, chips in candidates.items():
+            passing = [(chip, score) for chip, score in chips if score >= extractor.min_quality]
+            if not passing:
+                passing = [max(chips, key=lambda item: item[1])]
+                below_gate.add(owner)
+            rejected[owner] = len(chips) - len(passing)
+            found.extend((owner, chip, score) for chip, score in passing)
+        encodes = self.get_encodes([chip for _, chip, _ in found], batch_size)
+
+        grouped = {}
+        for (owner, _, score), encode in zip(found, encodes):
+            grouped.setdefault(owner, []).append((encode, score))
+        collapsed = {}
+        for owner, items in grouped.items():
+            grouped[owner], collapsed[owner] = collapse_encodings(items)
+
+        if quality is not None:
+            for person_name in people:
+                scores = [score for _, score in grouped.get(person_name, [])]
+                quality[person_name] = {
+                    'score': float(np.mean(scores)) if scores else 0.0,
+                    'kept': len(scores),
+                    'rejected': rejected.get(person_name, 0),
+                    'collapsed': collapsed.get(person_name, 0),
+                    'below_gate': person_name in below_gate,
+                }
+
+        return self._weighted_means(grouped)
+
+    def encode_chip_store(self, store, batch_size=ENCODE_BATCH_SIZE, owners=None, min_quality=FACE_QUALITY_MIN):
+        """Encode stored chips straight into {owner: mean encoding}, skipping detection and alignment
+
+        Owners with no chip reaching min_quality get their best chip, as in
+        encode_people. Returns (encodings, quality) with quality shaped as in
+        encode_people.
+        """
+        grouped = {}
+        for rows, chips in store.iter_batches(batch_size, owners=owners, min_quality=min_quality):
+            for row, encode in zip(rows, self.get_encodes(list(chips), batch_size)):
+                if row['owner'] is not None:
+                    grouped.setdefault(row['owner'], []).append((encode, row['quality']))
+
+        best = store.best_rows(set(owners if owners is not None else store.owners()) - set(grouped))
+        rows = list(best.values())
+        if rows:
+            chips = store.read([row['slot'] for row in rows])
+            for row, encode in zip(rows, self.get_encodes(list(chips), batch_size)):
+                grouped[row['owner']] = [(encode, row['quality'])]
+        collapsed = {}
+        for owner, items in grouped.items():
+            grouped[owner], collapsed[owner] = collapse_encodings(items)
+        quality = {
+            owner: {'score': float(np.mean([score or 0 for _, score in items])), 'kept': len(items), 'rejected': 0,
+                    'collapsed': collapsed[owner], 'below_gate': owner in best}
+            for owner, items in grouped.items()
+        }
+        return self._weighted_means(grouped), quality
+
+    @staticmethod
+    def _weighted_means(grouped):
+        """{person: [(encode, quality score)]} to {person: quality-weighted mean encoding}"""
+        return {
+            person_name: np.average([encode for encode, _ in items], axis=0,
+                                    weights=[max(score or 0, 1e-6) for _, score in items])
+            for person_name, items in grouped.items()
+        }
+
+    def train_from_directory(self, training_dir, workers=1):
+        """Encode every <training_dir>/<person>/ folder and publish the gallery, returns its quality record
+
+        This runs on the /api/report-missing request thread, so faces are
+        detected in-process by default: forking a process pool from a
+        threaded server process risks deadlocks and competes with inference.
+        Batch tools (import_cases.py, evaluate.py) use their own pools.
+        """
+        people = {}
         for person_name in os.listdir(training_dir):
             person_dir = os.path.join(training_dir, person_name)
             if not os.path.isdir(person_dir):
                 continue
+            img_paths = [os.path.join(person_dir, img_name) for img_name in os.listdir(person_dir)]
+            # Bursts of near-identical shots are only detected and encoded once
+            people[person_name] = dedupe_paths(img_paths)
 
-            encodings = []
-            for img_name in os.listdir(person_dir):
-                img_path = os.path.join(person_dir, img_name)
-                img = cv2.imread(img_path)
-                if img is None:
-                    continue
+        quality = {}
+        with ChipExtractor(workers, store=get_chip_store()) as extractor:
+            encoding_dict = self.encode_people(people, extractor, quality=quality)
+        rejected = sum(entry['rejected'] for entry in quality.values())
+        if rejected:
+            print(f"Quality gate skipped {rejected} face(s) before encoding")
+        collapsed = sum(entry['collapsed'] for entry in quality.values())
+        if collapsed:
+            print(f"Counted {collapsed} near-duplicate face(s) once in their case's encoding")
+        below_gate = [name for name, entry in quality.items() if entry['below_gate']]
+        if below_gate:
+            print(f"Enrolled {len(below_gate)} case(s) from a face below the quality gate")
 
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                faces = self.detector(img_rgb)
-                
-                if len(faces) > 0:
-                    aligned_face = self.get_aligned_face(img_rgb, faces[0])
-                    encode = self.get_encode(aligned_face)
-                    encodings.append(encode)
+        # Save encodings
+        self.save_encodings(encoding_dict, quality=quality)
+        return quality
 
-            if encodings:
-                encoding_dict[person_name] = np.mean(encodings, axis=0)
+    def save_encodings(self, encoding_dict, path=ENCODINGS_PATH, quality=None, model=None):
+        """Publish encodings atomically so readers never see a partial file
 
-        # Save encodings
-        with open("assets/encodings/encodings.pkl", "wb") as f:
-            pickle.dump(encoding_dict, f)
+        quality holds the face quality of newly encoded entries, as filled in
+        by encode_people; it is merged into the stored per-entry record. The
+        gallery is tagged with model, by default the trainer's model.
+        """
+        model = model or self.model_version or gallery_model()
+        atomic_write(path, lambda f: pickle.dump(encoding_dict, f), mode="wb")
+        quality = update_gallery_quality(encoding_dict, quality)
+        # Matrix form of the same gallery, memory-mapped by the serving workers
+        GalleryMatrix.from_dict(encoding_dict, quality, model).save()
+        if GALLERY_SHARDS:
+            changed = publish_shards(encoding_dict, model=model)
+            print(f"Republished {len(changed)} of {GALLERY_SHARDS} gallery shards")
@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from utils.metrics import registry
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class MicroBatcher:
+    """Run single-item requests from many threads as one batched call
+
+    Callers submit one item and block on its result. A worker thread takes
+    the first queued item, keeps collecting until max_batch_size items are
+    queued or max_wait_ms has passed, then calls batch_fn once with the list
+    and hands each caller its own result. batch_fn must return one result
+    per item, in order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5, name='batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.queue = queue.Queue()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.start()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name=f'{self.name}-batcher', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5):
+        self.stopping.set()
+        self.queue.put(None)
+        if self.thread:
+            self.thread.join(timeout)
+
+    def submit(self, item):
+        """Queue one item, returns a Future for its result"""
+        future = Future()
+        self.queue.put((item, future, time.perf_counter()))
+        registry.set_gauge('batcher_queue_depth', self.queue.qsize(), labels={'batcher': self.name},
+                           help_text='Items waiting to be batched')
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        first = self.queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Drain whatever is already queued even once the window has closed
+                entry = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                self.stopping.set()
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        labels = {'batcher': self.name}
+        while not self.stopping.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                registry.observe('batcher_queue_wait_seconds', started - queued_at, labels,
+                                 buckets=QUEUE_WAIT_BUCKETS, help_text='Time items wait before their batch runs')
+            registry.observe('batcher_batch_size', len(batch), labels, buckets=BATCH_SIZE_BUCKETS,
+                             help_text='Items per executed batch')
+            registry.set_gauge('batcher_queue_depth', self.queue.qsize(), labels)
+
+            futures = [future for _, future, _ in batch]
+            try:
+                results = self.batch_fn([item for item, _, _ in batch])
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                print(f"Error running {self.name} batch: {e}")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            registry.observe('batcher_batch_duration_seconds', time.perf_counter() - started, labels,
+                             help_text='Time spent running each batch')
+
+        # Fail anything still queued so callers do not hang on shutdown
+        while True:
+            try:
+                entry = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not None:
+                entry[1].set_exception(RuntimeError(f"{self.name} batcher stopped"))
@@ -0,0 +1,197 @@
+import re
+import time
+import numpy as np
+
+# Cosine similarity of two case encodings at which they become merge candidates on the face alone
+DEDUP_FACE_CANDIDATE = 0.7
+# Name score (0-100) at which two cases become candidates on the name, if their faces pass DEDUP_FACE_FLOOR
+DEDUP_NAME_CANDIDATE = 85
+DEDUP_FACE_FLOOR = 0.5
+# Weights of face similarity and name score (scaled to 0-1) in the combined score, and the score worth reporting
+DEDUP_FACE_WEIGHT = 0.7
+DEDUP_NAME_WEIGHT = 0.3
+DEDUP_REPORT_MIN = 0.7
+# Neighbours kept per case, which bounds memory however many pairs pass the thresholds
+DEDUP_NEIGHBOURS = 5
+# Rows per tile of the all-pairs products: a tile of similarities is TILE x TILE float32
+DEDUP_TILE_ROWS = 2048
+# Buffered candidate edges before they are cut back to the best DEDUP_NEIGHBOURS per case
+DEDUP_MAX_BUFFERED_EDGES = 4_000_000
+
+
+class _NeighbourBuffer:
+    """Best-k neighbours per case, kept as flat edge arrays compacted whenever they grow too large
+
+    Compaction keeps up to k edges per case, which can itself exceed
+    max_edges, so the next compaction waits until the buffer has doubled:
+    the sorting cost stays linear in the edges added.
+    """
+
+    def __init__(self, k=DEDUP_NEIGHBOURS, max_edges=DEDUP_MAX_BUFFERED_EDGES):
+        self.k = k
+        self.max_edges = max_edges
+        self.compact_at = max_edges
+        self.parts = []
+        self.size = 0
+
+    def add(self, sources, targets, sims):
+        if not len(sources):
+            return
+        # Both directions, so each case keeps its own best k
+        self.parts.append((np.concatenate([sources, targets]), np.concatenate([targets, sources]),
+                           np.concatenate([sims, sims])))
+        self.size += 2 * len(sources)
+        if self.size > self.compact_at:
+            self.compact()
+
+    def compact(self):
+        if not self.parts:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+        sources, targets, sims = (np.concatenate(column) for column in zip(*self.parts))
+        order = np.lexsort((-sims, sources))
+        sources, targets, sims = sources[order], targets[order], sims[order]
+        group_start = np.r_[0, np.flatnonzero(np.diff(sources)) + 1]
+        rank = np.arange(len(sources)) - np.repeat(group_start, np.diff(np.r_[group_start, len(sources)]))
+        keep = rank < self.k
+        self.parts = [(sources[keep], targets[keep], sims[keep])]
+        self.size = int(keep.sum())
+        self.compact_at = max(self.max_edges, 2 * self.size)
+        return self.parts[0]
+
+    def pairs(self):
+        """Undirected (i, j) pairs with i < j"""
+        sources, targets, _ = self.compact()
+        pairs = np.unique(np.stack([np.minimum(sources, targets), np.maximum(sources, targets)], axis=1), axis=0)
+        return pairs[:, 0], pairs[:, 1]
+
+
+def face_candidates(matrix, threshold=DEDUP_FACE_CANDIDATE, tile_rows=DEDUP_TILE_ROWS, k=DEDUP_NEIGHBOURS,
+                    progress=None):
+    """Pairs of rows of an L2-normalised matrix with cosine similarity >= threshold
+
+    The upper triangle of the all-pairs product is computed one tile at a
+    time, so memory stays at a few tiles plus the k best neighbours per row
+    no matter how many rows there are.
+    """
+    n = len(matrix)
+    buffer = _NeighbourBuffer(k)
+    starts = range(0, n, tile_rows)
+    tiles_done, total_tiles = 0, len(starts) * (len(starts) + 1) // 2
+    for i in starts:
+        left = np.asarray(matrix[i:i + tile_rows], dtype=np.float32)
+        for j in starts[i // tile_rows:]:
+            right = left if j == i else np.asarray(matrix[j:j + tile_rows], dtype=np.float32)
+            sims = left @ right.T
+            if j == i:
+                sims[np.tril_indices(len(left))] = -1.0
+            rows, cols = np.nonzero(sims >= threshold)
+            buffer.add(rows + i, cols + j, sims[rows, cols])
+            tiles_done += 1
+            if progress:
+                progress(tiles_done, total_tiles)
+    return buffer.pairs()
+
+
+def normalize_name(name):
+    return ' '.join(re.sub(r'[^a-z\s]', ' ', name.lower()).split())
+
+
+def name_blocks(names):
+    """Group row indices by the initials of the first and last word and a length band
+
+    Spelling variants rarely change initials. Each block is compared with
+    itself and the next length band, so names differing by a few letters
+    still meet.
+    """
+    blocks = {}
+    for index, name in enumerate(names):
+        words = normalize_name(name).split()
+        if words:
+            length = sum(len(word) for word in words)
+            blocks.setdefault((words[0][0], words[-1][0], length // 4), []).append(index)
+    return blocks
+
+
+def name_candidates(names, matrix, name_threshold=DEDUP_NAME_CANDIDATE, face_floor=DEDUP_FACE_FLOOR,
+                    tile_rows=DEDUP_TILE_ROWS, workers=-1):
+    """Pairs with similar names whose faces are at least face_floor alike
+
+    Names are compared with rapidfuzz cdist within blocks, using the plain
+    edit-distance ratio which is an order of magnitude cheaper than WRatio.
+    """
+    from rapidfuzz import fuzz, process
+    normalized = [normalize_name(name) for name in names]
+    blocks = name_blocks(names)
+    found_i, found_j = [], []
+    for (first, last, band), members in blocks.items():
+        for other in (members, blocks.get((first, last, band + 1), [])):
+            for a in range(0, len(members), tile_rows):
+                left = np.asarray(members[a:a + tile_rows])
+                for b in range(0, len(other), tile_rows):
+                    right = np.asarray(other[b:b + tile_rows])
+                    scores = process.cdist([normalized[i] for i in left], [normalized[j] for j in right],
+                                           scorer=fuzz.ratio, score_cutoff=name_threshold, dtype=np.uint8,
+                                           workers=workers)
+                    rows, cols = np.nonzero(scores)
+                    rows, cols = left[rows], right[cols]
+                    distinct = rows < cols if other is members else np.ones(len(rows), dtype=bool)
+                    rows, cols = rows[distinct], cols[distinct]
+                    if not len(rows):
+                        continue
+                    faces = np.einsum('ij,ij->i', np.asarray(matrix[rows], dtype=np.float32),
+                                      np.asarray(matrix[cols], dtype=np.float32))
+                    keep = faces >= face_floor
+                    found_i.append(np.minimum(rows, cols)[keep])
+                    found_j.append(np.maximum(rows, cols)[keep])
+    if not found_i:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    return np.concatenate(found_i), np.concatenate(found_j)
+
+
+def find_duplicate_cases(names, matrix, report_min=DEDUP_REPORT_MIN, face_weight=DEDUP_FACE_WEIGHT,
+                         name_weight=DEDUP_NAME_WEIGHT, progress=None):
+    """Likely duplicate cases in a gallery, best first
+
+    Returns [{'name_a', 'name_b', 'face_similarity', 'name_score', 'score', 'found_by'}]
+    for pairs whose weighted face and name score reaches report_min, plus
+    timings of each stage.
+    """
+    from rapidfuzz import fuzz, process
+    timings = {}
+    start = time.perf_counter()
+    face_i, face_j = face_candidates(matrix, progress=progress)
+    timings['face_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    name_i, name_j = name_candidates(names, matrix)
+    timings['name_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pairs = np.unique(np.stack([np.r_[face_i, name_i], np.r_[face_j, name_j]], axis=1).astype(np.int64), axis=0) \
+        if len(face_i) + len(name_i) else np.empty((0, 2), np.int64)
+    by_face = set(zip(face_i.tolist(), face_j.tolist()))
+    by_name = set(zip(name_i.tolist(), name_j.tolist()))
+    candidates = []
+    for offset in range(0, len(pairs), 100_000):
+        chunk = pairs[offset:offset + 100_000]
+        faces = np.einsum('ij,ij->i', np.asarray(matrix[chunk[:, 0]], dtype=np.float32),
+                          np.asarray(matrix[chunk[:, 1]], dtype=np.float32))
+        name_scores = process.cpdist([normalize_name(names[i]) for i in chunk[:, 0]],
+                                     [normalize_name(names[j]) for j in chunk[:, 1]],
+                                     scorer=fuzz.WRatio, workers=-1)
+        scores = face_weight * faces + name_weight * name_scores / 100
+        for (i, j), face, name_score, score in zip(chunk.tolist(), faces, name_scores, scores):
+            if score < report_min:
+                continue
+            found_by = [channel for channel, found in (('face', by_face), ('name', by_name)) if (i, j) in found]
+            candidates.append({
+                'name_a': names[i],
+                'name_b': names[j],
+                'face_similarity': round(float(face), 4),
+                'name_score': round(float(name_score), 1),
+                'score': round(float(score), 4),
+                'found_by': '+'.join(found_by),
+            })
+    candidates.sort(key=lambda candidate: candidate['score'], reverse=True)
+    timings['score_seconds'] = time.perf_counter() - start
+    return candidates, timings
@@ -0,0 +1,269 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# Empty to disable storing chips
+CHIP_STORE_DIR = os.getenv('CHIP_STORE_DIR', 'assets/chips')
+CHIP_SHAPE = (160, 160, 3)
+CHIP_BYTES = int(np.prod(CHIP_SHAPE))
+
+
+def photo_digest(data):
+    """Key of a photo in the chip store: SHA-1 of its encoded bytes"""
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return photo_digest(f.read())
+
+
+class ChipStore:
+    """Aligned 160x160 RGB face chips, detected and aligned once per photo
+
+    Chips are packed back to back as raw uint8 in chips.bin, so any slot can be
+    read through a memory map without decoding. A SQLite index maps the SHA-1
+    of each source photo to its slot and quality score, and to every owner
+    (case) it was enrolled for, since the same photo can belong to more than
+    one case. Photos in which no face was found are indexed with slot -1 so
+    they are not retried.
+    """
+
+    def __init__(self, directory=CHIP_STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, 'chips.bin')
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(directory, 'index.db'), timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.execute("""
+            CREATE TABLE IF NOT EXISTS chips (
+                sha1 TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL,
+                owner TEXT,
+                quality REAL,
+                created_at REAL NOT NULL
+            )
+            """)
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_chips_owner ON chips (owner, slot)")
+            created = not self.db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chip_owners'").fetchone()
+            self.db.execute("""
+            CREATE TABLE IF NOT EXISTS chip_owners (
+                sha1 TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                PRIMARY KEY (owner, sha1)
+            )
+            """)
+            if created:
+                # chips.owner only holds the first owner of each photo
+                self.db.execute(
+                    "INSERT OR IGNORE INTO chip_owners SELECT sha1, owner FROM chips WHERE owner IS NOT NULL")
+            self.db.commit()
+        self._mapped = None
+        self._mapped_slots = 0
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM chips WHERE slot >= 0").fetchone()[0]
+
+    def lookup(self, digests):
+        """Index rows for the given digests, as {sha1: row}; unknown photos are absent"""
+        found = {}
+        digests = list(digests)
+        with self.lock:
+            for start in range(0, len(digests), 500):
+                chunk = digests[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT sha1, slot, owner, quality FROM chips WHERE sha1 IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update((row['sha1'], row) for row in rows)
+        return found
+
+    def read(self, slots):
+        """Chips for the given slots as one (n, 160, 160, 3) uint8 array"""
+        slots = np.asarray(slots, dtype=np.int64)
+        if not len(slots):
+            return np.empty((0,) + CHIP_SHAPE, dtype=np.uint8)
+        chips = self._chips(int(slots.max()) + 1)
+        return np.asarray(chips[slots])
+
+    def put_many(self, entries):
+        """Store [(sha1, chip or None, owner, quality)], returns the number of new chips
+
+        Slots are allocated under a write transaction, so several processes
+        can add chips to the same store. A photo repeated in entries or
+        already stored keeps its first chip, but every owner is recorded.
+        """
+        entries = [entry for entry in entries if entry[0]]
+        if not entries:
+            return 0
+        now = time.time()
+        unique = {}
+        for entry in entries:
+            unique.setdefault(entry[0], entry)
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                known = set()
+                digests = list(unique)
+                for start in range(0, len(digests), 500):
+                    chunk = digests[start:start + 500]
+                    known.update(row[0] for row in self.db.execute(
+                        f"SELECT sha1 FROM chips WHERE sha1 IN ({', '.join('?' * len(chunk))})", chunk
+                    ))
+                new = [entry for sha1, entry in unique.items() if sha1 not in known]
+                next_slot = os.path.getsize(self.data_path) // CHIP_BYTES if os.path.exists(self.data_path) else 0
+
+                rows, packed = [], []
+                for sha1, chip, owner, quality in new:
+                    slot = -1
+                    if chip is not None:
+                        slot = next_slot
+                        next_slot += 1
+                        packed.append(np.ascontiguousarray(chip, dtype=np.uint8).reshape(CHIP_SHAPE).tobytes())
+                    rows.append((sha1, slot, owner, quality, now))
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO chips (sha1, slot, owner, quality, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO chip_owners (sha1, owner) VALUES (?, ?)",
+                    list({(sha1, owner) for sha1, _, owner, _ in entries if owner is not None})
+                )
+                # Chips are appended once their index rows are in, so a failed insert leaves no orphaned bytes
+                if packed:
+                    with open(self.data_path, 'ab') as f:
+                        f.write(b''.join(packed))
+                        f.flush()
+                        os.fsync(f.fileno())
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+        return len(packed)
+
+    def add_owners(self, pairs):
+        """Record [(sha1, owner)] for photos already stored, e.g. when a case is enrolled again"""
+        pairs = list({(sha1, owner) for sha1, owner in pairs if sha1 and owner is not None})
+        if not pairs:
+            return
+        with self.lock:
+            self.db.executemany("INSERT OR IGNORE INTO chip_owners (sha1, owner) VALUES (?, ?)", pairs)
+            self.db.commit()
+
+    def iter_batches(self, batch_size=64, owners=None, min_quality=None):
+        """Stream stored chips in slot order as (rows, chips) batches for batched inference
+
+        rows are index rows (sha1, slot, owner, quality); chips is a
+        (len(rows), 160, 160, 3) uint8 array read straight from the memory map.
+        A chip enrolled for several owners is yielded once for each of them.
+        """
+        sql = """
+        SELECT c.sha1, c.slot, o.owner, c.quality
+        FROM chips c LEFT JOIN chip_owners o ON o.sha1 = c.sha1
+        WHERE c.slot >= 0
+        """
+        params = []
+        if owners is not None:
+            owners = list(owners)
+            if not owners:
+                return
+            sql += f" AND o.owner IN ({', '.join('?' * len(owners))})"
+            params.extend(owners)
+        if min_quality is not None:
+            sql += " AND c.quality >= ?"
+            params.append(min_quality)
+        with self.lock:
+            rows = self.db.execute(sql + " ORDER BY c.slot", params).fetchall()
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            yield batch, self.read([row['slot'] for row in batch])
+
+    def best_rows(self, owners):
+        """{owner: index row of their best-quality chip} for the given owners that have one"""
+        owners = list(owners)
+        best = {}
+        with self.lock:
+            for start in range(0, len(owners), 500):
+                chunk = owners[start:start + 500]
+                rows = self.db.execute(
+                    f"""
+                    SELECT c.sha1, c.slot, o.owner, c.quality
+                    FROM chip_owners o JOIN chips c ON c.sha1 = o.sha1
+                    WHERE c.slot >= 0 AND o.owner IN ({', '.join('?' * len(chunk))})
+                    ORDER BY COALESCE(c.quality, 0) DESC
+                    """,
+                    chunk
+                ).fetchall()
+                for row in rows:
+                    best.setdefault(row['owner'], row)
+        return best
+
+    def owners(self):
+        """Owners with at least one stored chip"""
+        with self.lock:
+            return {row[0] for row in self.db.execute(
+                "SELECT DISTINCT o.owner FROM chip_owners o JOIN chips c ON c.sha1 = o.sha1 WHERE c.slot >= 0")}
+
+    def chip_sets(self, owners):
+        """{owner: digest of the set of chips stored for them}, changes whenever a case is re-enrolled"""
+        owners = list(owners)
+        digests = {}
+        with self.lock:
+            for start in range(0, len(owners), 500):
+                chunk = owners[start:start + 500]
+                rows = self.db.execute(
+                    f"""
+                    SELECT o.owner, o.sha1
+                    FROM chip_owners o JOIN chips c ON c.sha1 = o.sha1
+                    WHERE c.slot >= 0 AND o.owner IN ({', '.join('?' * len(chunk))})
+                    ORDER BY o.owner, o.sha1
+                    """,
+                    chunk
+                ).fetchall()
+                for row in rows:
+                    digests.setdefault(row['owner'], hashlib.sha1()).update(row['sha1'].encode())
+        return {owner: digest.hexdigest() for owner, digest in digests.items()}
+
+    def stats(self):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT SUM(slot >= 0) AS chips, SUM(slot < 0) AS no_face, "
+                "(SELECT COUNT(DISTINCT owner) FROM chip_owners) AS owners FROM chips"
+            ).fetchone()
+        size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        return {'chips': row['chips'] or 0, 'photos_without_face': row['no_face'] or 0,
+                'owners': row['owners'] or 0, 'bytes': size}
+
+    def _chips(self, min_slots):
+        """Memory map of chips.bin covering at least min_slots, remapped after appends"""
+        if self._mapped is None or self._mapped_slots < min_slots:
+            slots = os.path.getsize(self.data_path) // CHIP_BYTES
+            self._mapped = np.memmap(self.data_path, dtype=np.uint8, mode='r', shape=(slots,) + CHIP_SHAPE)
+            self._mapped_slots = slots
+        return self._mapped
+
+    def close(self):
+        self._mapped = None
+        self.db.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_chip_store():
+    """Process-wide chip store, None when CHIP_STORE_DIR is empty"""
+    global _store
+    if not CHIP_STORE_DIR:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ChipStore()
+    return _store
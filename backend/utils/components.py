@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class LazyComponent:
+    """A heavy object built on first use, remembering how long that took"""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.instance = None
+        self.load_seconds = None
+        self.error = None
+
+    @property
+    def warm(self):
+        return self.instance is not None
+
+    def get(self):
+        if self.instance is None:
+            with self.lock:
+                if self.instance is None:
+                    start = time.perf_counter()
+                    try:
+                        self.instance = self.factory()
+                        self.error = None
+                    except Exception as e:
+                        self.error = str(e)
+                        raise
+                    finally:
+                        self.load_seconds = time.perf_counter() - start
+                    print(f"Loaded {self.name} in {self.load_seconds:.2f}s")
+        return self.instance
+
+    def status(self):
+        return {'warm': self.warm, 'load_seconds': self.load_seconds, 'error': self.error}
+
+
+_components = {}
+
+
+def register(name, factory):
+    """Register a component factory; nothing is imported or built until get()"""
+    _components[name] = LazyComponent(name, factory)
+    return _components[name]
+
+
+def get(name):
+    return _components[name].get()
+
+
+def status():
+    return {name: component.status() for name, component in _components.items()}
+
+
+def warm_up(names=None):
+    """Build the given (or all) components, logging rather than raising failures"""
+    for name in names or list(_components):
+        try:
+            _components[name].get()
+        except Exception as e:
+            print(f"Error warming up {name}: {e}")
+
+
+def warm_up_in_background(names=None):
+    thread = threading.Thread(target=warm_up, args=(names,), name='warm-up', daemon=True)
+    thread.start()
+    return thread
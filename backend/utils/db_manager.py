@@ -1,21 +1,114 @@
 
-import mysql.connector
 import os
 import re
+import time
+from io import IOBase
 from dotenv import load_dotenv
+from utils.geo import geocode_location
+from utils.listing import LISTING_BATCH_ROWS
+from utils.phone_numbers import normalize_phone_number, normalize_phone_numbers
+from utils.metrics import timed
 
 load_dotenv()
 
+# Photo inserts are batched into multi-row statements bounded by these limits
+PHOTO_INSERT_CHUNK_ROWS = int(os.getenv('PHOTO_INSERT_CHUNK_ROWS', '16'))
+PHOTO_INSERT_CHUNK_BYTES = int(os.getenv('PHOTO_INSERT_CHUNK_BYTES', str(8 * 1024 * 1024)))
+PHOTO_STREAM_THRESHOLD_BYTES = int(os.getenv('PHOTO_STREAM_THRESHOLD_BYTES', str(2 * 1024 * 1024)))
+# Use mysql-connector's pure-Python protocol even when its C extension is installed.
+# Only that protocol streams large uploads; the C extension is sent their bytes instead.
+DB_USE_PURE = os.getenv('DB_USE_PURE', 'false').lower() in ('1', 'true', 'yes')
+
+# Connections per process kept open for reuse, 0 opens a fresh connection per manager.
+# Size it for GUNICORN_THREADS requests at once, each holding up to 3 (/api/v2/report-found).
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '0'))
+# How long to wait for a pooled connection to come free before opening one outside the pool
+DB_POOL_WAIT_SECONDS = float(os.getenv('DB_POOL_WAIT_SECONDS', '2'))
+
+# Sightings older than this are moved to reported_children_archive by archive_sightings.py
+SIGHTING_RETENTION_DAYS = int(os.getenv('SIGHTING_RETENTION_DAYS', '365'))
+
+# Columns copied when a sighting is archived
+_SIGHTING_COLUMNS = ('id, child_name, location, reporter_name, reporter_phone, details, created_at, '
+                     'latitude, longitude, geohash')
+
+# Seconds MySQL waits on a slow client of a streamed listing before aborting it
+LISTING_NET_WRITE_TIMEOUT = int(os.getenv('LISTING_NET_WRITE_TIMEOUT', '600'))
+
+# The schema only needs checking once per process, not for every manager
+_schema_checked = False
+
+def _stream_size(stream):
+    """Remaining bytes in a seekable stream, or None if it cannot be measured"""
+    try:
+        position = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell() - position
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+def _connect(password, pooled=True):
+    # mysql-connector is imported on first connection rather than at app import
+    import mysql.connector
+    options = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': password,
+        'database': os.getenv('DB_DATABASE', 'missing_database'),
+    }
+    if DB_USE_PURE:
+        options['use_pure'] = True
+    if not (DB_POOL_SIZE and pooled):
+        return mysql.connector.connect(**options)
+
+    # An exhausted pool raises PoolError at once instead of waiting for a connection
+    deadline = time.monotonic() + DB_POOL_WAIT_SECONDS
+    while True:
+        try:
+            return mysql.connector.connect(pool_name='missing_database', pool_size=DB_POOL_SIZE, **options)
+        except mysql.connector.errors.PoolError:
+            if time.monotonic() >= deadline:
+                print(f"Connection pool exhausted for {DB_POOL_WAIT_SECONDS}s, opening a connection outside it")
+                return mysql.connector.connect(**options)
+            time.sleep(0.05)
+
+def _streams_blobs(connection):
+    """Whether prepared statements on connection accept file-like parameters
+
+    Only the pure-Python protocol sends them as long data packets; the C
+    extension's prepared cursor cannot (cmd_stmt_send_long_data raises
+    NotImplementedError). Stand-in connections say so through use_pure.
+    """
+    connection = getattr(connection, '_cnx', connection)  # pooled connections wrap the real one
+    try:
+        from mysql.connector.connection import MySQLConnection
+        if isinstance(connection, MySQLConnection):
+            return True
+    except ImportError:
+        pass
+    return bool(getattr(connection, 'use_pure', False))
+
+def _db_error():
+    import mysql.connector
+    return mysql.connector.Error
+
+def sanitize_filename(name):
+    """Remove invalid characters from filename"""
+    return re.sub(r'[<>:"/\\|?*]', '_', name)
+
 class DatabaseManager:
-    def __init__(self):
-        self.db = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', 'Test@123'),
-            database=os.getenv('DB_DATABASE', 'missing_database')
-        )
+    def __init__(self, connection=None, pooled=True):
+        # An existing connection (e.g. a local stand-in for benchmarks) can be injected.
+        # Long-running streams use their own connection rather than holding one of the pool's.
+        self.db = connection or _connect(os.getenv('DB_PASSWORD', 'Test@123'), pooled)
         self.cursor = self.db.cursor(dictionary=True)
-        self._create_tables()
+        global _schema_checked
+        if connection is not None or not _schema_checked:
+            self._create_tables()
+            if connection is None:
+                _schema_checked = True
 
     def _create_tables(self):
         """Create necessary tables if they don't exist"""
@@ -72,12 +165,81 @@ class DatabaseManager:
                 self.cursor.execute("SELECT parent_phone FROM missing_children LIMIT 1")
                 # Consume the result to avoid unread result errors
                 self.cursor.fetchall()
-            except mysql.connector.Error as err:
+            except _db_error() as err:
                 if err.errno == 1054:  # Unknown column error
                     print("Adding missing parent_phone column to missing_children table")
                     self.cursor.execute("ALTER TABLE missing_children ADD COLUMN parent_phone VARCHAR(20)")
                     self.db.commit()
-            
+
+            # Normalized E.164 form of parent_phone, filled on insert or by migrate_parent_phones
+            try:
+                self.cursor.execute("SELECT parent_phone_e164 FROM missing_children LIMIT 1")
+                self.cursor.fetchall()
+            except _db_error() as err:
+                if err.errno == 1054:  # Unknown column error
+                    print("Adding missing parent_phone_e164 column to missing_children table")
+                    self.cursor.execute("ALTER TABLE missing_children ADD COLUMN parent_phone_e164 VARCHAR(20)")
+                    self.db.commit()
+
+            # Geocoded sighting locations, see utils/geo.py
+            try:
+                self.cursor.execute("SELECT geohash FROM reported_children LIMIT 1")
+                self.cursor.fetchall()
+            except _db_error() as err:
+                if err.errno == 1054:  # Unknown column error
+                    print("Adding missing latitude, longitude and geohash columns to reported_children table")
+                    self.cursor.execute("""
+                    ALTER TABLE reported_children
+                    ADD COLUMN latitude DOUBLE, ADD COLUMN longitude DOUBLE, ADD COLUMN geohash VARCHAR(12),
+                    ADD INDEX idx_reported_geohash (child_name, geohash)
+                    """)
+                    self.db.commit()
+
+            # Where the child was last seen when reported missing, until a sighting says otherwise
+            try:
+                self.cursor.execute("SELECT last_seen_geohash FROM missing_children LIMIT 1")
+                self.cursor.fetchall()
+            except _db_error() as err:
+                if err.errno == 1054:  # Unknown column error
+                    print("Adding missing last_seen_location and last_seen_geohash columns to missing_children table")
+                    self.cursor.execute("""
+                    ALTER TABLE missing_children
+                    ADD COLUMN last_seen_location VARCHAR(255), ADD COLUMN last_seen_geohash VARCHAR(12)
+                    """)
+                    self.db.commit()
+
+            # Latest sighting per child, kept up to date by store_reported_child.
+            # Sightings stored before it existed are filled in by backfill_latest_sightings.
+            self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS latest_sighting (
+                child_name VARCHAR(255) PRIMARY KEY,
+                sighting_id INT NOT NULL,
+                location VARCHAR(255) NOT NULL,
+                latitude DOUBLE,
+                longitude DOUBLE,
+                geohash VARCHAR(12),
+                seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                KEY idx_latest_sighting_id (sighting_id)
+            )
+            """)
+            self.db.commit()
+
+            # Keyset order of the listing endpoints, see _stream_keyset
+            for table in ('missing_children', 'reported_children'):
+                self.cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = 'idx_{table}_created'")
+                if not self.cursor.fetchall():
+                    print(f"Adding created_at index to {table} table")
+                    try:
+                        self.cursor.execute(f"ALTER TABLE {table} ADD INDEX idx_{table}_created (created_at, id)")
+                        self.db.commit()
+                    except _db_error() as err:
+                        if err.errno != 1061:  # Duplicate key name: another worker added it first
+                            raise
+
+            # Sightings past SIGHTING_RETENTION_DAYS, see archive_sightings
+            self.cursor.execute("CREATE TABLE IF NOT EXISTS reported_children_archive LIKE reported_children")
+            self.db.commit()
+
         except Exception as e:
             print(f"Error creating tables: {e}")
             self._reset_connection()
@@ -91,26 +253,26 @@ class DatabaseManager:
         except:
             pass
         
-        self.db = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            database=os.getenv('DB_DATABASE', 'missing_database')
-        )
+        self.db = _connect(os.getenv('DB_PASSWORD', ''))
         self.cursor = self.db.cursor(dictionary=True)
 
-    def insert_missing_child(self, child_name, case_id, files, parent_phone=None, distinguishing_features=None):
+    @timed('db.insert_missing_child')
+    def insert_missing_child(self, child_name, case_id, files, parent_phone=None, distinguishing_features=None,
+                             last_seen_location=None):
         """Insert a missing child record with multiple photos and mole data"""
         try:
             # Insert child record
-            sql = "INSERT INTO missing_children (child_name, case_id, parent_phone) VALUES (%s, %s, %s)"
-            self.cursor.execute(sql, (child_name, case_id, parent_phone))
+            place = geocode_location(last_seen_location)
+            sql = """
+            INSERT INTO missing_children
+            (child_name, case_id, parent_phone, parent_phone_e164, last_seen_location, last_seen_geohash)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """
+            self.cursor.execute(sql, (child_name, case_id, parent_phone, normalize_phone_number(parent_phone),
+                                      last_seen_location, place[2] if place else None))
 
-            # Insert each photo
-            for photo in files:
-                photo_data = photo.read()
-                sql = "INSERT INTO missing_child_photos (case_id, photo) VALUES (%s, %s)"
-                self.cursor.execute(sql, (case_id, photo_data))
+            # Insert photos in bounded multi-row batches, streaming large uploads
+            self._insert_photos(case_id, files)
             
             # Store mole data if provided
             if distinguishing_features and len(distinguishing_features.strip()) > 0:
@@ -125,15 +287,122 @@ class DatabaseManager:
             self._reset_connection()
             raise
 
+    def _insert_photos(self, case_id, files):
+        """Insert uploaded photos without buffering the whole request in memory
+
+        Photos are grouped into multi-row INSERTs bounded by row count and payload
+        size. On a pure-Python connection (see DB_USE_PURE), uploads above
+        PHOTO_STREAM_THRESHOLD_BYTES are sent as a prepared statement parameter,
+        which the connector streams in 128 KB packets; the C extension gets
+        their bytes in a statement of their own.
+        """
+        sql = "INSERT INTO missing_child_photos (case_id, photo) VALUES (%s, %s)"
+        chunk, chunk_bytes = [], 0
+        stream_cursor = None
+        streams_blobs = _streams_blobs(self.db)
+        try:
+            for photo in files:
+                stream = getattr(photo, 'stream', photo)
+                size = _stream_size(stream)
+
+                if size is not None and size > PHOTO_STREAM_THRESHOLD_BYTES:
+                    if streams_blobs and isinstance(stream, IOBase):
+                        if stream_cursor is None:
+                            stream_cursor = self.db.cursor(prepared=True)
+                        stream_cursor.execute(sql, (case_id, stream))
+                    else:
+                        # Not batched, so only one large upload is held at a time
+                        self.cursor.execute(sql, (case_id, stream.read()))
+                    continue
+
+                if chunk and (len(chunk) >= PHOTO_INSERT_CHUNK_ROWS
+                              or chunk_bytes + (size or 0) > PHOTO_INSERT_CHUNK_BYTES):
+                    self.cursor.executemany(sql, chunk)
+                    chunk, chunk_bytes = [], 0
+                photo_data = stream.read()
+                chunk.append((case_id, photo_data))
+                chunk_bytes += len(photo_data)
+
+            if chunk:
+                self.cursor.executemany(sql, chunk)
+        finally:
+            if stream_cursor is not None:
+                stream_cursor.close()
+
+    @timed('db.insert_missing_children_bulk')
+    def insert_missing_children_bulk(self, cases):
+        """Insert many cases and their photos in a single transaction
+
+        cases: dicts with child_name, case_id, parent_phone and photos (list of bytes)
+        """
+        try:
+            self.cursor.executemany(
+                """
+                INSERT INTO missing_children (child_name, case_id, parent_phone, parent_phone_e164)
+                VALUES (%s, %s, %s, %s)
+                """,
+                [(case['child_name'], case['case_id'], case.get('parent_phone'),
+                  normalize_phone_number(case.get('parent_phone'))) for case in cases]
+            )
+            photo_rows = [(case['case_id'], photo) for case in cases for photo in case['photos']]
+            if photo_rows:
+                self.cursor.executemany(
+                    "INSERT INTO missing_child_photos (case_id, photo) VALUES (%s, %s)", photo_rows
+                )
+            self.db.commit()
+            return True
+        except Exception as e:
+            print(f"Error bulk inserting missing children: {e}")
+            self.db.rollback()
+            self._reset_connection()
+            raise
+
+    @timed('db.get_existing_case_ids')
+    def get_existing_case_ids(self, case_ids):
+        """Return the subset of case ids already stored"""
+        if not case_ids:
+            return set()
+        try:
+            placeholders = ', '.join(['%s'] * len(case_ids))
+            sql = f"SELECT case_id FROM missing_children WHERE case_id IN ({placeholders})"
+            self.cursor.execute(sql, tuple(case_ids))
+            return {row['case_id'] for row in self.cursor.fetchall()}
+        except Exception as e:
+            print(f"Error checking existing cases: {e}")
+            self._reset_connection()
+            raise
+
+    @timed('db.store_reported_child')
     def store_reported_child(self, child_name, location, reporter_name, reporter_phone, details=""):
-        """Store information about a reported (found) child"""
+        """Store information about a reported (found) child and make it the child's latest sighting"""
         try:
+            # Stored in E.164 like parent phones; kept as given when it has no digits ("Unknown")
+            reporter_phone = normalize_phone_number(reporter_phone) or reporter_phone
+            latitude, longitude, cell = geocode_location(location) or (None, None, None)
             sql = """
             INSERT INTO reported_children 
-            (child_name, location, reporter_name, reporter_phone, details) 
-            VALUES (%s, %s, %s, %s, %s)
+            (child_name, location, reporter_name, reporter_phone, details, latitude, longitude, geohash) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             """
-            self.cursor.execute(sql, (child_name, location, reporter_name, reporter_phone, details))
+            self.cursor.execute(sql, (child_name, location, reporter_name, reporter_phone, details,
+                                      latitude, longitude, cell))
+
+            if child_name:
+                # Same transaction as the sighting. A concurrent report committed out of order
+                # never overwrites a newer sighting, and a sighting that could not be geocoded
+                # keeps the last known coordinates.
+                sql = """
+                INSERT INTO latest_sighting (child_name, sighting_id, location, latitude, longitude, geohash)
+                VALUES (%s, LAST_INSERT_ID(), %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    location = IF(VALUES(sighting_id) > sighting_id, VALUES(location), location),
+                    latitude = IF(VALUES(sighting_id) > sighting_id, COALESCE(VALUES(latitude), latitude), latitude),
+                    longitude = IF(VALUES(sighting_id) > sighting_id, COALESCE(VALUES(longitude), longitude), longitude),
+                    geohash = IF(VALUES(sighting_id) > sighting_id, COALESCE(VALUES(geohash), geohash), geohash),
+                    seen_at = IF(VALUES(sighting_id) > sighting_id, CURRENT_TIMESTAMP, seen_at),
+                    sighting_id = GREATEST(sighting_id, VALUES(sighting_id))
+                """
+                self.cursor.execute(sql, (child_name, location, latitude, longitude, cell))
             self.db.commit()
             return True
         except Exception as e:
@@ -142,8 +411,29 @@ class DatabaseManager:
             self._reset_connection()
             raise
 
+    @timed('db.get_latest_sighting')
+    def get_latest_sighting(self, child_name):
+        """Latest sighting of a child (location, latitude, longitude, geohash, seen_at), or None"""
+        try:
+            sql = """
+            SELECT location, latitude, longitude, geohash, seen_at
+            FROM latest_sighting
+            WHERE child_name = %s
+            """
+            self.cursor.execute(sql, (child_name,))
+            return self.cursor.fetchone()
+        except Exception as e:
+            print(f"Error getting latest sighting: {e}")
+            self._reset_connection()
+            raise
+
+    @timed('db.get_last_seen_locations')
     def get_last_seen_locations(self, child_name):
-        """Get locations where a child was last seen, ordered by most recent first"""
+        """Get locations where a child was last seen, ordered by most recent first
+
+        Only sightings not yet archived are included, use get_latest_sighting
+        for the latest one.
+        """
         try:
             sql = """
             SELECT location, created_at 
@@ -159,11 +449,207 @@ class DatabaseManager:
             self._reset_connection()
             raise
 
+    @timed('db.get_last_seen_cells')
+    def get_last_seen_cells(self):
+        """(child_name, geohash) of the latest geocoded sighting of each case, else where it went missing"""
+        try:
+            sql = """
+            SELECT mc.child_name, COALESCE(ls.geohash, mc.last_seen_geohash) AS geohash
+            FROM missing_children mc
+            LEFT JOIN latest_sighting ls ON ls.child_name = mc.child_name
+            WHERE COALESCE(ls.geohash, mc.last_seen_geohash) IS NOT NULL
+            """
+            self.cursor.execute(sql)
+            return [(row['child_name'], row['geohash']) for row in self.cursor.fetchall()]
+        except Exception as e:
+            print(f"Error getting last seen cells: {e}")
+            self._reset_connection()
+            raise
+
+    @timed('db.geocode_sightings')
+    def geocode_sightings(self, batch_size=1000):
+        """Fill in coordinates and cells of sightings stored before geocoding, returns how many were placed"""
+        geocoded = 0
+        last_id = 0
+        try:
+            while True:
+                sql = """
+                SELECT id, location
+                FROM reported_children
+                WHERE geohash IS NULL AND id > %s
+                ORDER BY id
+                LIMIT %s
+                """
+                self.cursor.execute(sql, (last_id, batch_size))
+                rows = self.cursor.fetchall()
+                if not rows:
+                    return geocoded
+
+                updates = []
+                for row in rows:
+                    place = geocode_location(row['location'])
+                    if place:
+                        updates.append(place + (row['id'],))
+                if updates:
+                    self.cursor.executemany(
+                        "UPDATE reported_children SET latitude = %s, longitude = %s, geohash = %s WHERE id = %s",
+                        updates
+                    )
+                    self.cursor.executemany(
+                        """
+                        UPDATE latest_sighting SET latitude = %s, longitude = %s, geohash = %s
+                        WHERE sighting_id = %s
+                        """,
+                        updates
+                    )
+                self.db.commit()
+                geocoded += len(updates)
+                last_id = rows[-1]['id']
+        except Exception as e:
+            print(f"Error geocoding sightings: {e}")
+            self.db.rollback()
+            self._reset_connection()
+            raise
+
+    @timed('db.archive_sightings')
+    def archive_sightings(self, older_than_days=SIGHTING_RETENTION_DAYS, batch_size=5000):
+        """Move sightings older than older_than_days to reported_children_archive, returns how many moved
+
+        Sightings are inserted in id order with the current time, so the old
+        ones are always the head of the primary key: each batch is a range
+        read off the front of the table, copied and deleted in one
+        transaction. Latest sightings are kept in latest_sighting regardless.
+        """
+        archived = 0
+        try:
+            while True:
+                sql = """
+                SELECT id, created_at < NOW() - INTERVAL %s DAY AS expired
+                FROM reported_children
+                ORDER BY id
+                LIMIT %s
+                """
+                self.cursor.execute(sql, (older_than_days, batch_size))
+                rows = self.cursor.fetchall()
+                expired = []
+                for row in rows:
+                    if not row['expired']:
+                        break
+                    expired.append(row['id'])
+                if not expired:
+                    return archived
+
+                first_id, last_id = expired[0], expired[-1]
+                self.cursor.execute(f"""
+                INSERT INTO reported_children_archive ({_SIGHTING_COLUMNS})
+                SELECT {_SIGHTING_COLUMNS} FROM reported_children WHERE id BETWEEN %s AND %s
+                """, (first_id, last_id))
+                self.cursor.execute("DELETE FROM reported_children WHERE id BETWEEN %s AND %s", (first_id, last_id))
+                self.db.commit()
+                archived += len(expired)
+                if len(expired) < len(rows):
+                    return archived
+        except Exception as e:
+            print(f"Error archiving sightings: {e}")
+            self.db.rollback()
+            self._reset_connection()
+            raise
+
+    def _stream_keyset(self, table, columns, conditions, params, after=None, descending=False, limit=None,
+                       batch_size=LISTING_BATCH_ROWS):
+        """Yield lists of rows of table in (created_at, id) order, read off an unbuffered cursor
+
+        Rows come from the server as they are fetched, so memory is bounded by
+        batch_size however many rows match. after is the (created_at, id) of
+        the last row already seen. The connection cannot be used for anything
+        else until the stream is exhausted, use a manager of its own.
+        """
+        conditions, params = list(conditions), list(params)
+        if after:
+            op = '<' if descending else '>'
+            conditions.append(f"(created_at {op} %s OR (created_at = %s AND id {op} %s))")
+            params += [after[0], after[0], after[1]]
+        direction = 'DESC' if descending else 'ASC'
+        sql = f"SELECT {columns} FROM {table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY created_at {direction}, id {direction}"
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+
+        cursor = None
+        try:
+            self.cursor.execute("SET SESSION net_write_timeout = %s", (LISTING_NET_WRITE_TIMEOUT,))
+            cursor = self.db.cursor(dictionary=True, buffered=False)
+            cursor.execute(sql, tuple(params))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+        except Exception as e:
+            print(f"Error streaming {table}: {e}")
+            raise
+        finally:
+            if cursor is not None:
+                try:
+                    # Fails with rows left unread when the client went away, closing the connection drops them
+                    cursor.close()
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _time_conditions(since, until):
+        conditions, params = [], []
+        if since:
+            conditions.append("created_at >= %s")
+            params.append(since)
+        if until:
+            conditions.append("created_at < %s")
+            params.append(until)
+        return conditions, params
+
+    @staticmethod
+    def _prefix(value):
+        return re.sub(r'([\\%_])', r'\\\1', value) + '%'
+
+    def stream_cases(self, name=None, case_id=None, since=None, until=None, **page):
+        """Missing children (without photos) for the listing endpoint, see _stream_keyset
+
+        name matches the start of child_name.
+        """
+        conditions, params = self._time_conditions(since, until)
+        if name:
+            conditions.append("child_name LIKE %s")
+            params.append(self._prefix(name))
+        if case_id:
+            conditions.append("case_id = %s")
+            params.append(case_id)
+        columns = ("id, case_id, child_name, COALESCE(parent_phone_e164, parent_phone) AS parent_phone, "
+                   "last_seen_location, last_seen_geohash, created_at")
+        return self._stream_keyset('missing_children', columns, conditions, params, **page)
+
+    def stream_sightings(self, child_name=None, geohash=None, since=None, until=None, **page):
+        """Sightings not yet archived for the listing endpoint, see _stream_keyset
+
+        geohash matches every cell inside the given one.
+        """
+        conditions, params = self._time_conditions(since, until)
+        if child_name:
+            conditions.append("child_name = %s")
+            params.append(child_name)
+        if geohash:
+            conditions.append("geohash LIKE %s")
+            params.append(self._prefix(geohash))
+        return self._stream_keyset('reported_children', _SIGHTING_COLUMNS, conditions, params, **page)
+
+    @timed('db.get_parent_phone')
     def get_parent_phone(self, child_name):
         """Get parent phone number for a missing child by name"""
         try:
             sql = """
-            SELECT parent_phone 
+            SELECT COALESCE(parent_phone_e164, parent_phone) AS parent_phone
             FROM missing_children 
             WHERE child_name = %s
             """
@@ -175,6 +661,112 @@ class DatabaseManager:
             self._reset_connection()
             raise
 
+    @timed('db.migrate_parent_phones')
+    def migrate_parent_phones(self, batch_size=1000):
+        """One-time migration storing the E.164 form of every parent phone"""
+        migrated = 0
+        last_id = 0
+        try:
+            while True:
+                sql = """
+                SELECT id, parent_phone
+                FROM missing_children
+                WHERE parent_phone IS NOT NULL AND parent_phone_e164 IS NULL AND id > %s
+                ORDER BY id
+                LIMIT %s
+                """
+                self.cursor.execute(sql, (last_id, batch_size))
+                rows = self.cursor.fetchall()
+                if not rows:
+                    return migrated
+
+                normalized = normalize_phone_numbers([row['parent_phone'] for row in rows])
+                updates = [(phone, row['id']) for row, phone in zip(rows, normalized) if phone]
+                if updates:
+                    self.cursor.executemany(
+                        "UPDATE missing_children SET parent_phone_e164 = %s WHERE id = %s", updates
+                    )
+                self.db.commit()
+                migrated += len(updates)
+                last_id = rows[-1]['id']
+        except Exception as e:
+            print(f"Error migrating parent phones: {e}")
+            self.db.rollback()
+            self._reset_connection()
+            raise
+
+    def backfill_latest_sightings(self, batch_size=5000):
+        """One-time migration filling latest_sighting from sightings stored before it existed
+
+        Walks reported_children from the newest id down, so the first row
+        inserted for a child is its latest sighting; older ones and children
+        already updated by store_reported_child are skipped by INSERT IGNORE.
+        Safe to run while sightings come in, and to run again.
+        """
+        backfilled = 0
+        try:
+            self.cursor.execute("SELECT MAX(id) AS id FROM reported_children")
+            high = (self.cursor.fetchone() or {}).get('id') or 0
+            while high > 0:
+                low = max(high - batch_size, 0)
+                sql = """
+                INSERT IGNORE INTO latest_sighting (child_name, sighting_id, location, latitude, longitude,
+                                                    geohash, seen_at)
+                SELECT r.child_name, r.id, r.location, r.latitude, r.longitude, r.geohash, r.created_at
+                FROM reported_children r
+                JOIN (
+                    SELECT child_name, MAX(id) AS id
+                    FROM reported_children
+                    WHERE child_name IS NOT NULL AND id > %s AND id <= %s
+                    GROUP BY child_name
+                ) latest ON latest.id = r.id
+                """
+                self.cursor.execute(sql, (low, high))
+                backfilled += self.cursor.rowcount
+                self.db.commit()
+                high = low
+            return backfilled
+        except Exception as e:
+            print(f"Error backfilling latest sightings: {e}")
+            self.db.rollback()
+            self._reset_connection()
+            raise
+
+    def migrate_reporter_phones(self, batch_size=1000):
+        """One-time migration storing reporter phones in E.164, for sightings stored before normalization"""
+        migrated = 0
+        try:
+            for table in ('reported_children', 'reported_children_archive'):
+                last_id = 0
+                while True:
+                    sql = f"""
+                    SELECT id, reporter_phone
+                    FROM {table}
+                    WHERE id > %s
+                    ORDER BY id
+                    LIMIT %s
+                    """
+                    self.cursor.execute(sql, (last_id, batch_size))
+                    rows = self.cursor.fetchall()
+                    if not rows:
+                        break
+
+                    normalized = normalize_phone_numbers([row['reporter_phone'] for row in rows])
+                    updates = [(phone, row['id']) for row, phone in zip(rows, normalized)
+                               if phone and phone != row['reporter_phone']]
+                    if updates:
+                        self.cursor.executemany(f"UPDATE {table} SET reporter_phone = %s WHERE id = %s", updates)
+                    self.db.commit()
+                    migrated += len(updates)
+                    last_id = rows[-1]['id']
+            return migrated
+        except Exception as e:
+            print(f"Error migrating reporter phones: {e}")
+            self.db.rollback()
+            self._reset_connection()
+            raise
+
+    @timed('db.retrieve_child_photos')
     def retrieve_child_photos(self, output_dir="./training_data"):
         """Retrieve all photos grouped by child name for model training"""
         try:
@@ -212,6 +804,7 @@ class DatabaseManager:
             self._reset_connection()
             raise
 
+    @timed('db.get_child_details')
     def get_child_details(self, child_name):
         """Get details of a missing child by name"""
         try:
@@ -228,6 +821,26 @@ class DatabaseManager:
             self._reset_connection()
             raise
     
+    @timed('db.get_cases_for_names')
+    def get_cases_for_names(self, child_names):
+        """Get case ids for a list of child names in a single query"""
+        if not child_names:
+            return []
+        try:
+            placeholders = ', '.join(['%s'] * len(child_names))
+            sql = f"""
+            SELECT child_name, case_id
+            FROM missing_children
+            WHERE child_name IN ({placeholders})
+            """
+            self.cursor.execute(sql, tuple(child_names))
+            return self.cursor.fetchall()
+        except Exception as e:
+            print(f"Error getting cases for names: {e}")
+            self._reset_connection()
+            raise
+
+    @timed('db.get_all_mole_data')
     def get_all_mole_data(self):
         """Get all mole descriptions with associated child names"""
         try:
@@ -244,6 +857,7 @@ class DatabaseManager:
             self._reset_connection()
             raise
     
+    @timed('db.get_mole_data_for_child')
     def get_mole_data_for_child(self, child_name):
         """Get mole descriptions for a specific child"""
         try:
@@ -263,7 +877,7 @@ class DatabaseManager:
 
     def _sanitize_filename(self, name):
         """Remove invalid characters from filename"""
-        return re.sub(r'[<>:"/\\|?*]', '_', name)
+        return sanitize_filename(name)
 
     def close(self):
         """Close database connection"""
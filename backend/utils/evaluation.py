@@ -0,0 +1,150 @@
+import numpy as np
+
+# Cosine distances lie in [0, 2]; histogram resolution of the genuine and impostor distributions
+DISTANCE_BINS = 4000
+# Rows per block of the all-pairs distance computation
+EVAL_BLOCK_ROWS = 4096
+# False accept rates reported with their true accept rate and threshold
+FAR_TARGETS = (1e-1, 1e-2, 1e-3, 1e-4, 1e-5)
+
+
+def _normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+def distance_histograms(embeddings, labels, bins=DISTANCE_BINS, block_rows=EVAL_BLOCK_ROWS):
+    """Histograms of cosine distance over all genuine (same label) and impostor pairs
+
+    Every unordered pair is visited once, one block of the distance matrix at
+    a time, and only bin counts are kept: memory does not grow with the
+    number of pairs, which is ~n^2 / 2.
+    """
+    vectors = _normalize(embeddings)
+    _, codes = np.unique(np.asarray(labels), return_inverse=True)
+    genuine = np.zeros(bins, dtype=np.int64)
+    impostor = np.zeros(bins, dtype=np.int64)
+    n = len(vectors)
+    for i in range(0, n, block_rows):
+        left, left_codes = vectors[i:i + block_rows], codes[i:i + block_rows]
+        for j in range(i, n, block_rows):
+            right, right_codes = vectors[j:j + block_rows], codes[j:j + block_rows]
+            distances = 1 - left @ right.T
+            binned = np.clip((distances * (bins / 2)).astype(np.int64), 0, bins - 1)
+            same = left_codes[:, None] == right_codes[None, :]
+            if j == i:
+                upper = np.triu(np.ones(same.shape, dtype=bool), k=1)
+                genuine += np.bincount(binned[same & upper], minlength=bins)
+                impostor += np.bincount(binned[~same & upper], minlength=bins)
+            else:
+                genuine += np.bincount(binned[same], minlength=bins)
+                impostor += np.bincount(binned[~same], minlength=bins)
+    return genuine, impostor
+
+
+def roc_curve(genuine, impostor):
+    """Accept rates at every bin edge, accepting pairs with distance below the threshold
+
+    Returns a dict of arrays: threshold, tar (true accept rate), far (false
+    accept rate) and frr (false reject rate, 1 - tar).
+    """
+    bins = len(genuine)
+    thresholds = (np.arange(1, bins + 1) * 2.0 / bins).astype(np.float64)
+    tar = np.cumsum(genuine) / max(int(genuine.sum()), 1)
+    far = np.cumsum(impostor) / max(int(impostor.sum()), 1)
+    return {'threshold': thresholds, 'tar': tar, 'far': far, 'frr': 1 - tar}
+
+
+def tar_at_far(curve, far_target):
+    """Best true accept rate with a false accept rate at most far_target, and its threshold"""
+    allowed = np.flatnonzero(curve['far'] <= far_target)
+    if not len(allowed):
+        return {'far_target': far_target, 'tar': 0.0, 'far': 0.0, 'threshold': 0.0}
+    index = allowed[-1]
+    return {'far_target': far_target, 'tar': float(curve['tar'][index]), 'far': float(curve['far'][index]),
+            'threshold': round(float(curve['threshold'][index]), 4)}
+
+
+def equal_error_rate(curve):
+    index = int(np.argmin(np.abs(curve['far'] - curve['frr'])))
+    return {'eer': float((curve['far'][index] + curve['frr'][index]) / 2),
+            'threshold': round(float(curve['threshold'][index]), 4)}
+
+
+def identification_rate(embeddings, labels, recognition_t, block_rows=EVAL_BLOCK_ROWS):
+    """Rank-1 identification against per-person mean encodings, as the gallery is built
+
+    Each probe is matched against the mean of every person's encodings, with
+    the probe itself left out of its own person's mean. People with a single
+    image have nothing left to enrol and are skipped as probes (but remain
+    in the gallery as distractors). Returns the fraction of probes whose best
+    match is their own person within recognition_t, and the fraction whose
+    best match within recognition_t is someone else.
+    """
+    vectors = _normalize(embeddings)
+    people, codes = np.unique(np.asarray(labels), return_inverse=True)
+    counts = np.bincount(codes, minlength=len(people))
+    sums = np.zeros((len(people), vectors.shape[1]), dtype=np.float32)
+    np.add.at(sums, codes, vectors)
+    means = _normalize(sums)
+
+    probes = np.flatnonzero(counts[codes] > 1)
+    correct = wrong = 0
+    for start in range(0, len(probes), block_rows):
+        block = probes[start:start + block_rows]
+        similarities = vectors[block] @ means.T
+        own = sums[codes[block]] - vectors[block]
+        similarities[np.arange(len(block)), codes[block]] = np.einsum('ij,ij->i', vectors[block], _normalize(own))
+        best = similarities.argmax(axis=1)
+        within = 1 - similarities[np.arange(len(block)), best] < recognition_t
+        correct += int(np.sum(within & (best == codes[block])))
+        wrong += int(np.sum(within & (best != codes[block])))
+    total = max(len(probes), 1)
+    return {'probes': int(len(probes)), 'rank1_rate': correct / total, 'false_identification_rate': wrong / total}
+
+
+def evaluate_embeddings(embeddings, labels, recognition_t, target_far=1e-3, far_targets=FAR_TARGETS):
+    """Verification and identification metrics plus a recommended recognition threshold"""
+    genuine, impostor = distance_histograms(embeddings, labels)
+    curve = roc_curve(genuine, impostor)
+    recommended = tar_at_far(curve, target_far)
+    current_index = min(int(recognition_t * len(genuine) / 2), len(genuine)) - 1
+    return {
+        'images': int(len(embeddings)),
+        'people': int(len(set(labels))),
+        'genuine_pairs': int(genuine.sum()),
+        'impostor_pairs': int(impostor.sum()),
+        'tar_at_far': [tar_at_far(curve, far) for far in far_targets],
+        'equal_error_rate': equal_error_rate(curve),
+        'current': {
+            'threshold': recognition_t,
+            'tar': float(curve['tar'][current_index]) if current_index >= 0 else 0.0,
+            'far': float(curve['far'][current_index]) if current_index >= 0 else 0.0,
+            'identification': identification_rate(embeddings, labels, recognition_t),
+        },
+        'recommended': dict(recommended, identification=identification_rate(
+            embeddings, labels, recommended['threshold'])),
+    }, curve
+
+
+def evaluate_mole_scores(fuzzy, tfidf, same, grid=range(50, 101, 5)):
+    """Precision, recall and F1 of the mole match rule for every pair of thresholds
+
+    fuzzy and tfidf are the raw scores of labelled (description, stored
+    description) pairs and same whether they describe the same child. The
+    rule keeps the fuzzy score when it reaches the fuzzy threshold, else the
+    TF-IDF score, and accepts when that reaches the accept threshold.
+    """
+    fuzzy, tfidf, same = np.asarray(fuzzy), np.asarray(tfidf), np.asarray(same, dtype=bool)
+    results = []
+    for fuzzy_accept in grid:
+        final = np.where(fuzzy >= fuzzy_accept, fuzzy, tfidf)
+        for tfidf_accept in grid:
+            accepted = final >= tfidf_accept
+            true_positives = int(np.sum(accepted & same))
+            precision = true_positives / max(int(accepted.sum()), 1)
+            recall = true_positives / max(int(same.sum()), 1)
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            results.append({'fuzzy_accept': fuzzy_accept, 'tfidf_accept': tfidf_accept,
+                            'precision': precision, 'recall': recall, 'f1': f1})
+    return results
@@ -0,0 +1,129 @@
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import dlib
+import numpy as np
+from utils.chip_store import file_digest, photo_digest
+from utils.face_quality import FACE_QUALITY_MIN, assess_face
+
+PREDICTOR_PATH = "assets/model/shape_predictor_68_face_landmarks.dat"
+CHIP_SIZE = 160
+
+# Per-process dlib models, created once by the pool initializer
+_detector = None
+_predictor = None
+
+
+def _init_worker():
+    global _detector, _predictor
+    _detector = dlib.get_frontal_face_detector()
+    _predictor = dlib.shape_predictor(PREDICTOR_PATH)
+
+
+def extract_chip(img_path, min_quality=FACE_QUALITY_MIN):
+    """Load an image and return (aligned chip, quality) for its first face
+
+    The chip is None when no face was found or its quality is below
+    min_quality; quality is None only when there was no face to assess.
+    """
+    with open(img_path, 'rb') as f:
+        return _extract_from_bytes(f.read(), min_quality)
+
+
+def _extract_for_store(img_path):
+    """(SHA-1 of the photo, chip, quality) without the quality gate, for the chip store"""
+    try:
+        with open(img_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None, None, None
+    chip, quality = _extract_from_bytes(data, min_quality=0)
+    return photo_digest(data), chip, quality
+
+
+def _extract_from_bytes(data, min_quality):
+    if _detector is None:
+        _init_worker()
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None, None
+
+    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    faces = _detector(img_rgb)
+    if len(faces) == 0:
+        return None, None
+
+    landmarks = _predictor(img_rgb, faces[0])
+    chip = dlib.get_face_chip(img_rgb, landmarks, size=CHIP_SIZE)
+    quality = assess_face(faces[0], landmarks, chip)
+    if quality['score'] < min_quality:
+        return None, quality
+    return chip, quality
+
+
+class ChipExtractor:
+    """Detect and align faces for many images across a pool of worker processes
+
+    With a ChipStore, photos whose chip is already stored skip decoding,
+    detection and alignment entirely, and newly aligned chips are added to it.
+    """
+
+    def __init__(self, workers=None, store=None, min_quality=FACE_QUALITY_MIN):
+        self.workers = workers or os.cpu_count() or 1
+        self.store = store
+        self.min_quality = min_quality
+        self.pool = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self
+
+    def __exit__(self, *exc):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+
+    def _map(self, func, img_paths):
+        if not self.pool:
+            return [func(path) for path in img_paths]
+        chunksize = max(1, len(img_paths) // (self.workers * 4))
+        return list(self.pool.map(func, img_paths, chunksize=chunksize))
+
+    def extract(self, img_paths, owners=None, min_quality=None):
+        """Return (chip, quality) pairs in input order, see extract_chip
+
+        owners, if given, labels each path in the chip store. min_quality
+        overrides the extractor's quality gate for this call.
+        """
+        min_quality = self.min_quality if min_quality is None else min_quality
+        if self.store is None:
+            return self._map(functools.partial(extract_chip, min_quality=min_quality), img_paths)
+
+        digests = [file_digest(path) for path in img_paths]
+        stored = self.store.lookup(digests)
+        missing = [i for i, digest in enumerate(digests) if digest not in stored]
+        if owners:
+            self.store.add_owners((digests[i], owners[i]) for i in range(len(digests)) if digests[i] in stored)
+        extracted = dict(zip(missing, self._map(_extract_for_store, [img_paths[i] for i in missing])))
+        self.store.put_many([
+            (digest, chip, owners[i] if owners else None, quality['score'] if quality else None)
+            for i, (digest, chip, quality) in extracted.items()
+        ])
+
+        hits = [i for i, digest in enumerate(digests) if digest in stored and stored[digest]['slot'] >= 0]
+        chips = dict(zip(hits, self.store.read([stored[digests[i]]['slot'] for i in hits])))
+        results = []
+        for i, digest in enumerate(digests):
+            if i in extracted:
+                _, chip, quality = extracted[i]
+            elif i in chips:
+                chip, quality = chips[i], {'score': stored[digest]['quality']}
+            else:
+                chip, quality = None, None
+            if chip is not None and quality['score'] < min_quality:
+                chip = None
+            results.append((chip, quality))
+        return results
@@ -0,0 +1,91 @@
+import math
+import os
+import cv2
+import numpy as np
+
+# Minimum overall quality for a chip to be encoded at enrolment and at query time.
+# Queries use a lower bar: a volunteer's photo may be the only one there is.
+FACE_QUALITY_MIN = float(os.getenv('FACE_QUALITY_MIN', '0.35'))
+FACE_QUALITY_MIN_QUERY = float(os.getenv('FACE_QUALITY_MIN_QUERY', '0.15'))
+
+# Face height in the source image (px): no credit below MIN, full credit from GOOD
+MIN_FACE_PX = 40
+GOOD_FACE_PX = 100
+# Laplacian variance of the 160x160 chip at which it counts as fully sharp
+GOOD_SHARPNESS = 100.0
+# Mean grey level range treated as well exposed, falling to zero at the DARK/BRIGHT limits
+WELL_EXPOSED = (70, 190)
+DARK_LIMIT, BRIGHT_LIMIT = 20, 240
+# Nose offset between the jaw edges (0 frontal, 1 full profile) at which pose gets no credit
+MAX_YAW_RATIO = 0.6
+
+# 68-point landmark indices
+JAW_LEFT, JAW_RIGHT, NOSE_TIP = 0, 16, 30
+LEFT_EYE, RIGHT_EYE = slice(36, 42), slice(42, 48)
+
+
+class FaceRejected(Exception):
+    """A query photo that cannot be matched by face, and why
+
+    reason is one of 'unreadable_image', 'no_face' or 'low_face_quality';
+    quality holds the assessment for the last.
+    """
+
+    def __init__(self, reason, message, quality=None):
+        super().__init__(message)
+        self.reason = reason
+        self.quality = quality
+
+    def to_dict(self):
+        details = {'reason': self.reason, 'detail': str(self)}
+        if self.quality is not None:
+            details['face_quality'] = round(self.quality['score'], 3)
+        return details
+
+
+def _ramp(value, low, high):
+    return float(np.clip((value - low) / (high - low), 0.0, 1.0))
+
+
+def assess_face(rect, landmarks, chip):
+    """Score how usable an aligned face chip is, from cheap image and landmark measures
+
+    rect and landmarks are the dlib detection and 68-point shape in the source
+    image, chip the aligned RGB chip. Returns the per-measure values, their
+    scores in [0, 1] and the overall 'score' (their product).
+    """
+    points = np.array([(p.x, p.y) for p in landmarks.parts()], dtype=np.float32)
+    gray = cv2.cvtColor(chip, cv2.COLOR_RGB2GRAY)
+
+    size = rect.bottom() - rect.top()
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    brightness = float(gray.mean())
+
+    # Yaw from how far the nose tip sits from the middle of the jaw line
+    to_left = np.linalg.norm(points[NOSE_TIP] - points[JAW_LEFT])
+    to_right = np.linalg.norm(points[NOSE_TIP] - points[JAW_RIGHT])
+    yaw_ratio = float(abs(to_left - to_right) / (to_left + to_right)) if to_left + to_right else 1.0
+    # Roll is undone by alignment, only extreme angles hint at a bad landmark fit
+    eye_delta = points[RIGHT_EYE].mean(axis=0) - points[LEFT_EYE].mean(axis=0)
+    roll = math.degrees(math.atan2(eye_delta[1], eye_delta[0]))
+
+    if brightness < WELL_EXPOSED[0]:
+        exposure_score = _ramp(brightness, DARK_LIMIT, WELL_EXPOSED[0])
+    else:
+        exposure_score = 1.0 - _ramp(brightness, WELL_EXPOSED[1], BRIGHT_LIMIT)
+
+    scores = {
+        'size': _ramp(size, MIN_FACE_PX, GOOD_FACE_PX),
+        'sharpness': _ramp(sharpness, 0.0, GOOD_SHARPNESS),
+        'exposure': exposure_score,
+        'pose': 1.0 - _ramp(yaw_ratio, 0.0, MAX_YAW_RATIO) if abs(roll) <= 45 else 0.0,
+    }
+    return {
+        'score': float(np.prod(list(scores.values()))),
+        'scores': scores,
+        'size_px': int(size),
+        'sharpness': sharpness,
+        'brightness': brightness,
+        'yaw_ratio': yaw_ratio,
+        'roll_degrees': roll,
+    }
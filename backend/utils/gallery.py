@@ -0,0 +1,376 @@
+import json
+import os
+import pickle
+import tempfile
+import threading
+import uuid
+import numpy as np
+
+# Cosine distance below which a gallery entry is a face match, calibrated with evaluate.py
+RECOGNITION_THRESHOLD = float(os.getenv('RECOGNITION_THRESHOLD', '0.4'))
+
+ENCODINGS_PATH = "assets/encodings/encodings.pkl"
+GALLERY_INDEX_PATH = "assets/encodings/gallery.json"
+# Face quality of every gallery entry, see utils/face_quality.py
+GALLERY_QUALITY_PATH = "assets/encodings/quality.json"
+# Embedding model of galleries published before entries were tagged with one
+DEFAULT_MODEL_VERSION = "facenet-keras-v1"
+
+# Optional compact copy of the gallery scanned at query time: '', 'int8' or 'float16'
+GALLERY_QUANTIZATION = os.getenv('GALLERY_QUANTIZATION', '')
+# Candidates from the compact scan re-scored against the exact float32 rows
+GALLERY_RERANK_K = int(os.getenv('GALLERY_RERANK_K', '100'))
+# Rows converted to float32 at a time while scanning the compact copy, small
+# enough for the converted block to stay in cache
+GALLERY_SCAN_BLOCK_ROWS = 2048
+
+
+class GalleryMatrix:
+    """The gallery as one L2-normalised float32 matrix with a row per name
+
+    Saved as a .npy file so every worker process can memory-map it: the pages
+    live once in the OS page cache instead of once per unpickled dict. A small
+    JSON index holds the names and points at the current matrix file, and
+    replacing that index is what publishes a new gallery. The index also
+    records which embedding model produced the rows, since encodings from
+    different models cannot be compared.
+    """
+
+    def __init__(self, names, matrix, quality=None, model=None):
+        self.names = list(names)
+        self.matrix = matrix
+        # Mean face quality score per row, None where it was not recorded
+        self.quality = quality
+        self.model = model
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_dict(cls, encoding_dict, quality=None, model=None):
+        names = list(encoding_dict)
+        scores = [quality[name]['score'] if name in quality else None for name in names] if quality else None
+        if not names:
+            return cls([], np.empty((0, 128), dtype=np.float32), scores, model)
+        matrix = np.stack([np.asarray(encoding_dict[name], dtype=np.float32) for name in names])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return cls(names, matrix, scores, model)
+
+    def save(self, index_path=GALLERY_INDEX_PATH, quantization=GALLERY_QUANTIZATION):
+        """Write new matrix files, then switch the index to them atomically"""
+        directory = os.path.dirname(index_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        token = uuid.uuid4().hex[:12]
+        index = {'matrix': f"gallery-{token}.npy", 'names': self.names}
+        if self.quality is not None:
+            index['quality'] = self.quality
+        if self.model:
+            index['model'] = self.model
+        _save_array(os.path.join(directory, index['matrix']), np.ascontiguousarray(self.matrix, dtype=np.float32))
+
+        if quantization:
+            quantized = QuantizedGallery.from_matrix(self, quantization)
+            index['quantized'] = {
+                'dtype': quantization,
+                'codes': f"gallery-{token}.{quantization}.npy",
+                'scales': quantized.scales.tolist() if quantized.scales is not None else None,
+            }
+            _save_array(os.path.join(directory, index['quantized']['codes']), quantized.codes)
+
+        # The files of the gallery being replaced are only retired here and deleted on the next
+        # publish, so a reader that has just read the old index can still open them
+        previous = _read_index(index_path) or {}
+        index['retired'] = [name for name in _index_files(previous) if name not in _index_files(index)]
+        atomic_write(index_path, lambda f: json.dump(index, f))
+
+        # Processes still mapping deleted files keep them alive until they reload
+        for stale in previous.get('retired', []):
+            if stale not in _index_files(index):
+                try:
+                    os.remove(os.path.join(directory, stale))
+                except OSError:
+                    pass
+
+    @classmethod
+    def load(cls, index_path=GALLERY_INDEX_PATH, mmap=True, index=None):
+        """The gallery published at index_path, or described by index if it was already read from there"""
+        index = index or _read_index(index_path)
+        if index is None:
+            raise FileNotFoundError(index_path)
+        matrix_path = os.path.join(os.path.dirname(index_path) or '.', index['matrix'])
+        matrix = np.load(matrix_path, mmap_mode='r' if mmap else None)
+        if len(index['names']) != len(matrix):
+            raise ValueError(f"Gallery names ({len(index['names'])}) and matrix rows ({len(matrix)}) disagree")
+        return cls(index['names'], matrix, index.get('quality'), index.get('model'))
+
+    def match(self, encode, recognition_t):
+        """[(name, confidence)] for every entry closer than recognition_t (cosine distance), best match first"""
+        if not self.names:
+            return []
+        query = np.asarray(encode, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        dist = 1 - self.matrix @ query
+        hits = np.flatnonzero(dist < recognition_t)
+        hits = hits[np.argsort(dist[hits], kind='stable')]
+        return [(self.names[i], float(1 - dist[i])) for i in hits]
+
+    def match_subset(self, encode, recognition_t, names):
+        """match restricted to the given names, reading only their rows"""
+        if getattr(self, '_rows', None) is None:
+            self._rows = {name: i for i, name in enumerate(self.names)}
+        rows = np.array(sorted(self._rows[name] for name in names if name in self._rows), dtype=np.int64)
+        if not len(rows):
+            return []
+        query = np.asarray(encode, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        dist = 1 - np.asarray(self.matrix[rows], dtype=np.float32) @ query
+        hits = np.flatnonzero(dist < recognition_t)
+        hits = hits[np.argsort(dist[hits], kind='stable')]
+        return [(self.names[rows[i]], float(1 - dist[i])) for i in hits]
+
+    def match_many(self, encodes, recognition_t):
+        """match for several encodings with one matrix product"""
+        if not self.names or not len(encodes):
+            return [[] for _ in encodes]
+        queries = np.asarray(encodes, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        dist = 1 - self.matrix @ queries.T
+        results = []
+        for column in dist.T:
+            hits = np.flatnonzero(column < recognition_t)
+            hits = hits[np.argsort(column[hits], kind='stable')]
+            results.append([(self.names[i], float(1 - column[i])) for i in hits])
+        return results
+
+
+class QuantizedGallery:
+    """A gallery scanned in int8 or float16 and re-ranked in float32
+
+    int8 codes use a per-dimension scale (max |value| / 127), folded into the
+    query so scanning is one matrix-vector product per block of rows. Only the
+    best rerank_k candidates are re-scored exactly against the float32 rows,
+    which stay memory-mapped and are only paged in for those candidates.
+    """
+
+    def __init__(self, names, codes, scales, exact):
+        self.names = list(names)
+        self.codes = codes
+        self.scales = scales
+        self.exact = exact
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_matrix(cls, gallery, dtype='int8'):
+        matrix = np.asarray(gallery.matrix, dtype=np.float32)
+        if dtype == 'float16':
+            return cls(gallery.names, matrix.astype(np.float16), None, gallery.matrix)
+        if dtype != 'int8':
+            raise ValueError(f"Unsupported gallery quantization: {dtype}")
+        scales = np.abs(matrix).max(axis=0) / 127 if len(matrix) else np.ones(matrix.shape[1], dtype=np.float32)
+        scales = np.where(scales == 0, 1, scales).astype(np.float32)
+        codes = np.clip(np.rint(matrix / scales), -127, 127).astype(np.int8)
+        return cls(gallery.names, codes, scales, gallery.matrix)
+
+    @classmethod
+    def load(cls, index_path=GALLERY_INDEX_PATH, index=None):
+        """As GalleryMatrix.load; names, rows and codes all come from one read of the index"""
+        index = index or _read_index(index_path)
+        if index is None:
+            raise FileNotFoundError(index_path)
+        quantized = index.get('quantized')
+        if not quantized:
+            raise ValueError(f"{index_path} has no quantized gallery")
+        exact = GalleryMatrix.load(index_path, index=index)
+        directory = os.path.dirname(index_path) or '.'
+        codes = np.load(os.path.join(directory, quantized['codes']), mmap_mode='r')
+        if len(codes) != len(exact.names):
+            raise ValueError(f"Gallery names ({len(exact.names)}) and quantized rows ({len(codes)}) disagree")
+        scales = np.asarray(quantized['scales'], dtype=np.float32) if quantized['scales'] else None
+        return cls(exact.names, codes, scales, exact.matrix)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def approximate_scores(self, query):
+        """Cosine similarity of every row to an L2-normalised query, from the compact codes"""
+        if self.scales is not None:
+            query = query * self.scales
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        buffer = np.empty((GALLERY_SCAN_BLOCK_ROWS, self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.codes), GALLERY_SCAN_BLOCK_ROWS):
+            block = self.codes[start:start + GALLERY_SCAN_BLOCK_ROWS]
+            rows = len(block)
+            np.copyto(buffer[:rows], block, casting='unsafe')
+            np.matmul(buffer[:rows], query, out=scores[start:start + rows])
+        return scores
+
+    def match(self, encode, recognition_t, rerank_k=GALLERY_RERANK_K):
+        """Same output as GalleryMatrix.match, limited to the best rerank_k candidates"""
+        if not self.names:
+            return []
+        query = np.asarray(encode, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        scores = self.approximate_scores(query)
+        if len(scores) > rerank_k:
+            candidates = np.argpartition(-scores, rerank_k - 1)[:rerank_k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates.sort()
+        dist = 1 - np.asarray(self.exact[candidates], dtype=np.float32) @ query
+        keep = dist < recognition_t
+        candidates, dist = candidates[keep], dist[keep]
+        order = np.argsort(dist, kind='stable')
+        return [(self.names[candidates[i]], float(1 - dist[i])) for i in order]
+
+    def match_subset(self, encode, recognition_t, names):
+        """A few rows are cheaper to score exactly than to scan in compact form"""
+        if getattr(self, '_exact_gallery', None) is None:
+            self._exact_gallery = GalleryMatrix(self.names, self.exact)
+        return self._exact_gallery.match_subset(encode, recognition_t, names)
+
+    def match_many(self, encodes, recognition_t):
+        return [self.match(encode, recognition_t) for encode in encodes]
+
+
+def update_gallery_quality(encoding_dict, quality=None, path=GALLERY_QUALITY_PATH):
+    """Merge new per-entry quality into the stored record, dropping entries no longer in the gallery"""
+    try:
+        with open(path) as f:
+            stored = json.load(f)
+    except (FileNotFoundError, ValueError):
+        stored = {}
+    stored.update(quality or {})
+    stored = {name: entry for name, entry in stored.items() if name in encoding_dict}
+
+    atomic_write(path, lambda f: json.dump(stored, f))
+    return stored
+
+
+def atomic_write(path, write, mode="w"):
+    """Write path through a temporary file of its own and rename it into place
+
+    write(f) fills the file. Every writer gets a unique temporary file in the
+    same directory, so concurrent writers never write over each other's
+    half-written file: the last rename wins.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _save_array(path, array):
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+
+def _index_files(index):
+    files = [index['matrix']] if 'matrix' in index else []
+    if index.get('quantized'):
+        files.append(index['quantized']['codes'])
+    return files
+
+
+def _read_index(index_path):
+    try:
+        with open(index_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+_gallery = None
+_gallery_source = None
+_gallery_lock = threading.Lock()
+
+
+def gallery_version(encodings_path=ENCODINGS_PATH, index_path=GALLERY_INDEX_PATH):
+    """Identity of the published gallery, changes whenever a new one is published
+
+    Returns None when nothing has been trained yet.
+    """
+    source = index_path if os.path.exists(index_path) else encodings_path
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return None
+    # Publishing replaces the file, so a new inode means a new gallery
+    return (source, stat.st_ino, stat.st_mtime_ns)
+
+
+_model = (None, DEFAULT_MODEL_VERSION)
+
+
+def gallery_model(index_path=GALLERY_INDEX_PATH):
+    """Embedding model version of the published gallery
+
+    Queries must be encoded with this model. It is read from the same index
+    whose replacement publishes the gallery, so the model and the rows it
+    produced switch together.
+    """
+    global _model
+    key = gallery_version('', index_path)
+    if key != _model[0]:
+        index = _read_index(index_path) if key else None
+        _model = (key, (index or {}).get('model') or DEFAULT_MODEL_VERSION)
+    return _model[1]
+
+
+def load_gallery(encodings_path=ENCODINGS_PATH, index_path=GALLERY_INDEX_PATH):
+    """Return the current gallery, reloading only when the published files change
+
+    Prefers the memory-mapped matrix, scanning its quantized copy when
+    GALLERY_QUANTIZATION is set; falls back to the pickled dict for
+    galleries trained before the matrix was written. Returns None when
+    nothing has been trained yet.
+    """
+    global _gallery, _gallery_source
+    key = gallery_version(encodings_path, index_path)
+    if key is None:
+        print("No encodings file found")
+        return None
+
+    with _gallery_lock:
+        if _gallery is None or _gallery_source != key:
+            if key[0] != index_path:
+                with open(encodings_path, "rb") as f:
+                    _gallery = GalleryMatrix.from_dict(pickle.load(f))
+                _gallery_source = key
+                return _gallery
+
+            # Everything is built from one read of the index. It is read again if a publish
+            # replaced it meanwhile, so the cached version always matches what was loaded.
+            for attempt in range(3):
+                index = _read_index(index_path)
+                try:
+                    if index is None:
+                        raise FileNotFoundError(index_path)
+                    if GALLERY_QUANTIZATION and index.get('quantized'):
+                        gallery = QuantizedGallery.load(index_path, index)
+                    else:
+                        gallery = GalleryMatrix.load(index_path, index=index)
+                except FileNotFoundError:
+                    # Files of a gallery two publishes old are gone, the index has moved on
+                    if attempt == 2:
+                        raise
+                    key = gallery_version(encodings_path, index_path)
+                    continue
+                loaded_key = gallery_version(encodings_path, index_path)
+                if loaded_key == key or attempt == 2:
+                    break
+                key = loaded_key
+            _gallery, _gallery_source = gallery, key
+        return _gallery
@@ -0,0 +1,192 @@
+import heapq
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.gallery import GalleryMatrix, gallery_version
+
+# Local shards: the gallery is split by hash of the gallery key into this many matrices
+GALLERY_SHARDS = int(os.getenv('GALLERY_SHARDS', '0'))
+GALLERY_SHARD_DIR = os.getenv('GALLERY_SHARD_DIR', 'assets/encodings/shards')
+# Remote shards served by shard_server.py, e.g. http://10.0.0.5:8001,http://10.0.0.6:8001
+GALLERY_SHARD_URLS = [url.strip() for url in os.getenv('GALLERY_SHARD_URLS', '').split(',') if url.strip()]
+GALLERY_SHARD_TIMEOUT = float(os.getenv('GALLERY_SHARD_TIMEOUT', '5'))
+
+
+def sharding_enabled():
+    return bool(GALLERY_SHARDS or GALLERY_SHARD_URLS)
+
+
+def shard_for(name, num_shards):
+    """Stable shard of a gallery key, the same in every process and across restarts"""
+    return zlib.crc32(name.encode('utf-8')) % num_shards
+
+
+def shard_index_path(directory, shard):
+    return os.path.join(directory, f"shard-{shard:03d}", "gallery.json")
+
+
+class LocalShard:
+    """One shard's memory-mapped matrix, reloaded only when that shard is republished"""
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.lock = threading.Lock()
+        self.gallery = None
+        self.loaded_version = None
+
+    def version(self):
+        return gallery_version('', self.index_path)
+
+    def current(self):
+        version = self.version()
+        if version is None:
+            return None
+        with self.lock:
+            if version != self.loaded_version:
+                self.gallery = GalleryMatrix.load(self.index_path)
+                self.loaded_version = version
+            return self.gallery
+
+    def match(self, encode, recognition_t):
+        gallery = self.current()
+        return gallery.match(encode, recognition_t) if gallery else []
+
+    def match_subset(self, encode, recognition_t, names):
+        gallery = self.current()
+        return gallery.match_subset(encode, recognition_t, names) if gallery else []
+
+
+class RemoteShard:
+    """A shard served by shard_server.py over XML-RPC, standing in for a shard on another node"""
+
+    def __init__(self, url, timeout=GALLERY_SHARD_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _proxy(self):
+        # ServerProxy is not thread-safe, keep one per calling thread
+        proxy = getattr(self.local, 'proxy', None)
+        if proxy is None:
+            import xmlrpc.client
+            transport = xmlrpc.client.Transport()
+            transport.timeout = self.timeout
+            proxy = self.local.proxy = xmlrpc.client.ServerProxy(self.url, transport=transport, allow_none=True)
+        return proxy
+
+    def version(self):
+        return self._proxy().version()
+
+    def match(self, encode, recognition_t):
+        encode = [float(x) for x in np.asarray(encode, dtype=np.float32)]
+        return [(name, confidence) for name, confidence in self._proxy().match(encode, float(recognition_t))]
+
+    def match_subset(self, encode, recognition_t, names):
+        encode = [float(x) for x in np.asarray(encode, dtype=np.float32)]
+        return [(name, confidence) for name, confidence in
+                self._proxy().match_subset(encode, float(recognition_t), list(names))]
+
+
+class ShardedGallery:
+    """Scatter a query to every shard in parallel and merge the per-shard rankings
+
+    NumPy releases the GIL for the matrix products and remote shards wait on
+    the network, so a thread pool is enough to use one core per shard.
+    """
+
+    def __init__(self, shards, workers=None):
+        self.shards = shards
+        self.pool = ThreadPoolExecutor(workers or len(shards), thread_name_prefix='gallery-shard')
+
+    @classmethod
+    def local(cls, directory=GALLERY_SHARD_DIR, num_shards=GALLERY_SHARDS):
+        return cls([LocalShard(shard_index_path(directory, shard)) for shard in range(num_shards)])
+
+    @classmethod
+    def remote(cls, urls=GALLERY_SHARD_URLS):
+        return cls([RemoteShard(url) for url in urls])
+
+    def version(self):
+        return tuple(self.pool.map(lambda shard: shard.version(), self.shards))
+
+    def match(self, encode, recognition_t, top_k=None):
+        """Same output as GalleryMatrix.match over the whole gallery"""
+        results = list(self.pool.map(lambda shard: shard.match(encode, recognition_t), self.shards))
+        return self._merge(results, top_k)
+
+    def match_subset(self, encode, recognition_t, names):
+        """match restricted to the given names, each shard scoring those it holds"""
+        names = list(names)
+        if not names:
+            return []
+        return self._merge(self.pool.map(lambda shard: shard.match_subset(encode, recognition_t, names),
+                                         self.shards))
+
+    @staticmethod
+    def _merge(results, top_k=None):
+        # Each shard is already sorted best first
+        merged = list(heapq.merge(*results, key=lambda match: -match[1]))
+        return merged[:top_k] if top_k else merged
+
+    def match_many(self, encodes, recognition_t):
+        return [self.match(encode, recognition_t) for encode in encodes]
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+def partition(encoding_dict, num_shards):
+    parts = [{} for _ in range(num_shards)]
+    for name, encode in encoding_dict.items():
+        parts[shard_for(name, num_shards)][name] = encode
+    return parts
+
+
+def _publish_shard(index_path, entries, replace, model=None):
+    """Write one shard, returns False when its contents are unchanged"""
+    try:
+        current = GalleryMatrix.load(index_path, mmap=False)
+    except (FileNotFoundError, ValueError):
+        current = None
+
+    if not replace and current is not None:
+        merged = dict(zip(current.names, current.matrix))
+        merged.update(entries)
+        entries = merged
+    gallery = GalleryMatrix.from_dict(entries, model=model)
+    if (current is not None and current.model == gallery.model and current.names == gallery.names
+            and np.array_equal(current.matrix, gallery.matrix)):
+        return False
+    gallery.save(index_path, quantization='')
+    return True
+
+
+def publish_shards(encoding_dict, directory=GALLERY_SHARD_DIR, num_shards=GALLERY_SHARDS, replace=True,
+                   workers=None, model=None):
+    """Publish the gallery as shards, rewriting only shards whose contents changed
+
+    With replace=False the entries are merged into the existing shards, so
+    enrolling a few cases touches only the shards they hash to. Returns the
+    ids of the shards that were rewritten; workers reload just those.
+    """
+    parts = partition(encoding_dict, num_shards)
+    shards = [shard for shard in range(num_shards) if replace or parts[shard]]
+    with ThreadPoolExecutor(workers or min(len(shards), os.cpu_count() or 1) or 1) as pool:
+        changed = pool.map(lambda shard: _publish_shard(shard_index_path(directory, shard), parts[shard], replace,
+                                                        model), shards)
+        return [shard for shard, was_changed in zip(shards, changed) if was_changed]
+
+
+_sharded = None
+_sharded_lock = threading.Lock()
+
+
+def get_sharded_gallery():
+    """Process-wide sharded gallery: remote shards if GALLERY_SHARD_URLS is set, local ones otherwise"""
+    global _sharded
+    with _sharded_lock:
+        if _sharded is None:
+            _sharded = ShardedGallery.remote() if GALLERY_SHARD_URLS else ShardedGallery.local()
+    return _sharded
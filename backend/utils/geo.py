@@ -0,0 +1,209 @@
+import csv
+import os
+import re
+import threading
+import time
+
+# Local gazetteer of place names: CSV with name, latitude, longitude columns
+# (GeoNames exports work once trimmed to those). Geocoding is off without it.
+GAZETTEER_PATH = os.getenv('GAZETTEER_PATH', 'assets/gazetteer.csv')
+# Cells stored with each sighting, 6 characters is about 1.2 x 0.6 km
+GEOHASH_PRECISION = 6
+# Cells searched around a sighting: the cell at this precision and its 8 neighbours,
+# 4 characters is about 39 x 20 km
+NEARBY_GEOHASH_PRECISION = int(os.getenv('NEARBY_GEOHASH_PRECISION', '4'))
+# How long the in-memory spatial index is used before it is rebuilt from the database
+SPATIAL_INDEX_TTL_SECONDS = float(os.getenv('SPATIAL_INDEX_TTL_SECONDS', '300'))
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_COORDINATES = re.compile(r'^\s*(-?\d{1,2}(?:\.\d+)?)\s*[, ]\s*(-?\d{1,3}(?:\.\d+)?)\s*$')
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    cell, bits, bit_count, even = [], 0, 0, True
+    while len(cell) < precision:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            cell.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(cell)
+
+
+def geohash_bounds(cell):
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        bits = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if bits >> shift & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def geohash_neighbours(cell):
+    """The cell and the 8 cells around it, at the same precision"""
+    min_lat, min_lon, max_lat, max_lon = geohash_bounds(cell)
+    height, width = max_lat - min_lat, max_lon - min_lon
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    cells = set()
+    for d_lat in (-height, 0, height):
+        for d_lon in (-width, 0, width):
+            latitude = center_lat + d_lat
+            if -90 <= latitude <= 90:
+                longitude = (center_lon + d_lon + 180) % 360 - 180
+                cells.add(geohash_encode(latitude, longitude, len(cell)))
+    return cells
+
+
+def normalize_place(text):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+class Gazetteer:
+    """Place name to coordinates lookup over a local CSV file"""
+
+    def __init__(self, places):
+        self.places = places
+        self.longest = max((len(name.split()) for name in places), default=0)
+
+    @classmethod
+    def load(cls, path=GAZETTEER_PATH):
+        places = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    places.setdefault(normalize_place(row['name']),
+                                      (float(row['latitude']), float(row['longitude'])))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        return cls(places)
+
+    def __len__(self):
+        return len(self.places)
+
+    def geocode(self, text):
+        """(latitude, longitude) for free-text location, None if no place in it is known
+
+        Accepts "lat, lon" directly. Otherwise the whole text, then each
+        comma-separated part, then the longest run of words naming a known
+        place is looked up, so "near the bus stand, Koramangala, Bengaluru"
+        resolves to Koramangala rather than the city.
+        """
+        if not text:
+            return None
+        coordinates = _COORDINATES.match(text)
+        if coordinates:
+            latitude, longitude = float(coordinates.group(1)), float(coordinates.group(2))
+            if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                return latitude, longitude
+
+        for candidate in [text] + text.split(','):
+            place = self.places.get(normalize_place(candidate))
+            if place:
+                return place
+
+        words = normalize_place(text).split()
+        for length in range(min(self.longest, len(words)), 0, -1):
+            for start in range(len(words) - length + 1):
+                place = self.places.get(' '.join(words[start:start + length]))
+                if place:
+                    return place
+        return None
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Process-wide gazetteer, None when GAZETTEER_PATH does not exist"""
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            try:
+                _gazetteer = Gazetteer.load()
+                print(f"Loaded {len(_gazetteer)} gazetteer places")
+            except FileNotFoundError:
+                print(f"No gazetteer at {GAZETTEER_PATH}, sighting locations are not geocoded")
+                _gazetteer = False
+    return _gazetteer or None
+
+
+def geocode_location(text):
+    """(latitude, longitude, geohash cell) of a free-text location, or None"""
+    gazetteer = get_gazetteer()
+    place = gazetteer.geocode(text) if gazetteer else None
+    if place is None:
+        return None
+    return place[0], place[1], geohash_encode(place[0], place[1])
+
+
+class SpatialIndex:
+    """Gallery names by the geohash cell each case was last seen in
+
+    Built from loader(), which returns [(name, geohash)], and rebuilt once it
+    is older than ttl_seconds; sightings stored by this process are added
+    straight away through add(). generation counts the changes, for caches
+    of results computed against the index.
+    """
+
+    def __init__(self, loader, ttl_seconds=SPATIAL_INDEX_TTL_SECONDS, precision=NEARBY_GEOHASH_PRECISION):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.precision = precision
+        self.lock = threading.Lock()
+        self.cells = {}
+        self.cell_of = {}
+        self.built_at = None
+        self.generation = 0
+
+    def _refresh(self):
+        if self.built_at is not None and time.monotonic() - self.built_at < self.ttl_seconds:
+            return
+        cells, cell_of = {}, {}
+        for name, cell in self.loader():
+            cell_of[name] = cell[:self.precision]
+            cells.setdefault(cell[:self.precision], set()).add(name)
+        with self.lock:
+            self.cells, self.cell_of = cells, cell_of
+            self.built_at = time.monotonic()
+            self.generation += 1
+
+    def add(self, name, cell):
+        with self.lock:
+            previous = self.cell_of.get(name)
+            if previous is not None:
+                self.cells[previous].discard(name)
+            self.cell_of[name] = cell[:self.precision]
+            self.cells.setdefault(cell[:self.precision], set()).add(name)
+            self.generation += 1
+
+    def version(self):
+        """Generation of the index, rebuilt first if it is due"""
+        self._refresh()
+        return self.generation
+
+    def nearby(self, cell):
+        """Names last seen in the cell containing the given one or any cell next to it"""
+        self._refresh()
+        with self.lock:
+            names = set()
+            for neighbour in geohash_neighbours(cell[:self.precision]):
+                names |= self.cells.get(neighbour, set())
+            return names
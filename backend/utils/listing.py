@@ -0,0 +1,92 @@
+import base64
+import json
+import os
+from datetime import date, datetime
+
+# Rows fetched from the server-side cursor and written to the response at a time
+LISTING_BATCH_ROWS = int(os.getenv('LISTING_BATCH_ROWS', '1000'))
+# Listings streamed at once per process, each holds a request thread and a database connection
+LISTING_MAX_CONCURRENT = int(os.getenv('LISTING_MAX_CONCURRENT', '2'))
+# Largest page a client can ask for with limit, leave limit out to stream everything
+LISTING_MAX_LIMIT = 100_000
+
+
+def encode_cursor(row):
+    """Opaque cursor resuming a listing after row"""
+    position = json.dumps([row['created_at'].isoformat(), row['id']])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor from encode_cursor, ValueError if it is not one"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('after is not a valid cursor')
+
+
+def parse_time(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO 8601 date or time')
+
+
+def parse_listing_args(args, filter_names):
+    """Keyword arguments for DatabaseManager.stream_cases/stream_sightings from query parameters
+
+    Accepts after (a cursor), limit, order (asc or desc, by created_at then
+    id), since and until (ISO 8601) and the given exact or prefix filters.
+    Raises ValueError on anything malformed.
+    """
+    options = {name: args[name] for name in filter_names if args.get(name)}
+    for name in ('since', 'until'):
+        if args.get(name):
+            options[name] = parse_time(args[name], name)
+    if args.get('after'):
+        options['after'] = decode_cursor(args['after'])
+
+    order = args.get('order', 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    options['descending'] = order == 'desc'
+
+    if args.get('limit'):
+        try:
+            options['limit'] = int(args['limit'])
+        except ValueError:
+            raise ValueError('limit must be a number')
+        if not 1 <= options['limit'] <= LISTING_MAX_LIMIT:
+            raise ValueError(f'limit must be between 1 and {LISTING_MAX_LIMIT}')
+    return options
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+
+def ndjson_lines(batches, limit=None):
+    """One JSON object per row, written a batch at a time
+
+    batches should hold one row more than limit: when it does, the page ends
+    with a {"next_cursor": ...} line to pass back as after.
+    """
+    sent, last = 0, None
+    for rows in batches:
+        if limit is not None and sent + len(rows) > limit:
+            rows = rows[:limit - sent]
+            if rows:
+                last = rows[-1]
+            if last is not None:
+                yield ''.join(json.dumps(row, default=_json_default) + '\n' for row in rows) + \
+                    json.dumps({'next_cursor': encode_cursor(last)}) + '\n'
+            return
+        if rows:
+            last = rows[-1]
+            sent += len(rows)
+            yield ''.join(json.dumps(row, default=_json_default) + '\n' for row in rows)
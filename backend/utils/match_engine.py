@@ -0,0 +1,161 @@
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import linear_kernel
+from utils.gallery import RECOGNITION_THRESHOLD
+from utils.metrics import span, timed
+
+# Acceptance thresholds, calibrated with evaluate.py
+FACE_MATCH_THRESHOLD = 1 - RECOGNITION_THRESHOLD   # confidence = 1 - cosine distance
+# A fuzzy score this high is conclusive on its own, otherwise TF-IDF decides
+FUZZY_ACCEPT_SCORE = float(os.getenv('FUZZY_ACCEPT_SCORE', '90'))
+# Final mole score needed to count as a mole match
+TFIDF_ACCEPT_SCORE = float(os.getenv('TFIDF_ACCEPT_SCORE', '80'))
+
+# Fusion weights; face evidence always outranks a mole-only candidate
+FACE_WEIGHT = 0.7
+MOLE_WEIGHT = 0.3
+
+FACE_TOP_K = 5
+MOLE_TOP_K = 5
+
+STOPWORDS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'assets', 'stopwords_english.txt')
+
+_stop_words = None
+
+
+def _get_stop_words():
+    global _stop_words
+    if _stop_words is None:
+        try:
+            # Vendored copy of the NLTK English list, so startup never hits the network
+            with open(STOPWORDS_PATH) as f:
+                _stop_words = {line.strip() for line in f if line.strip()}
+        except OSError:
+            try:
+                from nltk.corpus import stopwords
+                _stop_words = set(stopwords.words('english'))
+            except (ImportError, LookupError):
+                # Fallback if NLTK stopwords are not available
+                _stop_words = set()
+    return _stop_words
+
+
+def preprocess_text(text):
+    """Preprocess text for mole matching"""
+    if not text:
+        return ""
+    text = text.lower()  # Convert to lowercase
+    text = re.sub(r'[^a-z0-9\s]', '', text)  # Remove special characters
+    stop_words = _get_stop_words()
+    return ' '.join(word for word in text.split() if word not in stop_words)
+
+
+class CandidateScorer:
+    def __init__(self, face_weight=FACE_WEIGHT, mole_weight=MOLE_WEIGHT,
+                 face_threshold=FACE_MATCH_THRESHOLD, fuzzy_accept=FUZZY_ACCEPT_SCORE,
+                 tfidf_accept=TFIDF_ACCEPT_SCORE, face_top_k=FACE_TOP_K, mole_top_k=MOLE_TOP_K):
+        self.face_weight = face_weight
+        self.mole_weight = mole_weight
+        self.face_threshold = face_threshold
+        self.fuzzy_accept = fuzzy_accept
+        self.tfidf_accept = tfidf_accept
+        self.face_top_k = face_top_k
+        self.mole_top_k = mole_top_k
+
+    def score_texts(self, user_input, stored_texts):
+        """Score one description against a corpus with a single fuzzy + TF-IDF pass
+
+        Returns an array of scores on a 0-100 scale. A row keeps its fuzzy score
+        when that alone is conclusive, otherwise the TF-IDF cosine is used.
+        """
+        fuzzy, tfidf = self.text_scores(user_input, stored_texts)
+        return np.where(fuzzy >= self.fuzzy_accept, fuzzy, tfidf)
+
+    def text_scores(self, user_input, stored_texts):
+        """(fuzzy, TF-IDF) scores of one description against a corpus, both on a 0-100 scale"""
+        if not user_input or not stored_texts:
+            return np.zeros(len(stored_texts)), np.zeros(len(stored_texts))
+
+        with span('mole.preprocess'):
+            query = preprocess_text(user_input)
+            corpus = [preprocess_text(text) for text in stored_texts]
+
+        with span('mole.fuzzy'):
+            fuzzy = process.cdist([query], corpus, scorer=fuzz.token_set_ratio, dtype=np.float32)[0]
+        with span('mole.tfidf'):
+            try:
+                tfidf_matrix = TfidfVectorizer().fit_transform([query] + corpus)
+                # Rows are L2-normalised, so the linear kernel is the cosine similarity
+                tfidf = linear_kernel(tfidf_matrix[0], tfidf_matrix[1:])[0] * 100
+            except ValueError:
+                # Empty vocabulary (e.g. only stopwords), TF-IDF has nothing to add
+                tfidf = np.zeros(len(corpus))
+
+        return fuzzy, tfidf
+
+    @timed('match.score')
+    def score(self, face_matches, face_cases, mole_description, mole_data):
+        """Fuse face and mole evidence into one ranking of cases
+
+        face_matches: [(child_name, confidence)] sorted best first, as returned by
+            FaceDetector.detect_face
+        face_cases: rows with child_name and case_id for the face candidates
+        mole_description: free-text description from the reporter, may be empty
+        mole_data: rows with case_id, child_name and description
+
+        Returns a dict with the fused ranking (best first) and per-stage timings in ms.
+        """
+        timings = {}
+
+        start = time.perf_counter()
+        face_df = pd.DataFrame(list(face_matches or [])[:self.face_top_k],
+                               columns=['child_name', 'face_score'])
+        cases_df = pd.DataFrame(list(face_cases or []), columns=['child_name', 'case_id'])
+        face_df = face_df.merge(cases_df, on='child_name', how='left')
+        # Gallery entries without a case row are still ranked under their name
+        face_df['case_id'] = face_df['case_id'].fillna(face_df['child_name'])
+        timings['face_topk'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        mole_df = pd.DataFrame(list(mole_data or []), columns=['case_id', 'child_name', 'description'])
+        if mole_description and len(mole_df):
+            mole_df['mole_score'] = self.score_texts(mole_description, mole_df['description'].tolist())
+            mole_df = (mole_df.groupby('case_id', as_index=False)
+                       .agg(child_name=('child_name', 'first'), mole_score=('mole_score', 'max'))
+                       .nlargest(self.mole_top_k, 'mole_score'))
+        else:
+            mole_df = pd.DataFrame(columns=['case_id', 'child_name', 'mole_score'])
+        timings['mole_topk'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        fused = face_df.merge(mole_df, on='case_id', how='outer', suffixes=('', '_mole'))
+        fused['child_name'] = fused['child_name'].fillna(fused['child_name_mole'])
+        face_score = fused['face_score'].fillna(0).to_numpy(dtype=np.float64)
+        mole_score = fused['mole_score'].fillna(0).to_numpy(dtype=np.float64)
+        fused['face_score'] = face_score
+        fused['mole_score'] = mole_score
+        fused['face_match'] = face_score >= self.face_threshold
+        fused['mole_match'] = mole_score >= self.tfidf_accept
+        fused['fused_score'] = self.face_weight * face_score + self.mole_weight * mole_score / 100
+        fused = fused[fused['face_match'] | fused['mole_match']].sort_values('fused_score', ascending=False)
+        timings['fusion'] = (time.perf_counter() - start) * 1000
+
+        ranking = [
+            {
+                'case_id': row.case_id,
+                'child_name': row.child_name,
+                'face_score': float(row.face_score),
+                'mole_score': float(row.mole_score),
+                'fused_score': float(row.fused_score),
+                'face_match': bool(row.face_match),
+                'mole_match': bool(row.mole_match),
+            }
+            for row in fused.itertuples(index=False)
+        ]
+        return {'ranking': ranking, 'timings': timings}
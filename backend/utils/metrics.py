@@ -0,0 +1,144 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Prometheus default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# Stage timings (ms) of the request being handled in the current thread/task
+_request_timings = ContextVar('request_timings', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """Process-local histograms, counters and gauges in Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.help = {}
+
+    def observe(self, name, value, labels=None, buckets=DEFAULT_BUCKETS, help_text=None):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+            if help_text:
+                self.help.setdefault(name, help_text)
+
+    def inc(self, name, value=1, labels=None, help_text=None):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            if help_text:
+                self.help.setdefault(name, help_text)
+
+    def set_gauge(self, name, value, labels=None, help_text=None):
+        key = _label_key(labels)
+        with self.lock:
+            self.gauges.setdefault(name, {})[key] = value
+            if help_text:
+                self.help.setdefault(name, help_text)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                self._header(lines, name, 'counter')
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.gauges.items()):
+                self._header(lines, name, 'gauge')
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                self._header(lines, name, 'histogram')
+                for key, hist in series.items():
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', repr(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, name, kind):
+        if name in self.help:
+            lines.append(f"# HELP {name} {self.help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in key)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + '}'
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def span(stage):
+    """Time a pipeline stage into the stage histogram and the current request breakdown"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe('stage_duration_seconds', elapsed, {'stage': stage},
+                         help_text='Time spent in each pipeline stage')
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed * 1000
+
+
+def timed(stage):
+    """Decorator form of span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_request():
+    """Begin collecting a per-request stage breakdown"""
+    _request_timings.set({})
+
+
+def request_timings():
+    """Stage timings (ms) collected so far for the current request"""
+    return _request_timings.get() or {}
+
+
+def server_timing_header(timings):
+    """Format stage timings as a Server-Timing header value"""
+    return ', '.join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
@@ -0,0 +1,353 @@
+import json
+import os
+import threading
+import time
+from utils.gallery import DEFAULT_MODEL_VERSION, RECOGNITION_THRESHOLD, GalleryMatrix, atomic_write, \
+    gallery_model, load_gallery, update_gallery_quality
+from utils.gallery_shards import LocalShard
+from utils.metrics import registry
+
+# Weights of every known embedding model, loaded into InceptionResNetV2.
+# Extra versions are listed in MODEL_REGISTRY_PATH as {"version": "weights path"}, or as
+# {"version": {"weights": "weights path", "recognition_threshold": 0.35}} for a model whose
+# distances sit on another scale than RECOGNITION_THRESHOLD (see evaluate.py).
+MODEL_REGISTRY_PATH = os.getenv('MODEL_REGISTRY_PATH', 'assets/model/models.json')
+DEFAULT_MODEL_WEIGHTS = "assets/model/facenet_keras_weights.h5"
+# Galleries re-embedded with a new model are built here before the switch
+MODEL_STAGING_DIR = "assets/encodings/models"
+MIGRATION_STATE_PATH = "assets/encodings/migration.json"
+# While a migration runs, also score queries against the partly re-embedded gallery
+MODEL_DUAL_READ = os.getenv('MODEL_DUAL_READ', 'false').lower() in ('1', 'true', 'yes')
+# Throttling of the background job: cases re-embedded per batch and pause between batches
+MIGRATION_BATCH_CASES = int(os.getenv('MIGRATION_BATCH_CASES', '200'))
+MIGRATION_PAUSE_SECONDS = float(os.getenv('MIGRATION_PAUSE_SECONDS', '0.5'))
+# How often the staged gallery is written out, for dual-read and for resuming
+MIGRATION_CHECKPOINT_SECONDS = float(os.getenv('MIGRATION_CHECKPOINT_SECONDS', '30'))
+# A running job that has not reported for this long is assumed dead
+MIGRATION_STALE_SECONDS = 300
+
+
+def model_registry(path=MODEL_REGISTRY_PATH):
+    models = {DEFAULT_MODEL_VERSION: DEFAULT_MODEL_WEIGHTS}
+    try:
+        with open(path) as f:
+            models.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    return models
+
+
+def model_weights(version):
+    models = model_registry()
+    if version not in models:
+        raise ValueError(f"Unknown embedding model: {version}")
+    entry = models[version]
+    return entry['weights'] if isinstance(entry, dict) else entry
+
+
+def model_threshold(version):
+    """Recognition threshold of a model, RECOGNITION_THRESHOLD unless models.json calibrates it"""
+    entry = model_registry().get(version)
+    if isinstance(entry, dict) and entry.get('recognition_threshold') is not None:
+        return float(entry['recognition_threshold'])
+    return RECOGNITION_THRESHOLD
+
+
+def load_face_encoder(version):
+    from architecture import InceptionResNetV2
+    encoder = InceptionResNetV2()
+    encoder.load_weights(model_weights(version))
+    return encoder
+
+
+class FaceEncoders:
+    """One face encoder per embedding model version, built on first use
+
+    Without an explicit version, get() returns the encoder of the model the
+    published gallery was built with, so queries follow a model switch.
+    """
+
+    def __init__(self):
+        self.encoders = {}
+        self.lock = threading.Lock()
+
+    def get(self, version=None):
+        version = version or gallery_model()
+        encoder = self.encoders.get(version)
+        if encoder is None:
+            with self.lock:
+                if version not in self.encoders:
+                    self.encoders[version] = load_face_encoder(version)
+                encoder = self.encoders[version]
+        return encoder
+
+
+def staging_index_path(version):
+    model_weights(version)  # only known versions name a directory
+    return os.path.join(MODEL_STAGING_DIR, version, "gallery.json")
+
+
+def read_migration_state(path=MIGRATION_STATE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_migration_state(state, path=MIGRATION_STATE_PATH):
+    atomic_write(path, lambda f: json.dump(state, f))
+
+
+def _is_running(state):
+    return bool(state) and state['status'] == 'running' and \
+        time.time() - state['updated_at'] < MIGRATION_STALE_SECONDS
+
+
+_staged = {}
+
+
+def staged_gallery():
+    """(version, shard) of a migration in progress when dual-read is on, else None
+
+    The shard reloads the staged gallery each time the job checkpoints it.
+    """
+    if not MODEL_DUAL_READ:
+        return None
+    state = read_migration_state()
+    if not state or state['status'] not in ('running', 'staged') or state['target'] == gallery_model():
+        return None
+    target = state['target']
+    if target not in _staged:
+        _staged[target] = LocalShard(staging_index_path(target))
+    return target, _staged[target]
+
+
+def staged_version():
+    staged = staged_gallery()
+    return staged[1].version() if staged else None
+
+
+def rescale_matches(matches, threshold, target_threshold):
+    """Map [(name, confidence)] from a model matched at threshold onto the scale of target_threshold
+
+    Cosine distances are scaled by target_threshold / threshold, so a match
+    right at one model's threshold lands right at the other's. This assumes
+    the two models' distances differ by roughly a constant factor; calibrate
+    each model's threshold with evaluate.py for it to hold.
+    """
+    if threshold == target_threshold:
+        return matches
+    ratio = target_threshold / threshold
+    return [(name, 1.0 - (1.0 - confidence) * ratio) for name, confidence in matches]
+
+
+def merge_matches(*rankings):
+    """Merge [(name, confidence)] rankings from several galleries, keeping each name's best score
+
+    The confidences must be on one scale: put rankings from another model
+    through rescale_matches first.
+    """
+    best = {}
+    for ranking in rankings:
+        for name, confidence in ranking:
+            if confidence > best.get(name, -1.0):
+                best[name] = confidence
+    return sorted(best.items(), key=lambda match: match[1], reverse=True)
+
+
+class ReEmbedJob:
+    """Re-embed the gallery with a new model from the stored face chips
+
+    Cases are encoded in batches of batch_cases with a pause in between, so
+    the job shares the machine with live traffic. The staged gallery is
+    checkpointed to its own index while queries keep using the published
+    one; a stopped job resumes from the last checkpoint. The switch publishes
+    the staged gallery, tagged with the new model, through the usual atomic
+    index replace, after a last pass over cases enrolled meanwhile and cases
+    whose stored chips changed since they were re-embedded (re-enrolled with
+    new photos); quality records the chip set each case was embedded from.
+    """
+
+    def __init__(self, target, batch_cases=MIGRATION_BATCH_CASES, pause_seconds=MIGRATION_PAUSE_SECONDS,
+                 switch_when_done=False, force=False, trainer=None):
+        self.target = target
+        self.index_path = staging_index_path(target)
+        self.batch_cases = max(1, batch_cases)
+        self.pause_seconds = pause_seconds
+        self.switch_when_done = switch_when_done
+        # Switch even if some cases have no stored chips; they are left out of the new gallery
+        self.force = force
+        self.trainer = trainer
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.state = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"re-embed-{self.target}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        try:
+            self._run()
+        except Exception as e:
+            print(f"Error re-embedding gallery with {self.target}: {e}")
+            self._report(status='failed', error=str(e))
+
+    def _run(self):
+        from utils.chip_store import get_chip_store
+
+        source = gallery_model()
+        if source == self.target:
+            raise ValueError(f"The gallery is already embedded with {self.target}")
+        store = get_chip_store()
+        if store is None:
+            raise ValueError("Re-embedding needs the chip store, CHIP_STORE_DIR is disabled")
+
+        staged, quality = self._load_checkpoint()
+        gallery = load_gallery()
+        names = set(gallery.names) if gallery else set()
+        with_chips = store.owners()
+        todo = sorted((names & with_chips) - set(staged))
+        resumed = len((names & with_chips) & set(staged))
+        now = time.time()
+        self.state = {
+            'source': source, 'target': self.target, 'status': 'running', 'pid': os.getpid(),
+            'total': len(names & with_chips), 'done': resumed, 'resumed_from': resumed,
+            'missing_chips': len(names - with_chips),
+            'chips': 0, 'started_at': now, 'updated_at': now, 'seconds': 0.0, 'error': None,
+        }
+        self._report()
+
+        if self.trainer is None:
+            from train import FaceTrainer
+            self.trainer = FaceTrainer(model_version=self.target)
+        start = last_checkpoint = time.perf_counter()
+        for offset in range(0, len(todo), self.batch_cases):
+            if self.stop_event.is_set():
+                self._checkpoint(staged, quality)
+                self._report(status='stopped', seconds=time.perf_counter() - start)
+                return
+            batch = todo[offset:offset + self.batch_cases]
+            encodings, batch_quality = self._encode(store, batch)
+            staged.update(encodings)
+            quality.update(batch_quality)
+            chips = sum(entry['kept'] + entry['collapsed'] for entry in batch_quality.values())
+            registry.inc('model_migration_chips_total', chips, {'target': self.target},
+                         help_text='Face chips re-embedded by model migrations')
+            self._report(done=self.state['done'] + len(batch), chips=self.state['chips'] + chips,
+                         seconds=time.perf_counter() - start)
+            if time.perf_counter() - last_checkpoint >= MIGRATION_CHECKPOINT_SECONDS:
+                self._checkpoint(staged, quality)
+                last_checkpoint = time.perf_counter()
+            self.stop_event.wait(self.pause_seconds)
+
+        if todo:
+            self._checkpoint(staged, quality)
+        self._report(status='staged', seconds=time.perf_counter() - start)
+        if self.switch_when_done:
+            self.switch(staged, quality, store)
+
+    def switch(self, staged, quality, store):
+        """Catch up on cases enrolled or re-enrolled during the run, then publish the staged gallery"""
+        gallery = load_gallery()
+        names = set(gallery.names) if gallery else set()
+        chip_sets = store.chip_sets(names)
+        late = sorted(name for name, chip_set in chip_sets.items()
+                      if name not in staged or (quality.get(name) or {}).get('chip_set') != chip_set)
+        if late:
+            encodings, late_quality = self._encode(store, late, chip_sets)
+            staged.update(encodings)
+            quality.update(late_quality)
+            print(f"Re-embedded {len(late)} cases enrolled or re-enrolled during the migration")
+        missing = sorted(names - set(staged))
+        if missing and not self.force:
+            raise ValueError(f"{len(missing)} gallery cases have no stored face chips; re-enrol them "
+                             f"or switch with force to leave them out")
+
+        staged = {name: encode for name, encode in staged.items() if name in names}
+        self.trainer.save_encodings(staged, quality=quality, model=self.target)
+        self._report(status='switched', done=len(staged), missing_chips=len(missing))
+        print(f"Switched the gallery to {self.target}: {len(staged)} cases, {len(missing)} left out")
+
+    def _encode(self, store, owners, chip_sets=None):
+        """Encode owners from their stored chips, recording in quality the chip set each was embedded from"""
+        # Taken before encoding, so chips added meanwhile show up as a change at the switch
+        chip_sets = store.chip_sets(owners) if chip_sets is None else chip_sets
+        encodings, quality = self.trainer.encode_chip_store(store, owners=owners)
+        for name, entry in quality.items():
+            if entry is not None and name in chip_sets:
+                entry['chip_set'] = chip_sets[name]
+        return encodings, quality
+
+    def _load_checkpoint(self):
+        """Staged encodings and quality of an earlier run of the same migration"""
+        try:
+            gallery = GalleryMatrix.load(self.index_path, mmap=False)
+        except (FileNotFoundError, ValueError):
+            return {}, {}
+        if gallery.model != self.target:
+            return {}, {}
+        quality = update_gallery_quality(dict.fromkeys(gallery.names), path=self._quality_path())
+        return dict(zip(gallery.names, gallery.matrix)), quality
+
+    def _checkpoint(self, staged, quality):
+        quality = update_gallery_quality(staged, quality, path=self._quality_path())
+        GalleryMatrix.from_dict(staged, quality, model=self.target).save(self.index_path, quantization='')
+
+    def _quality_path(self):
+        return os.path.join(os.path.dirname(self.index_path), "quality.json")
+
+    def _report(self, **changes):
+        if self.state is None:
+            self.state = {'target': self.target}
+        self.state.update(changes, updated_at=time.time())
+        if self.state.get('total') is not None:
+            registry.set_gauge('model_migration_progress',
+                               self.state['done'] / self.state['total'] if self.state['total'] else 1.0,
+                               {'target': self.target}, help_text='Fraction of cases re-embedded')
+        _write_migration_state(self.state)
+
+
+def migration_progress(state=None):
+    """The migration state plus throughput and an estimate of the time left"""
+    state = dict(state or read_migration_state() or {'status': 'idle'})
+    if state.get('status') == 'running' and not _is_running(state):
+        state['status'] = 'stale'
+    seconds = state.get('seconds') or 0
+    if 'total' in state:
+        remaining = max(state['total'] - state['done'], 0)
+        state['percent'] = round(100.0 * state['done'] / state['total'], 1) if state['total'] else 100.0
+        state['chips_per_second'] = round(state['chips'] / seconds, 2) if seconds else None
+        state['cases_per_second'] = round((state['done'] - state.get('resumed_from', 0)) / seconds, 2) \
+            if seconds else None
+        state['eta_seconds'] = round(remaining / state['cases_per_second']) \
+            if state['cases_per_second'] and state['status'] == 'running' else None
+    return state
+
+
+_job = None
+_job_lock = threading.Lock()
+
+
+def start_migration(target, **options):
+    """Start re-embedding in a background thread of this process, returns the job"""
+    global _job
+    with _job_lock:
+        if (_job is not None and _job.thread.is_alive()) or _is_running(read_migration_state()):
+            raise RuntimeError("A model migration is already running")
+        staging_index_path(target)
+        _job = ReEmbedJob(target, **options).start()
+        return _job
+
+
+def stop_migration():
+    with _job_lock:
+        if _job is None or not _job.thread.is_alive():
+            return False
+        _job.stop()
+        return True
@@ -0,0 +1,77 @@
+import os
+import re
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Country code applied to 10-digit national numbers (India by default, "1" for US/Canada)
+DEFAULT_COUNTRY_CODE = os.getenv('SMS_DEFAULT_COUNTRY_CODE', '91')
+
+_E164_RE = re.compile(r'^\+[1-9]\d{6,14}$')
+_NON_DIGIT_RE = re.compile(r'\D')
+
+
+@lru_cache(maxsize=8192)
+def normalize_phone_number(phone_number, country_code=DEFAULT_COUNTRY_CODE):
+    """Normalize a phone number to E.164 format, returns None if it has no digits"""
+    if not phone_number:
+        return None
+    phone_number = phone_number.strip()
+    if _E164_RE.match(phone_number):
+        return phone_number
+
+    digits = _NON_DIGIT_RE.sub('', phone_number)
+    if not digits:
+        return None
+
+    # Already international, only the formatting needs cleaning up
+    if phone_number.startswith('+'):
+        return f"+{digits}"
+    # International dialling prefix instead of a plus sign
+    if phone_number.startswith('00'):
+        return f"+{digits[2:]}"
+    # National number without country code
+    if len(digits) == 10:
+        return f"+{country_code}{digits}"
+    # National number with a leading trunk zero
+    if len(digits) == 11 and digits.startswith('0'):
+        return f"+{country_code}{digits[1:]}"
+    # Anything else is assumed to already carry its country code
+    return f"+{digits}"
+
+
+def normalize_phone_numbers(phone_numbers, country_code=DEFAULT_COUNTRY_CODE):
+    """Normalize a whole column of phone numbers to E.164 in one vectorized pass
+
+    Accepts any iterable (or a pandas Series, whose index is preserved) and
+    applies the same rules as normalize_phone_number. Each distinct value is
+    only parsed once. Entries without digits become None.
+    """
+    # Bulk jobs only; keeps pandas out of the request-path import
+    import numpy as np
+    import pandas as pd
+
+    series = phone_numbers if isinstance(phone_numbers, pd.Series) else pd.Series(list(phone_numbers), dtype=object)
+    values = series.astype('string').str.strip()
+    uniques = pd.Series(values.dropna().unique(), dtype='string')
+
+    digits = uniques.str.replace(r'\D', '', regex=True)
+    length = digits.str.len()
+    has_plus = uniques.str.startswith('+')
+    has_idd = ~has_plus & uniques.str.startswith('00')
+    national = ~has_plus & ~has_idd & (length == 10)
+    trunk = ~has_plus & ~has_idd & (length == 11) & digits.str.startswith('0')
+
+    normalized = np.select(
+        [has_idd.to_numpy(bool), national.to_numpy(bool), trunk.to_numpy(bool)],
+        [('+' + digits.str[2:]).to_numpy(object),
+         ('+' + country_code + digits).to_numpy(object),
+         ('+' + country_code + digits.str[1:]).to_numpy(object)],
+        default=('+' + digits).to_numpy(object)
+    )
+    normalized[(length == 0).to_numpy(bool)] = None
+
+    lookup = dict(zip(uniques.to_numpy(object), normalized))
+    result = values.map(lookup, na_action='ignore').astype(object)
+    return result.where(result.notna(), None)
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import numpy as np
+from utils.chip_store import photo_digest
+from utils.query_cache import dhash
+
+# Drop near-identical photos of one case (burst shots, re-saved copies) at enrolment
+PHOTO_DEDUP = os.getenv('PHOTO_DEDUP', 'true').lower() in ('1', 'true', 'yes')
+# Photos whose dHashes differ by at most this many bits (of 64) count as the same shot
+PHOTO_DEDUP_MAX_HAMMING = int(os.getenv('PHOTO_DEDUP_MAX_HAMMING', '6'))
+# Encodings of one case at least this similar (cosine) count once in the case's mean
+PHOTO_DEDUP_MIN_SIMILARITY = float(os.getenv('PHOTO_DEDUP_MIN_SIMILARITY', '0.97'))
+
+
+def find_duplicates(photos, max_hamming=PHOTO_DEDUP_MAX_HAMMING):
+    """Indices of the photos to keep, in input order
+
+    photos are encoded image bytes of one case. Byte-identical photos and
+    photos within max_hamming bits of dHash are grouped and only the largest
+    file of each group is kept, as the least compressed copy of that shot.
+    Photos that cannot be decoded are kept and left to face detection.
+    """
+    return _select([len(photo) for photo in photos], lambda i: photo_digest(photos[i]),
+                   lambda i: dhash(photos[i]), max_hamming)
+
+
+def _select(sizes, digest_of, dhash_of, max_hamming):
+    """find_duplicates over photos known by size, with SHA-1 and dHash computed on demand"""
+    kept, digests, hashes = [], set(), []
+    for i in sorted(range(len(sizes)), key=lambda i: sizes[i], reverse=True):
+        digest = digest_of(i)
+        if digest in digests:
+            continue
+        digests.add(digest)
+        phash = dhash_of(i)
+        if phash is not None and any(bin(phash ^ other).count('1') <= max_hamming for other in hashes):
+            continue
+        if phash is not None:
+            hashes.append(phash)
+        kept.append(i)
+    return sorted(kept)
+
+
+def dedupe_paths(img_paths):
+    """The image paths of one case with near-duplicates removed"""
+    if not PHOTO_DEDUP or len(img_paths) < 2:
+        return list(img_paths)
+    photos = []
+    for img_path in img_paths:
+        with open(img_path, 'rb') as f:
+            photos.append(f.read())
+    return [img_paths[i] for i in find_duplicates(photos)]
+
+
+def _stream_digest(stream, chunk_size=1024 * 1024):
+    stream.seek(0)
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def _stream_dhash(stream):
+    stream.seek(0)
+    phash = dhash(stream.read())
+    stream.seek(0)
+    return phash
+
+
+def dedupe_uploads(files):
+    """Uploaded files of one case with near-duplicates removed
+
+    Streams are hashed in chunks and only decoded, one at a time, for the
+    dHash of photos not already seen byte for byte. They are rewound
+    afterwards, so the kept files can still be stored (and streamed) as usual.
+    """
+    if not PHOTO_DEDUP or len(files) < 2:
+        return list(files)
+    streams = [getattr(file, 'stream', file) for file in files]
+    sizes = []
+    for stream in streams:
+        stream.seek(0, os.SEEK_END)
+        sizes.append(stream.tell())
+        stream.seek(0)
+    kept = _select(sizes, lambda i: _stream_digest(streams[i]), lambda i: _stream_dhash(streams[i]),
+                   PHOTO_DEDUP_MAX_HAMMING)
+    return [files[i] for i in kept]
+
+
+def collapse_encodings(items, min_similarity=PHOTO_DEDUP_MIN_SIMILARITY):
+    """Collapse [(encode, quality score)] of one case that are near-duplicates in embedding space
+
+    Photos that differ in pixels but not in what the encoder sees would
+    otherwise outweigh the case's other views in its mean. The best-quality
+    encoding of each cluster is kept. Returns (kept items, number collapsed).
+    """
+    if not PHOTO_DEDUP or len(items) < 2:
+        return items, 0
+    order = sorted(range(len(items)), key=lambda i: items[i][1] or 0, reverse=True)
+    vectors = np.asarray([items[i][0] for i in order], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    kept = []
+    for position, vector in enumerate(vectors):
+        if kept and float(np.max(vectors[kept] @ vector)) >= min_similarity:
+            continue
+        kept.append(position)
+    return [items[order[position]] for position in sorted(kept, key=lambda p: order[p])], len(items) - len(kept)
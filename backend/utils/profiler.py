@@ -0,0 +1,132 @@
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from flask import g, request
+from utils import metrics
+
+
+class SlowRequestProfiler:
+    """Profile one in sample_every requests with cProfile and keep the ones slower than a threshold
+
+    Each kept profile is written as <name>.prof (loadable with pstats or snakeviz)
+    next to a <name>.json summary holding the route, latency, stage timings and
+    the top functions by cumulative time. Only the newest `keep` profiles are kept.
+
+    At most one request per process is profiled at a time: from Python 3.12
+    cProfile hooks the whole interpreter and a second profiler cannot be
+    enabled, and earlier versions only see the profiled thread anyway. That
+    also means the async /api/v2/report-found view, whose coroutine runs on
+    an event loop thread, is not covered: its profile shows the request
+    thread waiting on it.
+    """
+
+    def __init__(self, threshold_ms=2000, directory='profiles', keep=50, top_functions=25, sample_every=10):
+        self.threshold_ms = threshold_ms
+        self.directory = directory
+        self.keep = keep
+        self.top_functions = top_functions
+        self.sample_every = max(1, sample_every)
+        self.requests = itertools.count()
+        self.active = threading.Lock()
+
+    def init_app(self, app):
+        os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+
+    def _start(self):
+        if next(self.requests) % self.sample_every or not self.active.acquire(blocking=False):
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger's) already holds the interpreter hook
+            self.active.release()
+            return
+        g.profile_start = time.perf_counter()
+        g.profile = profile
+
+    def _stop(self):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.disable()
+            self.active.release()
+        return profile
+
+    def _finish(self, response):
+        profile = self._stop()
+        if profile is None:
+            return response
+
+        duration_ms = (time.perf_counter() - g.profile_start) * 1000
+        if duration_ms >= self.threshold_ms:
+            route = request.url_rule.rule if request.url_rule else request.path
+            try:
+                self._save(profile, {
+                    'route': route,
+                    'method': request.method,
+                    'status': response.status_code,
+                    'duration_ms': duration_ms,
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'stage_timings_ms': metrics.request_timings(),
+                })
+            except Exception as e:
+                print(f"Error saving request profile: {e}")
+        return response
+
+    def _teardown(self, exc):
+        # Requests that raised never reach after_request
+        self._stop()
+
+    def _save(self, profile, summary):
+        slug = re.sub(r'[^a-zA-Z0-9]+', '-', summary['route']).strip('-') or 'root'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(summary['duration_ms'])}ms-{slug}-{uuid.uuid4().hex[:8]}"
+        base = os.path.join(self.directory, name)
+
+        profile.dump_stats(f"{base}.prof")
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(self.top_functions)
+        summary['profile'] = f"{name}.prof"
+        summary['top_functions'] = stream.getvalue()
+        with open(f"{base}.json", 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        self._rotate()
+        metrics.registry.inc('slow_requests_profiled_total', labels={'route': summary['route']},
+                             help_text='Requests slower than the profiling threshold')
+
+    def _rotate(self):
+        summaries = sorted(
+            (os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.json')),
+            key=os.path.getmtime
+        )
+        for path in summaries[:-self.keep] if self.keep else []:
+            for stale in (path, path[:-len('.json')] + '.prof'):
+                if os.path.exists(stale):
+                    os.remove(stale)
+
+    def worst(self, limit=20, route=None):
+        """Saved profile summaries, slowest first"""
+        summaries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if route and summary.get('route') != route:
+                continue
+            summaries.append(summary)
+        summaries.sort(key=lambda s: s.get('duration_ms', 0), reverse=True)
+        return summaries[:limit]
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils.metrics import registry
+
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv('QUERY_CACHE_TTL_SECONDS', '600'))
+# Largest dHash Hamming distance (of 64 bits) treated as the same photo, 0 for exact bytes only
+QUERY_CACHE_MAX_HAMMING = int(os.getenv('QUERY_CACHE_MAX_HAMMING', '4'))
+
+
+def image_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def dhash(data, size=8):
+    """64-bit difference hash of an encoded image, None if it cannot be decoded
+
+    Survives re-encoding, resizing and small brightness changes, so re-uploads
+    of the same photo hash within a few bits of each other.
+    """
+    import cv2
+    import numpy as np
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    small = cv2.resize(img, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+class _Entry:
+    __slots__ = ('value', 'version', 'expires_at', 'phash')
+
+    def __init__(self, value, version, expires_at, phash):
+        self.value = value
+        self.version = version
+        self.expires_at = expires_at
+        self.phash = phash
+
+
+class QueryCache:
+    """Bounded LRU of match results keyed by image bytes, with a perceptual fallback
+
+    A lookup first tries the SHA-256 of the upload, then any cached entry whose
+    dHash is within max_hamming bits. Entries expire after ttl_seconds and are
+    ignored once the gallery version they were computed against changes.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE, ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+                 max_hamming=QUERY_CACHE_MAX_HAMMING):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_hamming = max_hamming
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def lookup(self, data, version):
+        """Return (hit, value, phash); phash is passed back to store() on a miss"""
+        digest = image_digest(data)
+        now = time.time()
+        with self.lock:
+            entry = self._live(digest, version, now)
+            if entry is not None:
+                self._count('hit_exact')
+                return True, entry.value, entry.phash
+
+        phash = dhash(data) if self.max_hamming else None
+        if phash is not None:
+            with self.lock:
+                near = [key for key, entry in reversed(self.entries.items())
+                        if entry.phash is not None and (entry.phash ^ phash).bit_count() <= self.max_hamming]
+                for key in near:
+                    entry = self._live(key, version, now)
+                    if entry is not None:
+                        self._count('hit_perceptual')
+                        return True, entry.value, phash
+
+        self._count('miss')
+        return False, None, phash
+
+    def store(self, data, version, value, phash=None):
+        digest = image_digest(data)
+        with self.lock:
+            self.entries[digest] = _Entry(value, version, time.time() + self.ttl_seconds, phash)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            registry.set_gauge('query_cache_entries', len(self.entries),
+                               help_text='Match results held in the query cache')
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _live(self, key, version, now):
+        """The entry under key if still valid, evicting it otherwise (caller holds the lock)"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < now or entry.version != version:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _count(self, result):
+        registry.inc('query_cache_requests_total', labels={'result': result},
+                     help_text='Query cache lookups by result')
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = QueryCache()
+    return _cache
@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from utils.metrics import registry, timed
+from utils.phone_numbers import normalize_phone_number
+from utils.sms_sender import SMSSender
+
+load_dotenv()
+
+# Outbox configuration
+SMS_OUTBOX_PATH = os.getenv('SMS_OUTBOX_PATH', 'assets/outbox/sms_outbox.db')
+SMS_OUTBOX_BATCH_SIZE = int(os.getenv('SMS_OUTBOX_BATCH_SIZE', '20'))
+SMS_OUTBOX_MAX_ATTEMPTS = int(os.getenv('SMS_OUTBOX_MAX_ATTEMPTS', '5'))
+SMS_OUTBOX_BACKOFF_SECONDS = float(os.getenv('SMS_OUTBOX_BACKOFF_SECONDS', '2'))
+SMS_OUTBOX_DEDUP_WINDOW_SECONDS = float(os.getenv('SMS_OUTBOX_DEDUP_WINDOW_SECONDS', '900'))
+SMS_OUTBOX_POLL_SECONDS = float(os.getenv('SMS_OUTBOX_POLL_SECONDS', '1'))
+# A claimed batch not finished within this long is assumed lost with its process and is sent again
+SMS_OUTBOX_LEASE_SECONDS = float(os.getenv('SMS_OUTBOX_LEASE_SECONDS', '300'))
+SMS_PROVIDER = os.getenv('SMS_PROVIDER', 'twilio')
+
+
+class FakeSMSProvider:
+    """Provider that records messages locally instead of sending them"""
+
+    def __init__(self, fail_times=0):
+        self.sent = []
+        self.fail_times = fail_times
+        self.calls = 0
+
+    def send_message(self, to_number, message):
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            return False
+        self.sent.append((to_number, message))
+        return True
+
+    def send_batch(self, messages):
+        return [self.send_message(to_number, message) for to_number, message in messages]
+
+
+class SMSOutbox:
+    def __init__(self, provider=None, path=SMS_OUTBOX_PATH, batch_size=SMS_OUTBOX_BATCH_SIZE,
+                 max_attempts=SMS_OUTBOX_MAX_ATTEMPTS, backoff_seconds=SMS_OUTBOX_BACKOFF_SECONDS,
+                 dedup_window_seconds=SMS_OUTBOX_DEDUP_WINDOW_SECONDS, poll_seconds=SMS_OUTBOX_POLL_SECONDS,
+                 lease_seconds=SMS_OUTBOX_LEASE_SECONDS):
+        self.provider = provider if provider is not None else SMSSender()
+        self.path = path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.dedup_window_seconds = dedup_window_seconds
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create the outbox table
+
+        Rows left mid-send by a process that died are not reset here, since
+        other workers sharing the outbox may still be sending theirs;
+        dispatch_pending picks them up once their lease has expired.
+        """
+        with self.lock:
+            self.db.execute("""
+            CREATE TABLE IF NOT EXISTS sms_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                case_id TEXT,
+                to_number TEXT NOT NULL,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                sent_at REAL,
+                claimed_at REAL
+            )
+            """)
+            columns = {row['name'] for row in self.db.execute("PRAGMA table_info(sms_outbox)")}
+            if 'claimed_at' not in columns:
+                self.db.execute("ALTER TABLE sms_outbox ADD COLUMN claimed_at REAL")
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sms_outbox_due ON sms_outbox (status, next_attempt_at)"
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sms_outbox_case ON sms_outbox (case_id, to_number, created_at)"
+            )
+            self.db.commit()
+
+    @timed('sms.enqueue')
+    def enqueue(self, case_id, to_number, message):
+        """Queue a message for delivery, returns False if it duplicates a recent alert"""
+        now = time.time()
+        with self.lock:
+            # The check and insert run under one write lock, so workers sharing
+            # the outbox cannot both queue the same alert
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                duplicate = self.db.execute(
+                    """
+                    SELECT 1 FROM sms_outbox
+                    WHERE case_id = ? AND to_number = ? AND created_at >= ? AND status != 'failed'
+                    LIMIT 1
+                    """,
+                    (case_id, to_number, now - self.dedup_window_seconds)
+                ).fetchone()
+                if not duplicate:
+                    self.db.execute(
+                        """
+                        INSERT INTO sms_outbox (case_id, to_number, message, next_attempt_at, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                        """,
+                        (case_id, to_number, message, now, now)
+                    )
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+
+        if duplicate:
+            print(f"Skipping duplicate SMS alert for case {case_id}")
+            registry.inc('sms_outbox_messages_total', labels={'event': 'deduplicated'},
+                         help_text='SMS outbox messages by lifecycle event')
+            return False
+
+        registry.inc('sms_outbox_messages_total', labels={'event': 'enqueued'},
+                     help_text='SMS outbox messages by lifecycle event')
+        self.wakeup.set()
+        return True
+
+    def enqueue_child_found_notification(self, case_id, parent_phone, child_name, location,
+                                         reporter_name, reporter_phone):
+        """Queue the notification sent to a parent when their child is found"""
+        if not parent_phone:
+            print("Cannot queue SMS: No parent phone number provided")
+            return False
+
+        reporter_phone = normalize_phone_number(reporter_phone) or reporter_phone
+        message = SMSSender.build_child_found_message(child_name, location, reporter_name, reporter_phone)
+        return self.enqueue(case_id, parent_phone, message)
+
+    def dispatch_pending(self):
+        """Send one batch of due messages, returns the number delivered"""
+        now = time.time()
+        with self.lock:
+            # Claim the batch under a write lock so dispatchers in other worker
+            # processes sharing this outbox never pick up the same rows
+            self.db.execute("BEGIN IMMEDIATE")
+            # Rows still 'sending' past their lease were claimed by a process that died
+            rows = self.db.execute(
+                """
+                SELECT id, to_number, message, attempts FROM sms_outbox
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'sending' AND (claimed_at IS NULL OR claimed_at < ?))
+                ORDER BY next_attempt_at
+                LIMIT ?
+                """,
+                (now, now - self.lease_seconds, self.batch_size)
+            ).fetchall()
+            self.db.executemany(
+                "UPDATE sms_outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, row['id']) for row in rows]
+            )
+            self.db.commit()
+            if not rows:
+                return 0
+
+        try:
+            results = self.provider.send_batch([(row['to_number'], row['message']) for row in rows])
+        except Exception as e:
+            print(f"Error dispatching SMS batch: {e}")
+            results = [False] * len(rows)
+
+        sent, retries = [], []
+        finished_at = time.time()
+        for row, ok in zip(rows, results):
+            if ok:
+                sent.append((finished_at, row['id']))
+                continue
+            attempts = row['attempts'] + 1
+            status = 'failed' if attempts >= self.max_attempts else 'pending'
+            next_attempt_at = finished_at + self.backoff_seconds * (2 ** (attempts - 1))
+            retries.append((status, attempts, next_attempt_at, row['id']))
+
+        with self.lock:
+            self.db.executemany(
+                "UPDATE sms_outbox SET status = 'sent', sent_at = ? WHERE id = ?", sent
+            )
+            self.db.executemany(
+                "UPDATE sms_outbox SET status = ?, attempts = ?, next_attempt_at = ? WHERE id = ?", retries
+            )
+            self.db.commit()
+
+        failed = sum(1 for status, *_ in retries if status == 'failed')
+        registry.inc('sms_outbox_messages_total', len(sent), labels={'event': 'sent'})
+        registry.inc('sms_outbox_messages_total', len(retries) - failed, labels={'event': 'retried'})
+        registry.inc('sms_outbox_messages_total', failed, labels={'event': 'failed'})
+        return len(sent)
+
+    def stats(self):
+        """Count outbox messages by status"""
+        with self.lock:
+            rows = self.db.execute("SELECT status, COUNT(*) AS n FROM sms_outbox GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    def start(self):
+        """Start the background dispatcher thread"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name='sms-outbox', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the dispatcher thread, pending messages stay in the outbox"""
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                # Keep draining while full batches are being delivered
+                while self.dispatch_pending() >= self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"Error in SMS outbox dispatcher: {e}")
+            self.wakeup.wait(self.poll_seconds)
+            self.wakeup.clear()
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """Return the process-wide outbox, starting its dispatcher on first use"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            provider = FakeSMSProvider() if SMS_PROVIDER == 'fake' else SMSSender()
+            _outbox = SMSOutbox(provider=provider)
+            _outbox.start()
+    return _outbox
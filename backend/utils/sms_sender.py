@@ -1,7 +1,8 @@
 
 import os
 from dotenv import load_dotenv
-from twilio.rest import Client
+from utils.phone_numbers import normalize_phone_number
+from utils.metrics import span
 
 load_dotenv()
 
@@ -14,6 +15,8 @@ class SMSSender:
     def __init__(self):
         self.client = None
         if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_PHONE_NUMBER:
+            # Imported here so the twilio package is only loaded when SMS is configured
+            from twilio.rest import Client
             self.client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
             self.from_number = TWILIO_PHONE_NUMBER
         else:
@@ -21,33 +24,7 @@ class SMSSender:
 
     def format_phone_number(self, phone_number):
         """Format phone number to E.164 format for Twilio"""
-        # Strip any non-digit characters
-        digits_only = ''.join(filter(str.isdigit, phone_number))
-        
-        # If the number already has a plus sign, it might be in international format
-        if phone_number.startswith('+'):
-            return phone_number
-        
-        # Handle Indian numbers (10 digits)
-        if len(digits_only) == 10:
-            # For India, the country code is +91
-            return f"+91{digits_only}"
-        
-        # For US/Canada numbers (10 digits)
-        if len(digits_only) == 10:
-            return f"+1{digits_only}"
-            
-        # If it's already a full international number without the plus
-        if len(digits_only) > 10:
-            # Check if it starts with country code
-            if digits_only.startswith('91') and len(digits_only) == 12:  # India
-                return f"+{digits_only}"
-            if digits_only.startswith('1') and len(digits_only) == 11:   # US/Canada
-                return f"+{digits_only}"
-            
-        # If we can't determine the format, return with a plus sign
-        # hoping it's already in international format without the plus
-        return f"+{digits_only}"
+        return normalize_phone_number(phone_number)
 
     def send_message(self, to_number, message):
         """Send an SMS message using Twilio"""
@@ -60,11 +37,12 @@ class SMSSender:
             formatted_number = self.format_phone_number(to_number)
             print(f"Sending SMS to formatted number: {formatted_number}")
                 
-            message = self.client.messages.create(
-                body=message,
-                from_=self.from_number,
-                to=formatted_number
-            )
+            with span('sms.send'):
+                message = self.client.messages.create(
+                    body=message,
+                    from_=self.from_number,
+                    to=formatted_number
+                )
             print(f"SMS sent successfully. SID: {message.sid}")
             return True
         except Exception as e:
@@ -77,12 +55,20 @@ class SMSSender:
             print("Cannot send SMS: No parent phone number provided")
             return False
             
-        message = (
+        message = self.build_child_found_message(child_name, location, reporter_name, reporter_phone)
+        return self.send_message(parent_phone, message)
+
+    def send_batch(self, messages):
+        """Send a batch of (to_number, message) pairs over the same Twilio client"""
+        return [self.send_message(to_number, message) for to_number, message in messages]
+
+    @staticmethod
+    def build_child_found_message(child_name, location, reporter_name, reporter_phone):
+        """Build the notification text sent to a parent when their child is found"""
+        return (
             f"URGENT: Your child {child_name} has been found! "
             f"Current location: {location}. "
             f"Found by: {reporter_name}. "
             f"Contact finder at: {reporter_phone}. "
             f"Please contact authorities immediately."
         )
-        
-        return self.send_message(parent_phone, message)
@@ -0,0 +1,154 @@
+import os
+import cv2
+
+# Frames between samples: dense while faces are in view, backing off to the max when none are
+VIDEO_MIN_STRIDE = int(os.getenv('VIDEO_MIN_STRIDE', '2'))
+VIDEO_MAX_STRIDE = int(os.getenv('VIDEO_MAX_STRIDE', '15'))
+# Frames are downscaled to this width for detection; chips are still cut from full resolution
+VIDEO_DETECT_WIDTH = int(os.getenv('VIDEO_DETECT_WIDTH', '640'))
+
+
+class AdaptiveSampler:
+    """Decide which frames to process
+
+    The stride doubles (up to max_stride) after each sampled frame without a
+    face and drops back to min_stride as soon as one appears, so empty
+    corridor footage is skimmed and frames with people are looked at closely.
+    """
+
+    def __init__(self, min_stride=VIDEO_MIN_STRIDE, max_stride=VIDEO_MAX_STRIDE):
+        self.min_stride = max(1, min_stride)
+        self.max_stride = max(self.min_stride, max_stride)
+        self.stride = self.min_stride
+        self.next_frame = 0
+
+    def wants(self, frame_index):
+        return frame_index >= self.next_frame
+
+    def update(self, frame_index, faces_found):
+        self.stride = self.min_stride if faces_found else min(self.stride * 2, self.max_stride)
+        self.next_frame = frame_index + self.stride
+
+
+def iter_frames(video_path, sampler, stats=None):
+    """Yield (frame_index, timestamp_seconds, bgr_frame) for the frames the sampler wants
+
+    Frames that are not wanted are skipped with grab(), which advances the
+    stream without the cost of decoding into an image. If given, stats is
+    filled with the clip's fps and the number of frames read.
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    stats = stats if stats is not None else {}
+    stats['fps'] = fps
+    stats['frames_read'] = 0
+    frame_index = 0
+    try:
+        while True:
+            if not sampler.wants(frame_index):
+                if not capture.grab():
+                    break
+                frame_index += 1
+                stats['frames_read'] = frame_index
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frame_index += 1
+            stats['frames_read'] = frame_index
+            yield frame_index - 1, (frame_index - 1) / fps, frame
+    finally:
+        capture.release()
+
+
+def iou(a, b):
+    """Intersection over union of two (left, top, right, bottom) boxes"""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    inter = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+class Track:
+    def __init__(self, track_id, box, frame_index, timestamp):
+        self.track_id = track_id
+        self.box = box
+        self.first_frame = self.last_frame = frame_index
+        self.first_seen = self.last_seen = timestamp
+        self.missed = 0
+        self.chips = []  # (face area, chip), the largest views kept for encoding
+
+
+class FaceTracker:
+    """Greedy IoU tracker that keeps a few of the best chips per track
+
+    Detections overlapping a live track by at least iou_threshold extend it;
+    a track not seen for max_missed sampled frames is closed. Only the
+    chips_per_track largest views of each face are kept, so a face visible
+    for hundreds of frames is still encoded just a few times.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=5, chips_per_track=3):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.chips_per_track = chips_per_track
+        self.active = []
+        self.finished = []
+        self.next_id = 1
+
+    def update(self, frame_index, timestamp, detections):
+        """detections: [(box, chip_factory)]; chip_factory() cuts the aligned chip only if it is kept"""
+        pairs = sorted(
+            ((iou(track.box, box), t, d) for t, track in enumerate(self.active)
+             for d, (box, _) in enumerate(detections)),
+            reverse=True
+        )
+        matched_tracks, matched_detections = set(), set()
+        for overlap, t, d in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            track = self.active[t]
+            track.box = detections[d][0]
+            track.last_frame, track.last_seen, track.missed = frame_index, timestamp, 0
+            self._offer_chip(track, *detections[d])
+
+        for t, track in enumerate(self.active):
+            if t not in matched_tracks:
+                track.missed += 1
+        for d, (box, chip_factory) in enumerate(detections):
+            if d not in matched_detections:
+                track = Track(self.next_id, box, frame_index, timestamp)
+                self.next_id += 1
+                self._offer_chip(track, box, chip_factory)
+                self.active.append(track)
+
+        still_active = []
+        for track in self.active:
+            (still_active if track.missed <= self.max_missed else self.finished).append(track)
+        self.active = still_active
+
+    def close(self):
+        """Finish all tracks, returns every track seen"""
+        self.finished.extend(self.active)
+        self.active = []
+        return self.finished
+
+    def _offer_chip(self, track, box, chip_factory):
+        area = (box[2] - box[0]) * (box[3] - box[1])
+        if len(track.chips) >= self.chips_per_track and area <= track.chips[0][0]:
+            return
+        chip = chip_factory()
+        if chip is None:
+            return
+        track.chips.append((area, chip))
+        track.chips.sort(key=lambda item: item[0])
+        del track.chips[:-self.chips_per_track]
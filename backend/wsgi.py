@@ -0,0 +1,15 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app"""
+import os
+from app import app
+from utils import components
+
+# Built in the master before workers fork, so their pages are shared
+# copy-on-write. The gallery is memory-mapped and shared through the page
+# cache regardless. The TensorFlow encoder is not preloaded by default as
+# its thread pools do not survive a fork; workers build it in post_worker_init.
+PRELOAD_COMPONENTS = [
+    name.strip() for name in os.getenv('PRELOAD_COMPONENTS', 'landmark_models,gallery').split(',')
+    if name.strip()
+]
+
+components.warm_up(PRELOAD_COMPONENTS)